@@ -38,6 +38,8 @@ from slips_files.core.evidencehandler import EvidenceHandler
 from slips_files.core.input import Input
 from slips_files.core.output import Output
 from slips_files.core.profiler import Profiler
+from slips_files.core.flow_parser import FlowParser
+from slips_files.core.helpers.log_writer import BufferedLogWriter
 
 
 class ProcessManager:
@@ -46,9 +48,17 @@ class ProcessManager:
         # this will be set by main.py if slips is not daemonized,
         # it'll be set to the children of main.py
         self.processes: Dict[str, Process]
-        # this is the queue that will be used by the input proces
-        # to pass flows to the profiler
-        self.profiler_queue = Queue()
+        self.read_config()
+        # these are the queues that will be used by the input proces
+        # to pass flows to the profilers. one queue per profiler worker
+        self.profiler_queues: List[Queue] = [
+            Queue() for _ in range(self.profiler_workers)
+        ]
+        # when using flow parsers, the input process sends the flows to
+        # these queues instead, one queue per parser worker
+        self.parser_queues: List[Queue] = [
+            Queue() for _ in range(self.parser_workers)
+        ]
         self.termination_event: Event = Event()
         # this one has its own termination event because we want it to
         # shutdown at the very end of all other slips modules.
@@ -60,15 +70,24 @@ class ProcessManager:
         # release the semaphore. Once having the semaphore, then slips.py can
         # terminate slips.
         self.is_input_done = Semaphore(0)
+        # each profiler worker releases this semaphore once when it's done
         self.is_profiler_done = Semaphore(0)
-        # is set by the profiler process to indicate that it's done so
+        # number of workers that released the is_profiler_done semaphore
+        self.profilers_done = 0
+        self.input_done = False
+        # each one is set by a profiler worker to indicate that it's done so
         # input can shutdown no issue
-        # now without this event, input process doesn't know that profiler
+        # now without these events, input process doesn't know that profiler
         # is still waiting for the queue to stop
         # and inout stops and renders the profiler queue useless and profiler
         # cant get more lines anymore!
-        self.is_profiler_done_event = Event()
-        self.read_config()
+        self.is_profiler_done_events: List[Event] = [
+            Event() for _ in range(self.profiler_workers)
+        ]
+        # each one is set by a parser worker once all the profilers are done
+        self.is_parser_done_events: List[Event] = [
+            Event() for _ in range(self.parser_workers)
+        ]
         # for the communication between output.py and the progress bar
         # Pipe(False) means the pipe is unidirectional.
         # aka only msgs can go from output -> pbar and not vice versa
@@ -81,6 +100,8 @@ class ProcessManager:
         self.modules_to_ignore: list = self.main.conf.get_disabled_modules(
             self.main.input_type
         )
+        self.profiler_workers: int = self.main.conf.profiler_workers()
+        self.parser_workers: int = self.main.conf.parser_workers()
 
     def is_pbar_supported(self) -> bool:
         """
@@ -145,25 +166,69 @@ class ProcessManager:
         return pbar
 
     def start_profiler_process(self):
-        profiler_process = Profiler(
-            self.main.logger,
-            self.main.args.output,
-            self.main.redis_port,
-            self.termination_event,
-            is_profiler_done=self.is_profiler_done,
-            profiler_queue=self.profiler_queue,
-            is_profiler_done_event=self.is_profiler_done_event,
-            has_pbar=self.is_pbar_supported(),
-        )
-        profiler_process.start()
-        self.main.print(
-            f'Started {green("Profiler Process")} '
-            f"[PID {green(profiler_process.pid)}]",
-            1,
-            0,
-        )
-        self.main.db.store_pid("Profiler", int(profiler_process.pid))
-        return profiler_process
+        """
+        starts one profiler process per profiler worker set in slips.yaml
+        each worker reads flows from its own queue
+        """
+        profilers = []
+        for worker_id in range(self.profiler_workers):
+            profiler_process = Profiler(
+                self.main.logger,
+                self.main.args.output,
+                self.main.redis_port,
+                self.termination_event,
+                is_profiler_done=self.is_profiler_done,
+                profiler_queue=self.profiler_queues[worker_id],
+                is_profiler_done_event=self.is_profiler_done_events[worker_id],
+                has_pbar=self.is_pbar_supported(),
+                worker_id=worker_id,
+                # every parser worker sends flows to every profiler
+                producers=self.parser_workers or 1,
+            )
+            profiler_process.start()
+            self.main.print(
+                f'Started {green(profiler_process.name + " Process")} '
+                f"[PID {green(profiler_process.pid)}]",
+                1,
+                0,
+            )
+            self.main.db.store_pid(
+                profiler_process.name, int(profiler_process.pid)
+            )
+            profilers.append(profiler_process)
+        return profilers
+
+    def start_flow_parser_processes(self):
+        """
+        starts the parser workers set in slips.yaml, if any.
+        each worker parses the flows of its own queue and sends them
+        to the profilers
+        """
+        parsers = []
+        for worker_id in range(self.parser_workers):
+            parser_process = FlowParser(
+                self.main.logger,
+                self.main.args.output,
+                self.main.redis_port,
+                self.termination_event,
+                parser_queue=self.parser_queues[worker_id],
+                profiler_queues=self.profiler_queues,
+                is_parser_done_event=self.is_parser_done_events[worker_id],
+                is_profiler_done_events=self.is_profiler_done_events,
+                worker_id=worker_id,
+            )
+            parser_process.start()
+            self.main.print(
+                f'Started {green(parser_process.name + " Process")} '
+                f"[PID {green(parser_process.pid)}]",
+                1,
+                0,
+            )
+            self.main.db.store_pid(
+                parser_process.name, int(parser_process.pid)
+            )
+            parsers.append(parser_process)
+        return parsers
 
     def start_evidence_process(self):
         evidence_process = EvidenceHandler(
@@ -183,20 +248,33 @@ class ProcessManager:
         return evidence_process
 
     def start_input_process(self):
+        # the input sends the flows to the parsers if there are any
+        # and waits for them to finish instead of the profilers
+        if self.parser_workers:
+            queues, done_events = (
+                self.parser_queues,
+                self.is_parser_done_events,
+            )
+        else:
+            queues, done_events = (
+                self.profiler_queues,
+                self.is_profiler_done_events,
+            )
+
         input_process = Input(
             self.main.logger,
             self.main.args.output,
             self.main.redis_port,
             self.termination_event,
             is_input_done=self.is_input_done,
-            profiler_queue=self.profiler_queue,
+            profiler_queues=queues,
             input_type=self.main.input_type,
             input_information=self.main.input_information,
             cli_packet_filter=self.main.args.pcapfilter,
             zeek_or_bro=self.main.zeek_bro,
             zeek_dir=self.main.zeek_dir,
             line_type=self.main.line_type,
-            is_profiler_done_event=self.is_profiler_done_event,
+            is_profiler_done_events=done_events,
         )
         input_process.start()
         self.main.print(
@@ -636,13 +714,17 @@ class ProcessManager:
         the semaphores signaling that they're done
         If they're still processing it will return False
         """
-        # try to acquire the semaphore without blocking
-        input_done_processing: bool = self.is_input_done.acquire(block=False)
-        profiler_done_processing: bool = self.is_profiler_done.acquire(
-            block=False
-        )
+        # try to acquire the semaphores without blocking
+        if not self.input_done:
+            self.input_done: bool = self.is_input_done.acquire(block=False)
+
+        # every profiler worker releases the semaphore once
+        while self.profilers_done < self.profiler_workers:
+            if not self.is_profiler_done.acquire(block=False):
+                break
+            self.profilers_done += 1
 
-        if input_done_processing and profiler_done_processing:
+        if self.input_done and self.profilers_done == self.profiler_workers:
             return True
 
         # can't acquire the semaphore, processes are still running
@@ -790,3 +872,7 @@ class ProcessManager:
 
         except KeyboardInterrupt:
             return False
+        finally:
+            # the exit finalizers of the log writers only run on a clean
+            # exit, this is also the SIGTERM path
+            BufferedLogWriter.flush_all()
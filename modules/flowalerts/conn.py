@@ -11,6 +11,7 @@ from modules.flowalerts.timer_thread import TimerThread
 from slips_files.common.abstracts.flowalerts_analyzer import (
     IFlowalertsAnalyzer,
 )
+from slips_files.common.flow_encoding import decode_new_flow
 from slips_files.common.parsers.config_parser import ConfigParser
 from slips_files.common.slips_utils import utils
 
@@ -464,7 +465,7 @@ class Conn(IFlowalertsAnalyzer):
                 return False
 
         # search 24hs back for a dns resolution
-        if self.db.is_ip_resolved(daddr, 24):
+        if self.db.is_ip_resolved(daddr, 24, timestamp):
             return False
 
         if uid not in self.connections_checked_in_conn_dns_timer_thread:
@@ -816,13 +817,11 @@ class Conn(IFlowalertsAnalyzer):
 
     def analyze(self):
         if msg := self.flowalerts.get_msg("new_flow"):
-            new_flow = json.loads(msg["data"])
+            new_flow = decode_new_flow(msg["data"])
             profileid = new_flow["profileid"]
             twid = new_flow["twid"]
-            flow = new_flow["flow"]
-            flow = json.loads(flow)
-            uid = next(iter(flow))
-            flow_dict = json.loads(flow[uid])
+            uid = new_flow["uid"]
+            flow_dict = new_flow["flow"]
             # Flow type is 'conn' or 'dns', etc.
             flow_type = flow_dict["flow_type"]
             dur = flow_dict["dur"]
@@ -81,7 +81,7 @@ class DNS(IFlowalertsAnalyzer):
             return False
         return True
 
-    def is_cname_contacted(self, answers, contacted_ips) -> bool:
+    def is_cname_contacted(self, answers, profileid, twid) -> bool:
         """
         check if any ip of the given CNAMEs is contacted
         """
@@ -90,9 +90,8 @@ class DNS(IFlowalertsAnalyzer):
                 # it's an ip
                 continue
             ips = self.db.get_domain_resolution(CNAME)
-            for ip in ips:
-                if ip in contacted_ips:
-                    return True
+            if self.db.was_any_ip_contacted(profileid, twid, ips):
+                return True
         return False
 
     @staticmethod
@@ -160,17 +159,9 @@ class DNS(IFlowalertsAnalyzer):
         if not other_ip:
             return False
         other_ip = other_ip[0]
-        # get the ips contacted by the other_ip
-        contacted_ips = self.db.get_all_contacted_ips_in_profileid_twid(
-            f"profile_{other_ip}", twid
-        )
-        if not contacted_ips:
-            return False
-
-        if daddr in contacted_ips:
-            # now we're sure that the connection was made
-            # by this computer but using a different ip version
-            return True
+        # now we're sure that the connection was made
+        # by this computer but using a different ip version
+        return self.db.was_ip_contacted(f"profile_{other_ip}", twid, daddr)
 
     def check_dns_without_connection(
         self,
@@ -220,30 +211,26 @@ class DNS(IFlowalertsAnalyzer):
             # self.print(f'No ips in the answer, so ignoring')
             return False
 
-        contacted_ips = self.db.get_all_contacted_ips_in_profileid_twid(
-            profileid, twid
-        )
-        # If contacted_ips is empty it can be because
+        # If none of the ips was contacted it can be because
         # we didnt read yet all the flows.
-        # This is automatically captured later in the
-        # for loop and we start a Timer
+        # This is automatically captured later and we start a Timer
 
         # every dns answer is a list of ips that correspond to 1 query,
         # one of these ips should be present in the contacted ips
         # check each one of the resolutions of this domain
-        for ip in self.extract_ips_from_dns_answers(answers):
-            # self.print(f'Checking if we have a connection to ip {ip}')
-            if (
-                ip in contacted_ips
-                or self.is_connection_made_by_different_version(
-                    profileid, twid, ip
-                )
+        ips: List[str] = self.extract_ips_from_dns_answers(answers)
+        if self.db.was_any_ip_contacted(profileid, twid, ips):
+            # this dns resolution has a connection. We can exit
+            return False
+
+        for ip in ips:
+            if self.is_connection_made_by_different_version(
+                profileid, twid, ip
             ):
-                # this dns resolution has a connection. We can exit
                 return False
 
         # Check if there was a connection to any of the CNAMEs
-        if self.is_cname_contacted(answers, contacted_ips):
+        if self.is_cname_contacted(answers, profileid, twid):
             # this is not a DNS without resolution
             return False
 
@@ -6,6 +6,7 @@ import time
 from slips_files.common.abstracts.flowalerts_analyzer import (
     IFlowalertsAnalyzer,
 )
+from slips_files.common.flow_encoding import decode_new_flow
 from slips_files.common.parsers.config_parser import ConfigParser
 from slips_files.common.slips_utils import utils
 
@@ -207,10 +208,8 @@ class SSL(IFlowalertsAnalyzer):
         profileid = msg["profileid"]
         twid = msg["twid"]
         timestamp = msg["stime"]
-        flow = msg["flow"]
-        flow = json.loads(flow)
-        uid = next(iter(flow))
-        flow_dict = json.loads(flow[uid])
+        uid = msg["uid"]
+        flow_dict = msg["flow"]
         daddr = flow_dict["daddr"]
         state = flow_dict["state"]
         dport: int = flow_dict.get("dport", None)
@@ -298,5 +297,5 @@ class SSL(IFlowalertsAnalyzer):
             )
 
         if msg := self.get_msg("new_flow"):
-            new_flow = json.loads(msg["data"])
+            new_flow = decode_new_flow(msg["data"])
             self.check_non_ssl_port_443_conns(new_flow)
@@ -2,11 +2,11 @@ from sklearn.linear_model import SGDClassifier
 from sklearn.preprocessing import StandardScaler
 import pickle
 import pandas as pd
-import json
 import datetime
 import traceback
 
 from slips_files.common.imports import *
+from slips_files.common.flow_encoding import decode_new_flow
 from slips_files.core.evidence_structure.evidence import (
     Evidence,
     ProfileID,
@@ -418,20 +418,11 @@ class FlowMLDetection(IModule):
 
     def main(self):
         if msg := self.get_msg("new_flow"):
-            data = msg["data"]
-            # Convert from json to dict
-            data = json.loads(data)
+            data = decode_new_flow(msg["data"])
             profileid = data["profileid"]
             twid = data["twid"]
-            # Get flow that is now in json format
-            flow = data["flow"]
-            # Convert flow to a dict
-            flow = json.loads(flow)
-            # Convert the common fields to something that can
-            # be interpreted
-            # Get the uid which is the key
-            uid = next(iter(flow))
-            self.flow_dict = json.loads(flow[uid])
+            uid = data["uid"]
+            self.flow_dict = data["flow"]
 
             if self.mode == "train":
                 # We are training
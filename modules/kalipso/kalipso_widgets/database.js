@@ -1,3 +1,14 @@
+const { execFile } = require('child_process')
+const path = require('path')
+
+/*Reads a key of an archived timewindow from the sqlite db given as the first argument*/
+const ARCHIVE_READER = `
+import json, sqlite3, sys
+conn = sqlite3.connect("file:" + sys.argv[1] + "?mode=ro", uri=True)
+row = conn.execute("SELECT key_type, data FROM archived_tws WHERE key = ?", (sys.argv[2],)).fetchone()
+print(json.dumps([row[0], json.loads(row[1])] if row else None))
+`
+
 class Redis{
     constructor(redis, redis_port){
         this.redis = redis
@@ -59,19 +70,45 @@ class Redis{
 	  	});})
     }
 
+    /*Get the data of a key of an archived timewindow. Slips moves the old closed timewindows from redis
+    to the archived_tws table of the sqlite db in the output dir, see archive_closed_tws() in database_manager.py.
+    zsets are returned as a list of their members sorted by score, like zrange.*/
+    getArchived(key, field){
+      return new Promise((resolve, reject)=>{this.db.hget("analysis", "output_dir", (err, output_dir)=>{
+        if(err || output_dir == null){resolve(null); return;}
+        execFile('python3', ['-c', ARCHIVE_READER, path.join(output_dir, 'flows.sqlite'), key], (err, stdout)=>{
+          if(err){resolve(null); return;}
+          const archived = JSON.parse(stdout)
+          if(archived == null){resolve(null); return;}
+          const [key_type, data] = archived
+          if(key_type == 'zset'){resolve(Object.keys(data).sort((a, b)=>data[a] - data[b])); return;}
+          if(field != undefined){resolve(data[field] === undefined ? null : data[field]); return;}
+          resolve(data)
+        })
+      });})
+    }
+
+    /*Return the reply of redis, or the archived data if the key isn't in redis anymore*/
+    orArchived(reply, key, field){
+      const empty = reply == null || (Array.isArray(reply) && reply.length == 0)
+      return empty ? this.getArchived(key, field) : reply
+    }
+
     /*Get timeline data for specific profile and timewindow*/
     getTimeline(ip, timewindow){
-      return new Promise((resolve, reject)=>{ this.db.zrange("profile_"+ip+"_"+timewindow+'_timeline',0,-1, (err,reply)=>{
+      const key = "profile_"+ip+"_"+timewindow+'_timeline'
+      return new Promise((resolve, reject)=>{ this.db.zrange(key,0,-1, (err,reply)=>{
           if(err){console.log('Error in getTimeline in kalipso_redis.js. Error: ',err); reject(err);}
-          else{resolve(reply);}
+          else{resolve(this.orArchived(reply, key));}
       });})
     }
 
     /*Get evidence for specific profile and timewindow*/
     getEvidence(ip, timewindow){
-      return new Promise ((resolve, reject)=>{this.db.hget("profile_"+ip+"_"+timewindow,'Evidence',(err,reply)=>{
+      const key = "profile_"+ip+"_"+timewindow
+      return new Promise ((resolve, reject)=>{this.db.hget(key,'Evidence',(err,reply)=>{
         if(err){console.log("Error in getEvidence() in kalipso_redis.js. Error: ",err); reject(err);}
-        else{resolve(reply);}
+        else{resolve(this.orArchived(reply, key, 'Evidence'));}
       });})
     }
 
@@ -101,50 +138,79 @@ class Redis{
 
     /*Get outtuples for specific profile and timewindow.*/
     getOutTuples(ip,timewindow){
-      return new Promise ((resolve, reject)=>{this.db.hget("profile_"+ip+"_"+timewindow,'OutTuples',(err,reply)=>{
+      const key = "profile_"+ip+"_"+timewindow
+      return new Promise ((resolve, reject)=>{this.db.hget(key,'OutTuples',(err,reply)=>{
         if(err){console.log("Error in getOutTuples in kalipso_redis.js. Error: ",err); reject(err);}
-        else{resolve(reply);}
+        else{resolve(this.orArchived(reply, key, 'OutTuples'));}
       });})
     }
 
     /*Get intuples for specific profile and timewindow*/
     getInTuples(ip,timewindow){
-      return new Promise ((resolve, reject)=>{this.db.hget("profile_"+ip+"_"+timewindow,'InTuples',(err,reply)=>{
+      const key = "profile_"+ip+"_"+timewindow
+      return new Promise ((resolve, reject)=>{this.db.hget(key,'InTuples',(err,reply)=>{
         if(err){console.log("Error in getInTuples in kalipso_redis.js. Error: ",err); reject(err);}
-        else{resolve(reply);}
+        else{resolve(this.orArchived(reply, key, 'InTuples'));}
+      });})
+    }
+
+    /*Rebuild the JSON of the ports or IPs of a profile and timewindow.
+    Slips stores them flat in the hash "profile_<ip>_<tw>_<key>" and the uids in the list
+    "profile_<ip>_<tw>_<key>_uids", see get_data_from_profile_tw() in profile_handler.py*/
+    getTWAggregate(ip, timewindow, key){
+      const hash_key = "profile_"+ip+"_"+timewindow+"_"+key
+      const is_ports = key.includes('Ports')
+      const ip_key = key.includes('Server') ? 'srcips' : 'dstips'
+      const build = (fields, uids)=>{
+        let data = {}
+        Object.entries(fields).forEach(([field, value])=>{
+          const parts = field.split('|')
+          const entry = data[parts[0]] = data[parts[0]] || (is_ports ? {[ip_key]: {}} : {'uid': [], 'dstports': {}})
+          if(is_ports && parts.length == 3){
+            const ip_data = entry[ip_key][parts[1]] = entry[ip_key][parts[1]] || {'uid': []}
+            ip_data[parts[2]] = parts[2] == 'stime' ? value : parseInt(value)
+          }
+          else if(parts.length == 3){entry['dstports'][parts[2]] = parseInt(value)}
+          else{entry[parts[1]] = parts[1] == 'stime' ? value : parseInt(value)}
+        })
+        uids.forEach(uid_entry=>{
+          const parts = uid_entry.split('|')
+          try{
+            if(is_ports){data[parts[0]][ip_key][parts[1]]['uid'].push(parts.slice(2).join('|'))}
+            else{data[parts[0]]['uid'].push(parts.slice(1).join('|'))}
+          }
+          catch(e){}
+        })
+        return JSON.stringify(data)
+      }
+      return new Promise ((resolve, reject)=>{this.db.multi().hgetall(hash_key).lrange(hash_key+"_uids", 0, -1).exec((err,replies)=>{
+        if(err){console.log("Error in getTWAggregate in kalipso_redis.js. Error: ",err); reject(err); return;}
+        if(replies[0] != null){resolve(build(replies[0], replies[1])); return;}
+        // the timewindow may be archived
+        Promise.all([this.getArchived(hash_key), this.getArchived(hash_key+"_uids")]).then(([fields, uids])=>{
+          resolve(fields == null ? null : build(fields, uids || []))
+        })
       });})
     }
 
     /*Get data for UDP established connections (dst/src ports/ips client/server) for specific profile and timewindow*/
     getUDPest(ip, timewindow,udp_key){
-      return new Promise ((resolve, reject)=>{this.db.hget("profile_"+ip+"_"+timewindow, udp_key,(err,reply)=>{
-        if(err){console.log("Error in getUDPest in kalipso_redis.js. Error: ",err); reject(err);}
-        else{resolve(reply);}
-      });})
+      return this.getTWAggregate(ip, timewindow, udp_key)
     }
 
     /*Get data for TCP established (dst/src ports/IPs client/server) for specific profile and timewindow.*/
     getTCPest(ip, timewindow,tcp_key){
-      return new Promise ((resolve, reject)=>{this.db.hget("profile_"+ip+"_"+timewindow,tcp_key,(err,reply)=>{
-        if(err){console.log("Error in getTCPest in kalipso_redis.js. Error: ",err); reject(err);}
-        else{resolve(reply);}
-      });})
+      return this.getTWAggregate(ip, timewindow, tcp_key)
     }
 
     /*Get data for UDP notestablished (dst/src ports/IPs client/server) for specific profile and timewindow*/
     getUDPnotest(ip, timewindow,udp_key){
-      return new Promise ((resolve, reject)=>{this.db.hget("profile_"+ip+"_"+timewindow, udp_key,(err,reply)=>{
-        if(err){console.log("Error in getUDPnotest in kalipso_redis.js. Error: ",err); reject(err);}
-        else{resolve(reply);}
-      });})
+      return this.getTWAggregate(ip, timewindow, udp_key)
     }
 
     /*Get data for TCP notestablished (dst/src port/ips client/server) for specific profile and timewindow*/
     getTCPnotest(ip, timewindow,tcp_key){
-      return new Promise ((resolve, reject)=>{this.db.hget("profile_"+ip+"_"+timewindow,tcp_key,(err,reply)=>{
-        if(err){console.log("Error in getTCPnotest in kalipso_redis.js. Error: ",err); reject(err);}
-        else{resolve(reply);}
-      });})
+      return this.getTWAggregate(ip, timewindow, tcp_key)
     }
 
     /*Get all evidence for specific profile.*/
@@ -3,16 +3,20 @@ import base64
 import time
 import binascii
 import os
-import subprocess
-import json
 import shutil
 from typing import (
-    Dict,
     List,
+    Optional,
 )
 
 from slips_files.common.slips_utils import utils
 from slips_files.common.abstracts.module import IModule
+from modules.leak_detector.pcap_index import PcapIndex
+from modules.leak_detector.yara_scanner import (
+    YaraMatch,
+    YaraScanError,
+    YaraScanner,
+)
 from slips_files.core.evidence_structure.evidence import (
     Evidence,
     ProfileID,
@@ -46,8 +50,12 @@ class LeakDetector(IModule):
         self.compiled_yara_rules_path = (
             "modules/leak_detector/yara_rules/compiled/"
         )
+        self.scanner = YaraScanner(
+            self.yara_rules_path, self.compiled_yara_rules_path
+        )
         self.bin_found = False
-        if self.is_yara_installed():
+        # yara-python doesn't need the yara bin
+        if self.scanner.uses_yara_python() or self.is_yara_installed():
             self.bin_found = True
 
     def is_yara_installed(self) -> bool:
@@ -65,127 +73,39 @@ class LeakDetector(IModule):
         )
         return False
 
-    def fix_json_packet(self, json_packet):
+    def get_pcap_index(self) -> Optional[PcapIndex]:
         """
-        in very large pcaps, tshark gets killed before it's done processing,
-        but the first packet info is printed in a corrupted json format
-        this function fixes the printed packet
+        indexes the packets of the given pcap once, the index is used
+        to find the packets of all yara matches
         """
-        json_packet = json_packet.replace("Killed", "")
-        json_packet += "}]"
-        try:
-            return json.loads(json_packet)
-        except json.decoder.JSONDecodeError:
-            return False
+        if not hasattr(self, "pcap_index"):
+            try:
+                self.pcap_index = PcapIndex(self.pcap)
+            except (OSError, ValueError) as e:
+                self.print(f"Unable to index the packets of the pcap. {e}")
+                self.pcap_index = None
+        return self.pcap_index
 
     def get_packet_info(self, offset: int):
         """
         Parse pcap and determine the packet at this offset
         returns  a tuple with packet info (srcip, dstip, proto, sport, dport, ts) or False if not found
         """
-        offset = int(offset)
-        with open(self.pcap, "rb") as f:
-            # every pcap header is 24 bytes
-            f.read(24)
-            packet_number = 0
-
-            packet_data_length = True
-            while packet_data_length:
-                # the number of the packet we're currently working with,
-                # since packets start from 1 in tshark,
-                # the first packet should be 1
-                packet_number += 1
-                # this offset is exactly when the packet starts
-                start_offset = f.tell() + 1
-                # get the Packet header, every packet header is exactly 16 bytes long
-                packet_header = f.read(16)
-                # get the length of the Packet Data field
-                # (the second last 4 bytes of the header),
-                # [::-1] for little endian
-                packet_data_length = packet_header[8:12][::-1]
-                # convert the hex into decimal
-                packet_length_in_decimal = int.from_bytes(
-                    packet_data_length, "big"
-                )
-
-                # read until the end of this packet
-                f.read(packet_length_in_decimal)
-                # this offset is exactly when the packet ends
-                end_offset = f.tell()
-                if offset <= end_offset and offset >= start_offset:
-                    # print(f"Found a match. Packet number in wireshark: {packet_number+1}")
-                    # use tshark to get packet info
-                    cmd = f'tshark -r "{self.pcap}" -T json -Y frame.number=={packet_number}'
-                    tshark_proc = subprocess.Popen(
-                        cmd,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.DEVNULL,
-                        stdin=subprocess.PIPE,
-                        shell=True,
-                    )
-
-                    result, error = tshark_proc.communicate()
-                    if error:
-                        self.print(
-                            f"tshark error {tshark_proc.returncode}: {error.strip()}"
-                        )
-                        return
-
-                    json_packet: str = result.decode()
-
-                    try:
-                        json_packet: List[Dict[str, str]] = json.loads(
-                            json_packet
-                        )
-                    except json.decoder.JSONDecodeError:
-                        json_packet = self.fix_json_packet(json_packet)
-
-                    if json_packet:
-                        # sometime tshark can't find the desired packet?
-                        json_packet = json_packet[0]["_source"]["layers"]
-
-                        # get ip family and used protocol
-                        used_protocols = json_packet["frame"][
-                            "frame.protocols"
-                        ]
-                        ip_family = (
-                            "ipv6" if "ipv6" in used_protocols else "ip"
-                        )
-                        if "tcp" in used_protocols:
-                            proto = "tcp"
-                        elif "udp" in used_protocols:
-                            proto = "udp"
-                        else:
-                            # probably ipv6.hopopt
-                            return
-
-                        try:
-                            ts = json_packet["frame"]["frame.time_epoch"]
-                            srcip = json_packet[ip_family][f"{ip_family}.src"]
-                            dstip = json_packet[ip_family][f"{ip_family}.dst"]
-                            sport = json_packet[proto][f"{proto}.srcport"]
-                            dport = json_packet[proto][f"{proto}.dstport"]
-                        except KeyError:
-                            return
-
-                        return (srcip, dstip, proto, sport, dport, ts)
-
-        return False
+        pcap_index: Optional[PcapIndex] = self.get_pcap_index()
+        if not pcap_index:
+            return False
+        return pcap_index.get_packet_info(int(offset)) or False
 
-    def set_evidence_yara_match(self, info: dict):
+    def set_evidence_yara_match(self, match: YaraMatch):
         """
         This function is called when yara finds a match
-        :param info: a dict with info about the matched rule,
-         example keys 'vars_matched', 'index',
-        'rule', 'srings_matched'
+        :param match: info about the matched rule
         """
-        rule = info.get("rule").replace("_", " ")
-        offset = info.get("offset")
-        # vars_matched = info.get('vars_matched')
-        strings_matched = info.get("strings_matched")
+        rule = match.rule.replace("_", " ")
+        strings_matched = match.strings_matched
         # we now know there's a match at offset x, we need
         # to know offset x belongs to which packet
-        packet_info = self.get_packet_info(offset)
+        packet_info = self.get_packet_info(match.offset)
         if not packet_info:
             return
 
@@ -204,9 +124,6 @@ class LeakDetector(IModule):
         # generate a random uid
         uid = base64.b64encode(binascii.b2a_hex(os.urandom(9))).decode("utf-8")
         profileid = f"profile_{srcip}"
-        # sometimes this module tries to find the profile before it's created. so
-        # wait a while before alerting.
-        time.sleep(4)
 
         ip_identification = self.db.get_ip_identification(dstip)
         description = (
@@ -265,6 +182,22 @@ class LeakDetector(IModule):
 
         self.db.set_evidence(evidence)
 
+    def set_evidence_yara_matches(self, matches: List[YaraMatch]):
+        """
+        sets evidence for all the matches found by find_matches()
+        :param matches: info about each matched rule
+        """
+        # sometimes this module tries to find the profile before it's
+        # created. so wait a while before alerting.
+        time.sleep(4)
+        try:
+            for match in matches:
+                self.set_evidence_yara_match(match)
+        finally:
+            if getattr(self, "pcap_index", None):
+                self.pcap_index.close()
+                del self.pcap_index
+
     def compile_and_save_rules(self):
         """
         Compile and save all yara rules in the compiled_yara_rules_path
@@ -303,63 +236,22 @@ class LeakDetector(IModule):
 
     def find_matches(self):
         """Run yara rules on the given pcap and find matches"""
-        for compiled_rule in os.listdir(self.compiled_yara_rules_path):
-            compiled_rule_path = os.path.join(
-                self.compiled_yara_rules_path, compiled_rule
-            )
-            # -p 7 means use 7 threads for faster analysis
-            # -f to stop searching for strings when they were already found
-            # -s prints the found string
-            cmd = f'yara -C {compiled_rule_path} "{self.pcap}" -p 7 -f -s '
-            yara_proc = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                stdin=subprocess.PIPE,
-                shell=True,
-            )
-
-            lines, error = yara_proc.communicate()
-            lines = lines.decode()
-            if error:
-                if (
-                    b"rules were compiled with a different version of YARA"
-                    in error.strip()
-                ):
-                    self.delete_compiled_rules()
-                    # will re-compile and save rules again and try to find matches
-                    self.run()
-                else:
-                    self.print(
-                        f"YARA error {yara_proc.returncode}: {error.strip()}"
-                    )
-                    return
-
-            if not lines:
-                # no match
-                return
+        try:
+            matches: List[YaraMatch] = self.scanner.scan(self.pcap)
+        except YaraScanError as e:
+            if "rules were compiled with a different version of YARA" in str(
+                e
+            ):
+                self.delete_compiled_rules()
+                # will re-compile and save rules again and try to find matches
+                self.run()
+            else:
+                self.print(str(e))
+            return
 
-            lines = lines.splitlines()
-            matching_rule = lines[0].split()[0]
-            # each match (line) should be a separate detection(yara match)
-            for line in lines[1:]:
-                # example of a line: 0x4e15c:$rgx_gps_loc: ll=00.000000,-00.000000
-                line = line.split(":")
-                # offset: pcap index where the rule was matched
-                offset = int(line[0], 16)
-                # var is either $rgx_gps_loc, $rgx_gps_lon or $rgx_gps_lat
-                var = line[1].replace("$", "")
-                # strings_matched is exactly the string that was found that triggered this detection
-                # starts from the var until the end of the line
-                strings_matched = " ".join(list(line[2:]))
-                self.set_evidence_yara_match(
-                    {
-                        "rule": matching_rule,
-                        "vars_matched": var,
-                        "strings_matched": strings_matched,
-                        "offset": offset,
-                    }
-                )
+        if matches:
+            # each match should be a separate detection(yara match)
+            self.set_evidence_yara_matches(matches)
 
     def pre_main(self):
         utils.drop_root_privs()
@@ -368,8 +260,9 @@ class LeakDetector(IModule):
             # yara is not installed
             return 1
 
-        # if we we don't have compiled rules, compile them
-        if self.compile_and_save_rules():
+        # if we we don't have compiled rules, compile them.
+        # yara-python compiles them itself
+        if self.scanner.uses_yara_python() or self.compile_and_save_rules():
             # run the yara rules on the given pcap
             self.find_matches()
 
@@ -0,0 +1,190 @@
+import ipaddress
+import mmap
+import struct
+from array import array
+from bisect import bisect_right
+from typing import (
+    Optional,
+    Tuple,
+)
+
+# {magic number: (byte order, whether the ts fraction is in nanoseconds)}
+PCAP_MAGIC_NUMBERS = {
+    b"\xd4\xc3\xb2\xa1": ("<", False),
+    b"\xa1\xb2\xc3\xd4": (">", False),
+    b"\x4d\x3c\xb2\xa1": ("<", True),
+    b"\xa1\xb2\x3c\x4d": (">", True),
+}
+GLOBAL_HEADER_LEN = 24
+RECORD_HEADER_LEN = 16
+# link layer types
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = (101, 228, 229)
+LINKTYPE_LINUX_SLL = 113
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = (0x8100, 0x88A8)
+IPV6_EXTENSION_HEADERS = (0, 43, 60)
+IPV6_FRAGMENT_HEADER = 44
+PROTOCOLS = {6: "tcp", 17: "udp"}
+
+
+class PcapIndex:
+    """
+    Maps the byte offsets of a pcap to the packets they belong to.
+
+    The pcap is read once using mmap to find where each packet starts,
+    then the packet at any offset is found with a binary search and its
+    5-tuple and timestamp are parsed from the mapped bytes.
+    Only the classic pcap format is supported, not pcapng.
+    """
+
+    def __init__(self, pcap_path: str):
+        self.file = open(pcap_path, "rb")
+        self.pcap = b""
+        try:
+            self.open(pcap_path)
+        except Exception:
+            # the caller never gets this obj, so it can't close it
+            self.close()
+            raise
+
+    def open(self, pcap_path: str):
+        try:
+            self.pcap = mmap.mmap(
+                self.file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        except ValueError:
+            # empty file
+            self.pcap = b""
+
+        magic = self.pcap[:4]
+        if len(self.pcap) < GLOBAL_HEADER_LEN or (
+            magic not in PCAP_MAGIC_NUMBERS
+        ):
+            raise ValueError(f"{pcap_path} is not a pcap file.")
+
+        byte_order, self.nanosecond_ts = PCAP_MAGIC_NUMBERS[magic]
+        self.record_header = struct.Struct(f"{byte_order}IIII")
+        self.link_type = struct.unpack_from(f"{byte_order}I", self.pcap, 20)[0]
+        # the offset of the record header of each packet
+        self.packet_offsets = array("Q")
+        self.build()
+
+    def build(self):
+        offset = GLOBAL_HEADER_LEN
+        pcap_len = len(self.pcap)
+        unpack_from = self.record_header.unpack_from
+        while offset + RECORD_HEADER_LEN <= pcap_len:
+            self.packet_offsets.append(offset)
+            included_len = unpack_from(self.pcap, offset)[2]
+            offset += RECORD_HEADER_LEN + included_len
+
+    def close(self):
+        if isinstance(self.pcap, mmap.mmap):
+            self.pcap.close()
+        self.file.close()
+
+    def __len__(self):
+        return len(self.packet_offsets)
+
+    def get_packet_number(self, offset: int) -> Optional[int]:
+        """
+        returns the number of the packet containing the given byte
+        offset. packets start from 1, like in wireshark
+        """
+        if offset < GLOBAL_HEADER_LEN or offset >= len(self.pcap):
+            return
+        return bisect_right(self.packet_offsets, offset)
+
+    def get_packet_info(
+        self, offset: int
+    ) -> Optional[Tuple[str, str, str, int, int, float]]:
+        """
+        returns the (srcip, dstip, proto, sport, dport, ts) of the packet
+        containing the given byte offset. or None if it's not a tcp or
+        udp packet
+        """
+        packet_number = self.get_packet_number(offset)
+        if not packet_number:
+            return
+
+        record_offset = self.packet_offsets[packet_number - 1]
+        ts_sec, ts_fraction, included_len, _ = self.record_header.unpack_from(
+            self.pcap, record_offset
+        )
+        ts = ts_sec + ts_fraction / (1e9 if self.nanosecond_ts else 1e6)
+        start = record_offset + RECORD_HEADER_LEN
+        packet = self.pcap[start : start + included_len]
+        try:
+            flow = self.parse_packet(packet)
+        except (struct.error, IndexError, ValueError):
+            # truncated packet
+            return
+        if flow:
+            return (*flow, ts)
+
+    def get_network_layer(self, packet: bytes) -> Tuple[Optional[int], int]:
+        """
+        returns the ethertype of the network layer of the given packet
+        and the offset where it starts
+        """
+        if self.link_type == LINKTYPE_ETHERNET:
+            ethertype, offset = struct.unpack_from("!H", packet, 12)[0], 14
+            while ethertype in ETHERTYPE_VLAN:
+                ethertype = struct.unpack_from("!H", packet, offset + 2)[0]
+                offset += 4
+            return ethertype, offset
+
+        if self.link_type == LINKTYPE_LINUX_SLL:
+            return struct.unpack_from("!H", packet, 14)[0], 16
+
+        if self.link_type in LINKTYPE_RAW or self.link_type == LINKTYPE_NULL:
+            offset = 4 if self.link_type == LINKTYPE_NULL else 0
+            version = packet[offset] >> 4
+            ethertype = {4: ETHERTYPE_IPV4, 6: ETHERTYPE_IPV6}.get(version)
+            return ethertype, offset
+
+        return None, 0
+
+    def parse_packet(
+        self, packet: bytes
+    ) -> Optional[Tuple[str, str, str, int, int]]:
+        ethertype, offset = self.get_network_layer(packet)
+        if ethertype == ETHERTYPE_IPV4:
+            header_len = (packet[offset] & 0x0F) * 4
+            fragment_offset = struct.unpack_from("!H", packet, offset + 6)[0]
+            if fragment_offset & 0x1FFF:
+                # not the first fragment, there's no transport header
+                return
+            protocol = packet[offset + 9]
+            srcip = ipaddress.IPv4Address(packet[offset + 12 : offset + 16])
+            dstip = ipaddress.IPv4Address(packet[offset + 16 : offset + 20])
+            offset += header_len
+
+        elif ethertype == ETHERTYPE_IPV6:
+            protocol = packet[offset + 6]
+            srcip = ipaddress.IPv6Address(packet[offset + 8 : offset + 24])
+            dstip = ipaddress.IPv6Address(packet[offset + 24 : offset + 40])
+            offset += 40
+            while protocol in IPV6_EXTENSION_HEADERS + (IPV6_FRAGMENT_HEADER,):
+                next_header = packet[offset]
+                if protocol == IPV6_FRAGMENT_HEADER:
+                    if (
+                        struct.unpack_from("!H", packet, offset + 2)[0]
+                        & 0xFFF8
+                    ):
+                        return
+                    offset += 8
+                else:
+                    offset += (packet[offset + 1] + 1) * 8
+                protocol = next_header
+        else:
+            return
+
+        if protocol not in PROTOCOLS:
+            return
+
+        sport, dport = struct.unpack_from("!HH", packet, offset)
+        return str(srcip), str(dstip), PROTOCOLS[protocol], sport, dport
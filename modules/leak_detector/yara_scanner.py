@@ -0,0 +1,267 @@
+import mmap
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import (
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+try:
+    import yara
+except ImportError:
+    # yara-python is optional, the yara cli is used without it
+    yara = None
+
+
+@dataclass
+class YaraMatch:
+    # the name of the matched rule
+    rule: str
+    # the yara string that matched, without the $. e.g. rgx_gps_loc
+    var: str
+    # the offset of the match in the scanned file
+    offset: int
+    # the data that matched
+    strings_matched: str
+
+
+class YaraScanError(Exception):
+    pass
+
+
+# the rules used by each scanning process
+worker_rules = None
+
+
+def compile_rules(rules_paths: Iterable[str]):
+    """
+    compiles the given .yara files into one set of rules
+    """
+    try:
+        return yara.compile(
+            filepaths={
+                os.path.basename(rule_path): rule_path
+                for rule_path in rules_paths
+            }
+        )
+    except yara.Error as e:
+        raise YaraScanError(str(e)) from e
+
+
+def init_worker(rules_paths: List[str]):
+    global worker_rules
+    worker_rules = compile_rules(rules_paths)
+
+
+def get_string_matches(match) -> Iterable[Tuple[int, str, bytes]]:
+    """
+    yields the (offset, identifier, data) of each string that matched.
+    yara-python >= 4.3 returns StringMatch objects, older versions
+    return tuples
+    """
+    for string in match.strings:
+        if isinstance(string, tuple):
+            yield string
+            continue
+        for instance in string.instances:
+            yield instance.offset, string.identifier, instance.matched_data
+
+
+def match_chunk(
+    rules, data, start: int, end: int, overlap: int
+) -> List[YaraMatch]:
+    """
+    scans data[start:end] and the overlap after it. matches starting in
+    the overlap are ignored, they're found when scanning the next chunk
+    """
+    matches = []
+    chunk = data[start : end + overlap]
+    try:
+        rule_matches = rules.match(data=chunk, fast=True)
+    except yara.Error as e:
+        # e.g. a timeout
+        raise YaraScanError(str(e)) from e
+
+    for match in rule_matches:
+        for offset, identifier, matched_data in get_string_matches(match):
+            offset += start
+            if offset >= end:
+                continue
+            matches.append(
+                YaraMatch(
+                    rule=match.rule,
+                    var=identifier.replace("$", ""),
+                    offset=offset,
+                    strings_matched=matched_data.decode(errors="replace"),
+                )
+            )
+    return matches
+
+
+def scan_chunk(
+    file_path: str, start: int, end: int, overlap: int
+) -> List[YaraMatch]:
+    """
+    runs in the scanning processes, scans one chunk of the given file
+    """
+    with open(file_path, "rb") as file, mmap.mmap(
+        file.fileno(), 0, access=mmap.ACCESS_READ
+    ) as data:
+        return match_chunk(worker_rules, data, start, end, overlap)
+
+
+class YaraScanner:
+    """
+    Scans files using all the yara rules at once.
+
+    If yara-python is installed, the rules are compiled once and the
+    file is scanned through a memory map. Files larger than chunk_size
+    are split into chunks that overlap by chunk_overlap bytes, and the
+    chunks are scanned in parallel by a pool of processes.
+    a rule whose strings are found in different chunks doesn't match,
+    the same way it wouldn't match in different packets.
+
+    Otherwise the yara cli is used with each of the rules compiled
+    by yarac.
+    """
+
+    chunk_size = 64 * 1024 * 1024
+    chunk_overlap = 64 * 1024
+
+    def __init__(self, rules_dir: str, compiled_rules_dir: str):
+        self.rules_dir = rules_dir
+        self.compiled_rules_dir = compiled_rules_dir
+        self.rules = None
+        self.max_workers: int = os.cpu_count() or 1
+
+    @staticmethod
+    def uses_yara_python() -> bool:
+        return yara is not None
+
+    def get_rules_paths(self, rules_dir: str) -> List[str]:
+        return [
+            os.path.join(rules_dir, rule)
+            for rule in sorted(os.listdir(rules_dir))
+        ]
+
+    def scan(self, file_path: str) -> List[YaraMatch]:
+        """
+        returns the matches of all rules in the given file
+        :raises YaraScanError: if the rules can't be loaded or yara fails
+        """
+        if self.uses_yara_python():
+            return self.scan_in_process(file_path)
+        return self.scan_using_cli(file_path)
+
+    def get_chunks(self, file_size: int) -> List[Tuple[int, int]]:
+        return [
+            (start, min(start + self.chunk_size, file_size))
+            for start in range(0, file_size, self.chunk_size)
+        ]
+
+    def scan_in_process(self, file_path: str) -> List[YaraMatch]:
+        rules_paths = self.get_rules_paths(self.rules_dir)
+        file_size = os.path.getsize(file_path)
+        if not rules_paths or not file_size:
+            return []
+
+        chunks = self.get_chunks(file_size)
+        if len(chunks) == 1 or self.max_workers == 1:
+            if not self.rules:
+                self.rules = compile_rules(rules_paths)
+            with open(file_path, "rb") as file, mmap.mmap(
+                file.fileno(), 0, access=mmap.ACCESS_READ
+            ) as data:
+                matches = []
+                for start, end in chunks:
+                    matches += match_chunk(
+                        self.rules, data, start, end, self.chunk_overlap
+                    )
+                return matches
+
+        matches = []
+        try:
+            with ProcessPoolExecutor(
+                max_workers=min(self.max_workers, len(chunks)),
+                initializer=init_worker,
+                initargs=(rules_paths,),
+            ) as pool:
+                futures = [
+                    pool.submit(
+                        scan_chunk, file_path, start, end, self.chunk_overlap
+                    )
+                    for start, end in chunks
+                ]
+                for future in futures:
+                    matches += future.result()
+        except BrokenProcessPool as e:
+            # a scanning process died, or init_worker() failed to
+            # compile the rules
+            raise YaraScanError(f"The yara scanning pool broke: {e}") from e
+        return matches
+
+    def scan_using_cli(self, file_path: str) -> List[YaraMatch]:
+        matches = []
+        for compiled_rule_path in self.get_rules_paths(
+            self.compiled_rules_dir
+        ):
+            # -C the rules are compiled
+            # -p 7 means use 7 threads for faster analysis
+            # -f to stop searching for strings when they were already found
+            # -s prints the found string
+            yara_proc = subprocess.run(
+                [
+                    "yara",
+                    "-C",
+                    compiled_rule_path,
+                    file_path,
+                    "-p",
+                    "7",
+                    "-f",
+                    "-s",
+                ],
+                capture_output=True,
+            )
+            if yara_proc.stderr:
+                raise YaraScanError(
+                    f"YARA error {yara_proc.returncode}: "
+                    f"{yara_proc.stderr.decode(errors='replace').strip()}"
+                )
+            matches += self.parse_cli_output(
+                yara_proc.stdout.decode(errors="replace")
+            )
+        return matches
+
+    @staticmethod
+    def parse_cli_output(output: str) -> List[YaraMatch]:
+        """
+        parses the output of yara -s. it looks like this
+            NETWORK_gps_location_leaked file.pcap
+            0x4e15c:$rgx_gps_loc: ll=00.000000,-00.000000
+        """
+        matches = []
+        rule: Optional[str] = None
+        for line in output.splitlines():
+            if not line.startswith("0x"):
+                # the name of the matching rule, followed by the file
+                rule = line.split()[0] if line.strip() else None
+                continue
+            if not rule:
+                continue
+
+            offset, var, strings_matched = line.split(":", 2)
+            matches.append(
+                YaraMatch(
+                    rule=rule,
+                    var=var.replace("$", ""),
+                    # pcap index where the rule was matched
+                    offset=int(offset, 16),
+                    strings_matched=strings_matched.strip(),
+                )
+            )
+        return matches
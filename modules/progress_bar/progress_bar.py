@@ -43,6 +43,10 @@ class PBar(IModule):
         self.pipe = pipe
         self.done_reading_flows = False
         self.pbar_finished: Event = pbar_finished
+        # when using many profiler workers, some of them may send updates
+        # before the pbar is initialized by the worker that received
+        # the total flows. we keep count of them here
+        self.updates_before_init = 0
 
     def remove_stats(self):
         # remove the stats from the progress bar
@@ -68,27 +72,30 @@ class PBar(IModule):
             smoothing=1,
             bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} {postfix}",
             position=0,
-            initial=0,  # initial value of the flows processed
+            # initial value of the flows processed
+            initial=self.updates_before_init,
             file=sys.stdout,
         )
 
-    def update_bar(self):
+    def update_bar(self, flows: int = 1):
         """
         wrapper for tqdm.update()
-        adds 1 to the number of flows processed
+        adds the given flows to the number of flows processed
         """
 
         if not hasattr(self, "progress_bar"):
             # this module wont have the progress_bar set if it's running
             # on pcap or interface
             # or if the output is redirected to a file!
+            # or if the pbar isn't initialized yet
+            self.updates_before_init += flows
             return
 
         if self.slips_mode == "daemonized":
             return
 
-        self.progress_bar.update(1)
-        if self.progress_bar.n == self.total_flows:
+        self.progress_bar.update(flows)
+        if self.progress_bar.n >= self.total_flows:
             self.terminate()
 
     def terminate(self):
@@ -135,7 +142,7 @@ class PBar(IModule):
                 self.initialize_pbar(msg)
 
             if event == "update_bar":
-                self.update_bar()
+                self.update_bar(msg.get("flows", 1))
 
             if event == "update_stats":
                 self.update_stats(msg)
@@ -12,6 +12,7 @@ from typing import Dict, List
 from slips_files.common.parsers.config_parser import ConfigParser
 from slips_files.common.slips_utils import utils
 from slips_files.common.abstracts.module import IModule
+from slips_files.common.ip_ranges import IPRangesIndex
 from modules.threat_intelligence.urlhaus import URLhaus
 from slips_files.core.evidence_structure.evidence import (
     Evidence,
@@ -58,9 +59,11 @@ class ThreatIntel(IModule, URLhaus):
         self.separator = self.db.get_field_separator()
         self.c1 = self.db.subscribe("give_threat_intelligence")
         self.c2 = self.db.subscribe("new_downloaded_file")
+        self.c3 = self.db.subscribe("reload_malicious_ip_ranges")
         self.channels = {
             "give_threat_intelligence": self.c1,
             "new_downloaded_file": self.c2,
+            "reload_malicious_ip_ranges": self.c3,
         }
         self.__read_configuration()
         self.get_malicious_ip_ranges()
@@ -113,34 +116,15 @@ class ThreatIntel(IModule, URLhaus):
         self.circl_session.headers = {"accept": "application/json"}
 
     def get_malicious_ip_ranges(self):
-        """Retrieves and caches the malicious IP ranges from the database, separating
-        them into IPv4 and IPv6 ranges. These ranges are stored in dictionaries indexed
-        by the first octet (or hextet for IPv6) of the range, to optimize lookup times.
+        """Retrieves the malicious IP ranges from the database and indexes
+        them in an IPRangesIndex for fast lookups.
+        The new index replaces the old one only once it's fully built.
 
         Side Effects:
-            - Populates `cached_ipv4_ranges` and `cached_ipv6_ranges`
-            dictionaries with malicious IP ranges categorized by their
-            first octet or hextet.
+            - Sets the `ip_ranges_index` attribute.
         """
         ip_ranges = self.db.get_malicious_ip_ranges()
-        self.cached_ipv6_ranges = {}
-        self.cached_ipv4_ranges = {}
-        for range in ip_ranges.keys():
-            if "." in range:
-                first_octet = range.split(".")[0]
-                try:
-                    self.cached_ipv4_ranges[first_octet].append(range)
-                except KeyError:
-                    # first time seeing this octet
-                    self.cached_ipv4_ranges[first_octet] = [range]
-            else:
-                # ipv6 range
-                first_octet = range.split(":")[0]
-                try:
-                    self.cached_ipv6_ranges[first_octet].append(range)
-                except KeyError:
-                    # first time seeing this octet
-                    self.cached_ipv6_ranges[first_octet] = [range]
+        self.ip_ranges_index = IPRangesIndex(ip_ranges.keys())
 
     def __read_configuration(self):
         """Reads the module's configuration settings from a configuration file or
@@ -1487,39 +1471,27 @@ class ThreatIntel(IModule, URLhaus):
             the IP is found within a blacklisted range.
         """
 
-        ip_obj = ipaddress.ip_address(ip)
-        # Malicious IP ranges are stored in slips sorted by the first octet
-        # so get the ranges that match the fist octet of the given IP
-        if validators.ipv4(ip):
-            first_octet = ip.split(".")[0]
-            ranges_starting_with_octet = self.cached_ipv4_ranges.get(
-                first_octet, []
-            )
-        elif validators.ipv6(ip):
-            first_octet = ip.split(":")[0]
-            ranges_starting_with_octet = self.cached_ipv6_ranges.get(
-                first_octet, []
-            )
-        else:
+        range = self.ip_ranges_index.lookup(ip)
+        if not range:
             return False
 
-        for range in ranges_starting_with_octet:
-            if ip_obj in ipaddress.ip_network(range):
-                # ip was found in one of the blacklisted ranges
-                ip_info = self.db.get_malicious_ip_ranges()[range]
-                ip_info = json.loads(ip_info)
-                self.set_evidence_malicious_ip(
-                    ip,
-                    uid,
-                    daddr,
-                    timestamp,
-                    ip_info,
-                    profileid,
-                    twid,
-                    ip_state,
-                )
-                return True
-        return False
+        ip_info = self.db.get_malicious_ip_range(range)
+        if not ip_info:
+            # the range was removed from the db after the index was built
+            return False
+
+        # ip was found in one of the blacklisted ranges
+        self.set_evidence_malicious_ip(
+            ip,
+            uid,
+            daddr,
+            timestamp,
+            json.loads(ip_info),
+            profileid,
+            twid,
+            ip_state,
+        )
+        return True
 
     def search_offline_for_domain(self, domain):
         """Checks if the provided domain name is listed in the
@@ -1988,6 +1960,8 @@ class ThreatIntel(IModule, URLhaus):
         )
         for local_file in local_files:
             self.update_local_file(local_file)
+        # index the ranges of the local files too
+        self.get_malicious_ip_ranges()
 
         self.circllu_calls_thread.start()
 
@@ -2063,6 +2037,10 @@ class ThreatIntel(IModule, URLhaus):
                     to_lookup, uid, timestamp, daddr, profileid, twid
                 )
 
+        if self.get_msg("reload_malicious_ip_ranges"):
+            # the update manager loaded new TI feeds
+            self.get_malicious_ip_ranges()
+
         if msg := self.get_msg("new_downloaded_file"):
             file_info: dict = json.loads(msg["data"])
             # the format of file_info is as follows
@@ -1,8 +1,8 @@
 import traceback
 import sys
 import time
-import json
 
+from slips_files.common.flow_encoding import decode_new_flow
 from slips_files.common.parsers.config_parser import ConfigParser
 from slips_files.common.slips_utils import utils
 from slips_files.common.abstracts.module import IModule
@@ -24,6 +24,9 @@ class Timeline(IModule):
         self.channels = {
             "new_flow": self.c1,
         }
+        self.channel_handlers = {
+            "new_flow": self.handle_new_flow,
+        }
         # Read information how we should print timestamp.
         conf = ConfigParser()
         self.is_human_timestamp = conf.timeline_human_timestamp()
@@ -34,7 +37,9 @@ class Timeline(IModule):
             timestamp = utils.convert_format(timestamp, utils.alerts_format)
         return str(timestamp)
 
-    def process_flow(self, profileid, twid, flow, timestamp: float):
+    def process_flow(
+        self, profileid, twid, uid: str, flow_dict: dict, timestamp: float
+    ):
         """
         Process the received flow  for this profileid and twid
          so its printed by the logprocess later
@@ -42,9 +47,6 @@ class Timeline(IModule):
         timestamp_human = self.process_timestamp(timestamp)
 
         try:
-            # Convert the common fields to something that can be interpreted
-            uid = next(iter(flow))
-            flow_dict = json.loads(flow[uid])
             profile_ip = profileid.split("_")[1]
             dur = round(float(flow_dict["dur"]), 3)
             saddr = flow_dict["saddr"]
@@ -370,15 +372,17 @@ class Timeline(IModule):
     def pre_main(self):
         utils.drop_root_privs()
 
+    def handle_new_flow(self, msg: dict):
+        mdata = decode_new_flow(msg["data"])
+        self.process_flow(
+            mdata["profileid"],
+            mdata["twid"],
+            mdata["uid"],
+            mdata["flow"],
+            mdata["stime"],
+        )
+
     def main(self):
-        # Main loop function
-        if msg := self.get_msg("new_flow"):
-            mdata = msg["data"]
-            # Convert from json to dict
-            mdata = json.loads(mdata)
-            profileid = mdata["profileid"]
-            twid = mdata["twid"]
-            flow = mdata["flow"]
-            timestamp = mdata["stime"]
-            flow = json.loads(flow)
-            self.process_flow(profileid, twid, flow, timestamp)
+        # the new_flow msgs are handled by handle_new_flow() in
+        # IModule.dispatch_msgs()
+        pass
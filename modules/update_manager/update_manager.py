@@ -1631,6 +1631,8 @@ class UpdateManager(IModule):
                 pass
 
             self.db.set_loaded_ti_files(self.loaded_ti_files)
+            # let the threat intelligence module re-index the ip ranges
+            self.db.publish("reload_malicious_ip_ranges", "reload")
             self.print_duplicate_ip_summary()
             self.loaded_ti_files = 0
         except KeyboardInterrupt:
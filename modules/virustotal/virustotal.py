@@ -8,6 +8,7 @@ import ipaddress
 import threading
 import validators
 
+from slips_files.common.flow_encoding import decode_new_flow
 from slips_files.common.parsers.config_parser import ConfigParser
 from slips_files.common.abstracts.module import IModule
 from slips_files.common.slips_utils import utils
@@ -550,17 +551,7 @@ class VT(IModule):
             return 1
 
         if msg := self.get_msg("new_flow"):
-            data = msg["data"]
-            data = json.loads(data)
-            # profileid = data['profileid']
-            # twid = data['twid']
-            # stime = data['stime']
-            flow = json.loads(
-                data["flow"]
-            )  # this is a dict {'uid':json flow data}
-            # there is only one pair key-value in the dictionary
-            for key, value in flow.items():
-                flow_data = json.loads(value)
+            flow_data = decode_new_flow(msg["data"])["flow"]
             ip = flow_data["daddr"]
             cached_data = self.db.get_ip_info(ip)
             if not cached_data:
@@ -546,6 +546,22 @@ class Main(IObservable):
         )
         self.print(msg)
 
+    def archive_closed_tws(self):
+        """
+        moves the old closed tws from redis to the sqlite db and
+        reports the memory used by redis
+        """
+        archived: int = self.db.archive_closed_tws()
+        if not archived:
+            return
+        memory = self.db.get_memory_usage() / 1024 / 1024
+        self.print(
+            f"Archived {archived} closed timewindows to the sqlite db. "
+            f"Redis memory usage: {memory:.2f} MB.",
+            2,
+            0,
+        )
+
     def update_host_ip(self, host_ip: str, modified_profiles: Set[str]) -> str:
         """
         when running on an interface we keep track of the host IP.
@@ -704,6 +720,7 @@ class Main(IObservable):
 
             self.proc_man.start_evidence_process()
             self.proc_man.start_profiler_process()
+            self.proc_man.start_flow_parser_processes()
 
             self.c1 = self.db.subscribe("control_channel")
 
@@ -759,6 +776,7 @@ class Main(IObservable):
                 self.update_stats()
 
                 self.db.check_tw_to_close()
+                self.archive_closed_tws()
 
                 modified_profiles: Set[str] = (
                     self.metadata_man.update_slips_stats_in_the_db()[1]
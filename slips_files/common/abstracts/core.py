@@ -3,6 +3,7 @@ from multiprocessing import Process, Event
 
 from slips_files.common.abstracts.module import IModule
 from slips_files.core.database.database_manager import DBManager
+from slips_files.core.helpers.log_writer import BufferedLogWriter
 from slips_files.common.abstracts.observer import IObservable
 from slips_files.core.output import Output
 
@@ -41,11 +42,13 @@ class ICore(IModule, Process):
         self.add_observer(self.logger)
         self.init(**kwargs)
         self.channel_tracker = self.init_channel_tracker()
+        self.init_msg_buffer()
 
     def run(self):
         """
         must be called run because this is what multiprocessing runs
         """
+        self.handle_sigterm_in_this_process()
         try:
             # this should be defined in every core file
             # this won't run in a loop because it's not a module
@@ -59,4 +62,6 @@ class ICore(IModule, Process):
         except Exception:
             self.print(f"Problem in {self.name}", 0, 1)
             self.print(traceback.format_exc(), 0, 1)
+        finally:
+            BufferedLogWriter.flush_all()
         return True
@@ -1,4 +1,7 @@
 from abc import ABC, abstractmethod
+from typing import Optional
+
+from slips_files.common.slips_utils import utils
 
 
 class IInputType(ABC):
@@ -6,6 +9,22 @@ class IInputType(ABC):
     Interface for all input types supported by slips placed in slips_files/core/profiler.py
     """
 
+    # the format of the last ts of this input that isn't a unix
+    # timestamp, the ts of the same input all have the same format
+    time_format: Optional[str] = None
+
+    def to_epoch(self, ts) -> float:
+        """
+        converts the given ts of this input to a unix timestamp
+        """
+        time_format, datetime_obj = utils.parse_time(ts, self.time_format)
+        if time_format == "unixtimestamp":
+            return float(ts)
+        if not time_format:
+            raise ValueError(f"Unknown time format: {ts}")
+        self.time_format = time_format
+        return datetime_obj.timestamp()
+
     @abstractmethod
     def process_line(self, line: str):
         """
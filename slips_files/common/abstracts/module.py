@@ -1,10 +1,22 @@
+import select
+import signal
 import sys
+import threading
+import time
 import traceback
 from abc import ABC, abstractmethod
+from collections import deque
 from multiprocessing import Process, Event
-from typing import Dict
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    List,
+)
 
 from slips_files.core.output import Output
+from slips_files.core.helpers.log_writer import BufferedLogWriter
 from slips_files.common.slips_utils import utils
 from slips_files.core.database.database_manager import DBManager
 from slips_files.common.abstracts.observer import IObservable
@@ -20,6 +32,17 @@ class IModule(IObservable, ABC, Process):
     authors = ["Template Author"]
     # should be filled with the channels each module subscribes to
     channels = {}
+    # modules can map the name of each channel to a function that's called
+    # with every msg received in it instead of calling get_msg() in main()
+    channel_handlers: Dict[str, Callable[[dict], None]] = {}
+    # max number of msgs read from each pubsub in one receive_msgs() call.
+    # it's also the high-water mark of the buffers, a pubsub isn't read
+    # while any of its channels has this many msgs buffered, so the msgs
+    # of slow modules wait in redis instead. no msg is ever dropped
+    max_msgs_per_receive = 100
+    # how long receive_msgs() waits for new msgs when there's nothing to
+    # handle
+    receive_timeout = 0.01
 
     def __init__(
         self,
@@ -45,6 +68,7 @@ class IModule(IObservable, ABC, Process):
         # tracks whether or not in the last iteration there was a msg
         # received in that channel
         self.channel_tracker = self.init_channel_tracker()
+        self.init_msg_buffer()
 
     @property
     @abstractmethod
@@ -79,6 +103,19 @@ class IModule(IObservable, ABC, Process):
             tracker[channel_name] = False
         return tracker
 
+    def init_msg_buffer(self):
+        """
+        initializes the buffers of the msgs received by receive_msgs()
+        """
+        # the msgs received in each channel that weren't handled yet
+        self.msg_buffer: Dict[str, Deque[dict]] = {
+            channel_name: deque() for channel_name in self.channels
+        }
+        # set to true when run() already received the msgs of the
+        # current iteration, so get_msg() doesn't poll redis again
+        self.received_msgs = False
+        self.receive_lock = threading.Lock()
+
     @abstractmethod
     def init(self, **kwargs):
         """
@@ -99,6 +136,7 @@ class IModule(IObservable, ABC, Process):
         """
         if (
             any(self.channel_tracker.values())
+            or any(self.msg_buffer.values())
             or not self.termination_event.is_set()
         ):
             # this module is still receiving msgs,
@@ -124,8 +162,14 @@ class IModule(IObservable, ABC, Process):
             3 - red warnings that needs examination - developer warnings
         :param text: text to print. Can include format
                     like 'Test {}'.format('here')
+                    or a function that returns the text, it's only called
+                    if the text is going to be printed or logged
         :param log_to_logfiles_only: logs to slips.log only, not to cli
         """
+        if not log_to_logfiles_only and self.is_discarded(verbose, debug):
+            return
+        if callable(text):
+            text = text()
 
         self.notify_observers(
             {
@@ -151,14 +195,122 @@ class IModule(IObservable, ABC, Process):
         here will be executed in a loop
         """
 
+    def handle_sigterm(self, sig, frame):
+        """
+        writes the buffered logs of this process before it's terminated,
+        the exit finalizers of the log writers don't run on SIGTERM
+        """
+        BufferedLogWriter.flush_all()
+        sys.exit(0)
+
+    def handle_sigterm_in_this_process(self):
+        # signal handlers can only be set by the main thread
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.handle_sigterm)
+
     def pre_main(self):
         """
         This function is for initializations that are
         executed once before the main loop
         """
 
+    def buffer_msg(self, message: dict) -> bool:
+        """
+        stores the given msg in the buffer of the channel it was sent to
+        :return: True if the msg was buffered
+        """
+        channel_name = message.get("channel")
+        if (
+            message.get("type") != "message"
+            or channel_name not in self.channels
+        ):
+            # subscribe msgs or msgs of channels this module doesn't
+            # handle
+            return False
+
+        self.msg_buffer.setdefault(channel_name, deque()).append(message)
+        return True
+
+    def get_pubsubs_to_receive_from(self) -> Dict[int, Any]:
+        """
+        returns the pubsubs whose channels all have less msgs buffered
+        than the high-water mark. the others aren't read until the module
+        catches up, their msgs are kept by redis meanwhile
+        """
+        pubsubs = {}
+        behind = set()
+        for channel_name, pubsub in self.channels.items():
+            buffered = len(self.msg_buffer.get(channel_name, ()))
+            if buffered >= self.max_msgs_per_receive:
+                behind.add(id(pubsub))
+            pubsubs[id(pubsub)] = pubsub
+        return {
+            pubsub_id: pubsub
+            for pubsub_id, pubsub in pubsubs.items()
+            if pubsub_id not in behind
+        }
+
+    @staticmethod
+    def wait_for_msgs(pubsubs: List[Any], timeout: float):
+        """
+        blocks until a msg arrives in any of the given pubsubs or the
+        timeout passes
+        """
+        sockets = [
+            pubsub.connection._sock
+            for pubsub in pubsubs
+            if getattr(pubsub, "connection", None)
+            and getattr(pubsub.connection, "_sock", None)
+        ]
+        try:
+            select.select(sockets, [], [], timeout)
+        except (TypeError, ValueError, OSError):
+            # the connections aren't sockets or were closed
+            time.sleep(timeout)
+
+    def receive_msgs(self, timeout: float = 0) -> int:
+        """
+        reads the pending msgs of all the subscribed channels at once and
+        stores them in self.msg_buffer
+        all channels subscribed to by a module usually share one pubsub,
+        so the msgs are routed to their buffers by their channel name
+        :param timeout: how long to wait for msgs if there are none
+        :return: the number of received msgs
+        """
+        received = 0
+        with self.receive_lock:
+            pubsubs = self.get_pubsubs_to_receive_from()
+            for pubsub in pubsubs.values():
+                for _ in range(self.max_msgs_per_receive):
+                    message = self.db.get_message(pubsub)
+                    if not message:
+                        break
+                    received += self.buffer_msg(message)
+
+            if received or not timeout or not pubsubs:
+                return received
+
+            if len(pubsubs) == 1:
+                # block until a msg arrives in any of the channels
+                pubsub = next(iter(pubsubs.values()))
+                if message := self.db.get_message(pubsub, timeout=timeout):
+                    received += self.buffer_msg(message)
+                return received
+
+            # block until a msg arrives in any of the pubsubs
+            self.wait_for_msgs(list(pubsubs.values()), timeout)
+            for pubsub in pubsubs.values():
+                if message := self.db.get_message(pubsub):
+                    received += self.buffer_msg(message)
+        return received
+
     def get_msg(self, channel_name):
-        message = self.db.get_message(self.channels[channel_name])
+        buffer = self.msg_buffer.get(channel_name)
+        if not buffer and not self.received_msgs:
+            self.receive_msgs()
+            buffer = self.msg_buffer[channel_name]
+
+        message = buffer.popleft() if buffer else None
         if utils.is_msg_intended_for(message, channel_name):
             self.channel_tracker[channel_name] = True
             return message
@@ -166,11 +318,27 @@ class IModule(IObservable, ABC, Process):
             self.channel_tracker[channel_name] = False
             return False
 
+    def dispatch_msgs(self):
+        """
+        calls the handler of each channel in self.channel_handlers with
+        all the msgs received in that channel
+        """
+        for channel_name, handler in self.channel_handlers.items():
+            handled = False
+            buffer = self.msg_buffer.get(channel_name)
+            while buffer:
+                message = buffer.popleft()
+                if utils.is_msg_intended_for(message, channel_name):
+                    handler(message)
+                    handled = True
+            self.channel_tracker[channel_name] = handled
+
     def run(self):
         """
         This is the loop function, it runs non-stop as long as
         the module is running
         """
+        self.handle_sigterm_in_this_process()
         try:
             error: bool = self.pre_main()
             if error or self.should_stop():
@@ -187,6 +355,17 @@ class IModule(IObservable, ABC, Process):
 
         try:
             while not self.should_stop():
+                # receive the msgs of all channels at once, and only wait
+                # for new ones when there's nothing left to handle
+                self.received_msgs = False
+                timeout = (
+                    0
+                    if any(self.msg_buffer.values())
+                    else self.receive_timeout
+                )
+                self.receive_msgs(timeout=timeout)
+                self.received_msgs = True
+                self.dispatch_msgs()
                 # keep running main() in a loop as long as the module is
                 # online
                 # if a module's main() returns 1, it means there's an
@@ -200,4 +379,6 @@ class IModule(IObservable, ABC, Process):
         except Exception:
             self.print(f"Problem in {self.name}", 0, 1)
             self.print(traceback.format_exc(), 0, 1)
+        finally:
+            BufferedLogWriter.flush_all()
         return True
@@ -11,6 +11,13 @@ class IObserver(ABC):
         """is called whenever there's a new msg"""
         pass
 
+    def discards(self, verbose: int, debug: int) -> bool:
+        """
+        returns True if this observer drops the msgs with the given
+        verbose and debug levels
+        """
+        return False
+
 
 class IObservable(ABC):
     def __init__(self):
@@ -22,6 +29,17 @@ class IObservable(ABC):
     def remove_observer(self, observer):
         self.observers.remove(observer)
 
+    def is_discarded(self, verbose: int, debug: int) -> bool:
+        """
+        returns True if all the observers drop the msgs with the given
+        verbose and debug levels, so the caller can skip formatting and
+        sending them
+        """
+        return all(
+            observer.discards(verbose, debug) is True
+            for observer in self.observers
+        )
+
     def notify_observers(self, msg):
         for observer in self.observers:
             observer.update(msg)
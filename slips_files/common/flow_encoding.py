@@ -0,0 +1,66 @@
+"""
+Wire format of the flows published in the new_flow channel.
+
+Each msg is a compact json list of
+[profileid, twid, uid, [flow values]]
+where the flow values are in the order of NEW_FLOW_FIELDS, so the field
+names aren't sent with every flow and the msg is encoded/decoded once.
+"""
+
+import json
+from typing import (
+    Any,
+    Dict,
+)
+
+# the order of the flow fields in the new_flow msgs.
+# new fields should only be added at the end
+NEW_FLOW_FIELDS = (
+    "ts",
+    "dur",
+    "saddr",
+    "sport",
+    "daddr",
+    "dport",
+    "proto",
+    "origstate",
+    "state",
+    "pkts",
+    "allbytes",
+    "spkts",
+    "sbytes",
+    "appproto",
+    "smac",
+    "dmac",
+    "label",
+    "flow_type",
+    "module_labels",
+)
+
+
+def encode_new_flow(
+    profileid: str, twid: str, uid: str, flow: Dict[str, Any]
+) -> str:
+    """
+    encodes the given flow to be published in the new_flow channel
+    :param flow: dict with the fields in NEW_FLOW_FIELDS
+    """
+    values = [flow.get(field) for field in NEW_FLOW_FIELDS]
+    return json.dumps([profileid, twid, uid, values], separators=(",", ":"))
+
+
+def decode_new_flow(data: str) -> Dict[str, Any]:
+    """
+    decodes a msg received in the new_flow channel
+    :param data: the 'data' of the received msg
+    :return: dict with profileid, twid, uid, stime and the flow dict
+    """
+    profileid, twid, uid, values = json.loads(data)
+    flow: Dict[str, Any] = dict(zip(NEW_FLOW_FIELDS, values))
+    return {
+        "profileid": profileid,
+        "twid": twid,
+        "uid": uid,
+        "stime": flow["ts"],
+        "flow": flow,
+    }
@@ -0,0 +1,80 @@
+import ipaddress
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+)
+
+
+class IPRangesIndex:
+    """
+    Index of the malicious IP ranges for longest prefix matching.
+
+    The ranges of each ip version are grouped by their prefix length,
+    each group is a {network address as int: range} dict. so looking up
+    an IP is one dict lookup per distinct prefix length of the loaded
+    ranges, regardless of how many ranges there are.
+    """
+
+    def __init__(self, ranges: Iterable[str] = ()):
+        # {ip version: {prefix length: {network as int: range}}}
+        self.networks: Dict[int, Dict[int, Dict[int, str]]] = {4: {}, 6: {}}
+        for range_ in ranges:
+            self.add(range_)
+        # {ip version: [(prefix length, host bits)]} the longest prefix
+        # is checked first so the most specific range is the one returned
+        self.prefixes: Dict[int, List[tuple]] = {
+            version: [
+                (prefixlen, (32 if version == 4 else 128) - prefixlen)
+                for prefixlen in sorted(networks, reverse=True)
+            ]
+            for version, networks in self.networks.items()
+        }
+
+    def add(self, range_: str):
+        """
+        :param range_: the range as stored in the IoC_ip_ranges hash
+        """
+        try:
+            network = ipaddress.ip_network(range_, strict=False)
+        except ValueError:
+            return
+        networks = self.networks[network.version].setdefault(
+            network.prefixlen, {}
+        )
+        # if the same network is there twice in different formats,
+        # the first one is kept
+        networks.setdefault(int(network.network_address), range_)
+
+    def __len__(self):
+        return sum(
+            len(networks)
+            for version in self.networks.values()
+            for networks in version.values()
+        )
+
+    def lookup(self, ip: str) -> Optional[str]:
+        """
+        returns the most specific range the given ip belongs to,
+        or None if it doesn't belong to any or isn't a valid ip
+        """
+        return next(self.lookup_all(ip), None)
+
+    def lookup_all(self, ip: str) -> Iterator[str]:
+        """
+        yields all the ranges the given ip belongs to, the most
+        specific first
+        """
+        try:
+            ip_obj = ipaddress.ip_address(ip)
+        except ValueError:
+            return
+
+        ip_as_int = int(ip_obj)
+        networks = self.networks[ip_obj.version]
+        for prefixlen, host_bits in self.prefixes[ip_obj.version]:
+            network_address = ip_as_int >> host_bits << host_bits
+            if range_ := networks[prefixlen].get(network_address):
+                yield range_
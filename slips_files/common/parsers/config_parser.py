@@ -563,6 +563,107 @@ class ConfigParser(object):
         ]
         return client_ips
 
+    def profiler_workers(self) -> int:
+        """returns the number of profiler processes to start"""
+        workers = self.read_configuration("parameters", "profiler_workers", 1)
+        try:
+            workers = int(workers)
+        except ValueError:
+            workers = 1
+        return max(workers, 1)
+
+    def parser_workers(self) -> int:
+        """
+        returns the number of processes that parse the flows before
+        they're sent to the profilers. 0 means the profilers parse them
+        """
+        workers = self.read_configuration("parameters", "parser_workers", 0)
+        try:
+            workers = int(workers)
+        except ValueError:
+            workers = 0
+        return max(workers, 0)
+
+    def sqlite_flush_size(self) -> int:
+        """
+        returns the max number of flows buffered before
+        writing them to the sqlite db
+        """
+        flush_size = self.read_configuration(
+            "parameters", "sqlite_flush_size", 1000
+        )
+        try:
+            flush_size = int(flush_size)
+        except ValueError:
+            flush_size = 1000
+        return max(flush_size, 1)
+
+    def sqlite_flush_interval(self) -> float:
+        """
+        returns the max time in seconds a flow can be buffered
+        before being written to the sqlite db
+        """
+        interval = self.read_configuration(
+            "parameters", "sqlite_flush_interval", 1
+        )
+        try:
+            interval = float(interval)
+        except ValueError:
+            interval = 1
+        # the buffer is flushed periodically using this interval
+        return interval if interval > 0 else 1
+
+    def closed_tws_to_keep(self) -> int:
+        """
+        returns the max number of closed tws of each profile that are
+        kept in redis before archiving them. 0 means keep all of them
+        """
+        tws = self.read_configuration("parameters", "closed_tws_to_keep", 0)
+        try:
+            tws = int(tws)
+        except ValueError:
+            tws = 0
+        return max(tws, 0)
+
+    def closed_tws_max_age(self) -> float:
+        """
+        returns how many seconds after its end a closed tw is kept in
+        redis before archiving it. 0 means keep all of them
+        """
+        age = self.read_configuration("parameters", "closed_tws_max_age", 0)
+        try:
+            age = float(age)
+        except ValueError:
+            age = 0
+        return max(age, 0)
+
+    def profiler_queue_batch_size(self) -> int:
+        """
+        returns the max number of lines sent to the profiler at once
+        """
+        batch_size = self.read_configuration(
+            "parameters", "profiler_queue_batch_size", 500
+        )
+        try:
+            batch_size = int(batch_size)
+        except ValueError:
+            batch_size = 500
+        return max(batch_size, 1)
+
+    def profiler_queue_batch_max_delay(self) -> float:
+        """
+        returns the max time in seconds a line can wait
+        before being sent to the profiler
+        """
+        delay = self.read_configuration(
+            "parameters", "profiler_queue_batch_max_delay", 0.05
+        )
+        try:
+            delay = float(delay)
+        except ValueError:
+            delay = 0.05
+        return delay
+
     def keep_rotated_files_for(self) -> int:
         """returns period in seconds"""
         keep_rotated_files_for = self.read_configuration(
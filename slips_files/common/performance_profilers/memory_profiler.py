@@ -193,7 +193,7 @@ class LiveMultiprocessProfiler(IPerformanceProfiler):
             mp_manager.Lock()
         )  # hold when modifying proc_map_global
         self.db = db
-        self.pid_channel = self.db.subscribe("memory_profile")
+        self.pid_channel = self.db.subscribe("memory_profile", shared=False)
 
     def _create_profiler(self):
         pass
@@ -13,7 +13,12 @@ import os
 import sys
 import ipaddress
 import aid_hash
-from typing import Any, Optional
+from typing import (
+    Any,
+    Optional,
+    Tuple,
+    Union,
+)
 from dataclasses import is_dataclass, asdict
 from enum import Enum
 
@@ -204,14 +209,17 @@ class Utils(object):
         Detects and converts the given ts to the given format
         :param required_format: can be any format like '%Y/%m/%d %H:%M:%S.%f' or 'unixtimestamp', 'iso'
         """
-        given_format = self.get_time_format(ts)
+        given_format, datetime_obj = self.parse_time(ts)
         if given_format == required_format:
             return ts
 
-        if given_format == "datetimeobj":
-            datetime_obj = ts
-        else:
-            datetime_obj = self.convert_to_datetime(ts)
+        if given_format == "unixtimestamp":
+            if required_format == "unixtimestamp":
+                return ts
+            datetime_obj = datetime.fromtimestamp(float(ts), tz=self.local_tz)
+        elif not given_format:
+            # same error strptime() raises for unknown formats
+            raise ValueError(f"Unknown time format: {ts}")
 
         # convert to the req format
         if required_format == "iso":
@@ -247,35 +255,55 @@ class Utils(object):
             return False
 
     def convert_to_datetime(self, ts):
-        if self.is_datetime_obj(ts):
-            return ts
-
-        given_format = self.get_time_format(ts)
-        return (
-            datetime.fromtimestamp(float(ts), tz=self.local_tz)
-            if given_format == "unixtimestamp"
-            else datetime.strptime(ts, given_format)
-        )
-
-    def get_time_format(self, time) -> Optional[str]:
+        given_format, datetime_obj = self.parse_time(ts)
+        if given_format == "unixtimestamp":
+            return datetime.fromtimestamp(float(ts), tz=self.local_tz)
+        if not given_format:
+            raise ValueError(f"Unknown time format: {ts}")
+        return datetime_obj
+
+    def parse_time(
+        self, time, time_format_hint: Optional[str] = None
+    ) -> Tuple[Union[str, bool], Optional[datetime]]:
+        """
+        detects the format of the given time and parses it
+        :param time_format_hint: format to try first, e.g. the format of
+        the previous ts of the same input
+        :return: a tuple with the format and the parsed datetime obj.
+        unix timestamps aren't parsed, since most callers need them as
+        they are, so the datetime obj is None for them
+        """
         if self.is_datetime_obj(time):
-            return "datetimeobj"
+            return "datetimeobj", time
+
+        if isinstance(time, (int, float)):
+            return "unixtimestamp", None
 
         try:
             # Try unix timestamp in seconds.
-            datetime.fromtimestamp(float(time))
-            return "unixtimestamp"
+            float(time)
+            return "unixtimestamp", None
         except ValueError:
             pass
 
+        if time_format_hint:
+            try:
+                return time_format_hint, datetime.strptime(
+                    time, time_format_hint
+                )
+            except ValueError:
+                pass
+
         for time_format in self.time_formats:
             try:
-                datetime.strptime(time, time_format)
-                return time_format
+                return time_format, datetime.strptime(time, time_format)
             except ValueError:
                 pass
 
-        return False
+        return False, None
+
+    def get_time_format(self, time) -> Optional[str]:
+        return self.parse_time(time)[0]
 
     def to_delta(self, time_in_seconds):
         return timedelta(seconds=int(time_in_seconds))
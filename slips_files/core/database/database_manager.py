@@ -1,4 +1,7 @@
-from typing import List
+from typing import (
+    List,
+    Tuple,
+)
 
 from slips_files.core.database.redis_db.database import RedisDB
 from slips_files.core.database.sqlite_db.database import SQLiteDB
@@ -15,6 +18,27 @@ class DBManager(IObservable):
     """
 
     name = "DBManager"
+    # the channels that get a msg per flow. each one has its own pubsub,
+    # so a module that falls behind on one of them stops reading only
+    # that channel and its backlog waits in redis
+    high_volume_channels = {
+        "new_flow",
+        "new_dns",
+        "new_dns_flow",
+        "new_http",
+        "new_ssl",
+        "new_ssh",
+        "new_notice",
+        "new_url",
+        "new_downloaded_file",
+        "new_arp",
+        "new_smtp",
+        "new_dhcp",
+        "new_weird",
+        "new_software",
+        "new_tunnel",
+        "tw_modified",
+    }
 
     def __init__(
         self,
@@ -33,6 +57,9 @@ class DBManager(IObservable):
         self.rdb = RedisDB(
             self.logger, redis_port, start_redis_server, **kwargs
         )
+        # the pubsub shared by the channels subscribed to using this db
+        # that aren't high volume ones
+        self.pubsub = None
         # in some rare cases we don't wanna start sqlite,
         # like when using -S
         # we just want to connect to redis to get the PIDs
@@ -60,8 +87,38 @@ class DBManager(IObservable):
     def publish(self, *args, **kwargs):
         return self.rdb.publish(*args, **kwargs)
 
-    def subscribe(self, *args, **kwargs):
-        return self.rdb.subscribe(*args, **kwargs)
+    def subscribe(
+        self, channel: str, ignore_subscribe_messages=True, shared=True
+    ):
+        """
+        subscribes to the given channel.
+        the channels subscribed to using the same DBManager (the same
+        module) share one pubsub connection, and the module routes the
+        received msgs using their channel name. the high volume channels
+        get their own pubsub.
+        :param ignore_subscribe_messages: only used by pubsubs that aren't
+        shared
+        :param shared: if False, the channel gets its own pubsub
+        """
+        if not shared:
+            return self.rdb.subscribe(
+                channel, ignore_subscribe_messages=ignore_subscribe_messages
+            )
+
+        if channel in self.high_volume_channels:
+            return self.rdb.subscribe(channel, ignore_subscribe_messages=False)
+
+        # the subscribe msgs aren't ignored in shared pubsubs, otherwise
+        # get_message() returns None for them while there may be more
+        # msgs waiting. IModule drops them when receiving the msgs
+        pubsub = self.rdb.subscribe(
+            channel,
+            ignore_subscribe_messages=False,
+            pubsub=self.pubsub,
+        )
+        if pubsub:
+            self.pubsub = pubsub
+        return pubsub
 
     def publish_stop(self, *args, **kwargs):
         return self.rdb.publish_stop(*args, **kwargs)
@@ -154,12 +211,18 @@ class DBManager(IObservable):
     def get_dns_resolution(self, *args, **kwargs):
         return self.rdb.get_dns_resolution(*args, **kwargs)
 
+    def has_dns_resolution(self, *args, **kwargs):
+        return self.rdb.has_dns_resolution(*args, **kwargs)
+
     def is_ip_resolved(self, *args, **kwargs):
         return self.rdb.is_ip_resolved(*args, **kwargs)
 
     def delete_dns_resolution(self, *args, **kwargs):
         return self.rdb.delete_dns_resolution(*args, **kwargs)
 
+    def delete_expired_dns_resolutions(self, *args, **kwargs):
+        return self.rdb.delete_expired_dns_resolutions(*args, **kwargs)
+
     def should_store_resolution(self, *args, **kwargs):
         return self.rdb.should_store_resolution(*args, **kwargs)
 
@@ -473,6 +536,9 @@ class DBManager(IObservable):
     def get_malicious_ip_ranges(self, *args, **kwargs):
         return self.rdb.get_malicious_ip_ranges(*args, **kwargs)
 
+    def get_malicious_ip_range(self, *args, **kwargs):
+        return self.rdb.get_malicious_ip_range(*args, **kwargs)
+
     def get_IPs_in_IoC(self, *args, **kwargs):
         return self.rdb.get_IPs_in_IoC(*args, **kwargs)
 
@@ -566,6 +632,15 @@ class DBManager(IObservable):
     def add_out_dns(self, *args, **kwargs):
         return self.rdb.add_out_dns(*args, **kwargs)
 
+    def invalidate_tw_cache(self, *args, **kwargs):
+        return self.rdb.invalidate_tw_cache(*args, **kwargs)
+
+    def start_pipeline(self, *args, **kwargs):
+        return self.rdb.start_pipeline(*args, **kwargs)
+
+    def flush_pipeline(self, *args, **kwargs):
+        return self.rdb.flush_pipeline(*args, **kwargs)
+
     def add_port(self, *args, **kwargs):
         return self.rdb.add_port(*args, **kwargs)
 
@@ -587,13 +662,11 @@ class DBManager(IObservable):
     def get_all_flows(self, *args, **kwargs):
         return self.sqlite.get_all_flows(*args, **kwargs)
 
-    def get_all_contacted_ips_in_profileid_twid(self, *args, **kwargs):
-        """
-        Get all the contacted IPs in a given profile and TW
-        """
-        return self.sqlite.get_all_contacted_ips_in_profileid_twid(
-            *args, **kwargs
-        )
+    def was_ip_contacted(self, *args, **kwargs):
+        return self.rdb.was_ip_contacted(*args, **kwargs)
+
+    def was_any_ip_contacted(self, *args, **kwargs):
+        return self.rdb.was_any_ip_contacted(*args, **kwargs)
 
     def markProfileTWAsBlocked(self, *args, **kwargs):
         return self.rdb.markProfileTWAsBlocked(*args, **kwargs)
@@ -721,6 +794,9 @@ class DBManager(IObservable):
     def mark_profile_tw_as_modified(self, *args, **kwargs):
         return self.rdb.mark_profile_tw_as_modified(*args, **kwargs)
 
+    def flush_modified_tws(self, *args, **kwargs):
+        return self.rdb.flush_modified_tws(*args, **kwargs)
+
     def add_tuple(self, *args, **kwargs):
         return self.rdb.add_tuple(*args, **kwargs)
 
@@ -769,6 +845,35 @@ class DBManager(IObservable):
     def get_mac_vendor_from_profile(self, *args, **kwargs):
         return self.rdb.get_mac_vendor_from_profile(*args, **kwargs)
 
+    def archive_closed_tws(self) -> int:
+        """
+        moves the data of the closed tws that exceed the retention policy
+        (closed_tws_to_keep and closed_tws_max_age) from redis to the
+        sqlite db
+        :return: the number of archived tws
+        """
+        archived = 0
+        tws: List[Tuple[str, str]] = self.rdb.get_tws_to_archive()
+        for profileid, twid in tws:
+            keys = self.rdb.archive_tw(profileid, twid)
+            if keys is None:
+                # the tw was modified while being archived, it stays in
+                # redis until the next call
+                continue
+            if keys:
+                self.sqlite.archive_tw(profileid, twid, keys)
+            archived += 1
+        return archived
+
+    def get_archived_tw(self, *args, **kwargs):
+        return self.sqlite.get_archived_tw(*args, **kwargs)
+
+    def is_tw_archived(self, *args, **kwargs):
+        return self.sqlite.is_tw_archived(*args, **kwargs)
+
+    def get_memory_usage(self, *args, **kwargs):
+        return self.rdb.get_memory_usage(*args, **kwargs)
+
     def label_flows_causing_alert(self, evidence_ids: List[str]):
         """
         :param evidence_ids: list of ids of evidence causing an alert
@@ -834,6 +939,9 @@ class DBManager(IObservable):
     def set_slips_internal_time(self, ts):
         return self.rdb.set_slips_internal_time(ts)
 
+    def flush_buffered_flows(self, *args, **kwargs):
+        return self.sqlite.flush_buffer(*args, **kwargs)
+
     def add_altflow(self, *args, **kwargs):
         return self.sqlite.add_altflow(*args, **kwargs)
 
@@ -50,6 +50,7 @@ class RedisDB(IoCHandler, AlertHandler, ProfileHandler, IObservable):
         "new_url",
         "new_downloaded_file",
         "reload_whitelist",
+        "reload_malicious_ip_ranges",
         "new_service",
         "new_arp",
         "new_MAC",
@@ -83,8 +84,6 @@ class RedisDB(IoCHandler, AlertHandler, ProfileHandler, IObservable):
     _gateway_MAC_found = False
     _conf_file = "config/redis.conf"
     our_ips = utils.get_own_ips()
-    # flag to know which flow is the start of the pcap/file
-    first_flow = True
     # to make sure we only detect and store the user's localnet once
     is_localnet_set = False
     # in case of redis ConnectionErrors, this is how long we'll wait in
@@ -97,6 +96,18 @@ class RedisDB(IoCHandler, AlertHandler, ProfileHandler, IObservable):
     # to keep track of connection retries. once it reaches max_retries,
     # slips will terminate
     connection_retry = 0
+    # max number of domains and srcips stored in the dns resolution of
+    # each ip, the oldest ones are dropped. CDN ips are resolved
+    # for thousands of domains
+    max_domains_per_resolution = 50
+    max_resolvers_per_resolution = 50
+    # resolutions are deleted once their TTL expired more than this many
+    # seconds ago (in flow time). connections without dns look 24hrs back
+    dns_resolution_retention = 24 * 3600
+    # how often (in flow time) the expired resolutions are deleted
+    dns_resolution_purge_interval = 60
+    # flow ts of the last time this process deleted the expired resolutions
+    last_dns_resolution_purge = 0
 
     def __new__(
         cls, logger, redis_port, start_redis_server=True, flush_db=True
@@ -179,6 +190,8 @@ class RedisDB(IoCHandler, AlertHandler, ProfileHandler, IObservable):
         cls.disabled_detections: List[str] = conf.disabled_detections()
         cls.width = conf.get_tw_width_as_float()
         cls.client_ips: List[str] = conf.client_ips()
+        cls.closed_tws_to_keep: int = conf.closed_tws_to_keep()
+        cls.closed_tws_max_age: float = conf.closed_tws_max_age()
 
     @classmethod
     def set_slips_internal_time(cls, timestamp):
@@ -320,19 +333,30 @@ class RedisDB(IoCHandler, AlertHandler, ProfileHandler, IObservable):
 
     def publish(self, channel, data):
         """Publish something"""
-        self.r.publish(channel, data)
+        self.writer.publish(channel, data)
 
-    def subscribe(self, channel: str, ignore_subscribe_messages=True):
-        """Subscribe to channel"""
+    def subscribe(
+        self,
+        channel: str,
+        ignore_subscribe_messages=True,
+        pubsub: Optional[redis.client.PubSub] = None,
+    ):
+        """
+        Subscribe to channel
+        :param pubsub: an existing pubsub to add the channel to. a new
+        one is created if not given
+        """
         # For when a TW is modified
         if channel not in self.supported_channels:
             return False
 
-        self.pubsub = self.r.pubsub()
-        self.pubsub.subscribe(
-            channel, ignore_subscribe_messages=ignore_subscribe_messages
-        )
-        return self.pubsub
+        if pubsub is None:
+            pubsub = self.r.pubsub(
+                ignore_subscribe_messages=ignore_subscribe_messages
+            )
+        pubsub.subscribe(channel)
+        self.pubsub = pubsub
+        return pubsub
 
     def publish_stop(self):
         """
@@ -392,8 +416,14 @@ class RedisDB(IoCHandler, AlertHandler, ProfileHandler, IObservable):
             1 - print exceptions
             2 - unsupported and unhandled types (cases that may cause errors)
             3 - red warnings that needs examination - developer warnings
-        :param text: text to print. Can include format like 'Test {}'.format('here')
+        :param text: text to print. Can include format like f'Test {here}'
+            or a function that returns the text, it's only called if the
+            text is going to be printed
         """
+        if self.is_discarded(verbose, debug):
+            return
+        if callable(text):
+            text = text()
 
         self.notify_observers(
             {
@@ -468,6 +498,10 @@ class RedisDB(IoCHandler, AlertHandler, ProfileHandler, IObservable):
         """returns the length of all keys in the db"""
         return self.r.dbsize()
 
+    def get_memory_usage(self) -> int:
+        """returns the number of bytes used by redis"""
+        return int(self.r.info("memory")["used_memory"])
+
     def set_cyst_enabled(self):
         return self.r.set("is_cyst_enabled", "yes")
 
@@ -655,27 +689,83 @@ class RedisDB(IoCHandler, AlertHandler, ProfileHandler, IObservable):
             return ip_info
         return {}
 
-    def is_ip_resolved(self, ip, hrs):
+    def has_dns_resolution(self, ip) -> bool:
+        """
+        returns whether the given ip was resolved by slips, without
+        reading its resolution
+        """
+        return bool(self.r.hexists("DNSresolution", ip))
+
+    def is_ip_resolved(self, ip, hrs, ts=None) -> bool:
         """
         :param hrs: float, how many hours to look back for resolutions
+        :param ts: the time of the flow to look back from. if not given,
+            any stored resolution counts
         """
-        ip_info = self.get_dns_resolution(ip)
-        if ip_info == {}:
+        # when the TTL of the last resolution of this ip expired
+        expires = self.r.zscore("DNSresolutionExpiry", ip)
+        if expires is None:
             return False
+        if ts is None:
+            return True
 
-        # these are the tws this ip was resolved in
-        tws_where_ip_was_resolved = ip_info["timewindows"]
-
-        # IP is resolved, was it resolved in the past x hrs?
-        tws_to_search: int = self.get_equivalent_tws(hrs)
-
-        for tw_number in range(tws_to_search):
-            if f"timewindow{tw_number}" in tws_where_ip_was_resolved:
-                return True
-        return False
+        try:
+            ts = float(ts)
+        except (ValueError, TypeError):
+            return True
+        return ts - expires <= hrs * 3600
 
     def delete_dns_resolution(self, ip):
         self.r.hdel("DNSresolution", ip)
+        self.r.zrem("DNSresolutionExpiry", ip)
+
+    def delete_expired_dns_resolutions(self, ts: float):
+        """
+        deletes the resolutions whose TTL expired more than
+        dns_resolution_retention seconds before the given flow ts.
+        runs at most once every dns_resolution_purge_interval seconds
+        """
+        if ts - self.last_dns_resolution_purge < (
+            self.dns_resolution_purge_interval
+        ):
+            return
+        self.last_dns_resolution_purge = ts
+
+        expired = self.r.zrangebyscore(
+            "DNSresolutionExpiry",
+            "-inf",
+            ts - self.dns_resolution_retention,
+        )
+        if not expired:
+            return
+        self.r.hdel("DNSresolution", *expired)
+        self.r.zrem("DNSresolutionExpiry", *expired)
+
+    @staticmethod
+    def get_answers_ttls(answers: list, ttls) -> Dict[str, float]:
+        """
+        returns the TTL of each answer of a dns flow, 0 if unknown.
+        zeek logs the TTLs in the same order as the answers
+        """
+        if not isinstance(ttls, list):
+            ttls = []
+        answers_ttls = {}
+        for answer, ttl in zip(answers, ttls):
+            try:
+                answers_ttls[answer] = float(ttl)
+            except (ValueError, TypeError):
+                continue
+        return answers_ttls
+
+    @staticmethod
+    def add_capped(items: list, item: str, max_items: int) -> list:
+        """
+        appends the given item to the list if it's not there, dropping
+        the oldest items when the list is full
+        """
+        if item not in items:
+            items.append(item)
+        return items[-max_items:]
 
     def should_store_resolution(
         self, query: str, answers: list, qtype_name: str
@@ -706,22 +796,31 @@ class RedisDB(IoCHandler, AlertHandler, ProfileHandler, IObservable):
         uid: str,
         qtype_name: str,
         srcip: str,
-        twid: str,
+        ttls: list = None,
     ):
         """
         Cache DNS answers
         1- For each ip in the answer, store the domain
            in DNSresolution as {ip: {ts: .. , 'domains': .. , 'uid':... }}
+           and when its TTL expires in DNSresolutionExpiry
         2- For each CNAME, store the ip
 
         :param srcip: ip that performed the dns query
+        :param ttls: the TTLs of the answers, as logged by zeek
         """
         if not self.should_store_resolution(query, answers, qtype_name):
             return
+
+        try:
+            ts = float(ts)
+        except (ValueError, TypeError):
+            ts = time.time()
+        self.delete_expired_dns_resolutions(ts)
+
+        answers_ttls: Dict[str, float] = self.get_answers_ttls(answers, ttls)
         # Also store these IPs inside the domain
         ips_to_add = []
         CNAMEs = []
-        profileid_twid = f"profile_{srcip}_{twid}"
 
         for answer in answers:
             # Make sure it's an ip not a CNAME
@@ -735,32 +834,19 @@ class RedisDB(IoCHandler, AlertHandler, ProfileHandler, IObservable):
 
             # get stored DNS resolution from our db
             ip_info_from_db = self.get_dns_resolution(answer)
-            if ip_info_from_db == {}:
-                # if the domain(query) we have isn't already in
-                # DNSresolution in the db
-                resolved_by = [srcip]
-                domains = []
-                timewindows = [profileid_twid]
-            else:
-                # we have info about this domain in DNSresolution in the db
-                # keep track of all srcips that resolved this domain
-                resolved_by = ip_info_from_db.get("resolved-by", [])
-                if srcip not in resolved_by:
-                    resolved_by.append(srcip)
-
-                # timewindows in which this odmain was resolved
-                timewindows = ip_info_from_db.get("timewindows", [])
-                if profileid_twid not in timewindows:
-                    timewindows.append(profileid_twid)
-
-                # we'll be appending the current answer
-                # to these cached domains
-                domains = ip_info_from_db.get("domains", [])
-
+            # keep track of all srcips that resolved this domain
+            resolved_by = self.add_capped(
+                ip_info_from_db.get("resolved-by", []),
+                srcip,
+                self.max_resolvers_per_resolution,
+            )
             # if the domain(query) we have isn't already in
             # DNSresolution in the db, add it
-            if query not in domains:
-                domains.append(query)
+            domains = self.add_capped(
+                ip_info_from_db.get("domains", []),
+                query,
+                self.max_domains_per_resolution,
+            )
 
             # domains should be a list, not a string!,
             # so don't use json.dumps here
@@ -769,12 +855,15 @@ class RedisDB(IoCHandler, AlertHandler, ProfileHandler, IObservable):
                 "uid": uid,
                 "domains": domains,
                 "resolved-by": resolved_by,
-                "timewindows": timewindows,
             }
-            ip_info = json.dumps(ip_info)
-            # we store ALL dns resolutions seen since starting slips
+            ip_info = json.dumps(ip_info, separators=(",", ":"))
+            # we store the dns resolutions until they expire
             # store with the IP as the key
             self.r.hset("DNSresolution", answer, ip_info)
+            expires = ts + answers_ttls.get(answer, 0)
+            # a resolution with a longer TTL may be stored already
+            if (self.r.zscore("DNSresolutionExpiry", answer) or 0) < expires:
+                self.r.zadd("DNSresolutionExpiry", {answer: expires})
             # store with the domain as the key:
             self.r.hset("ResolvedDomains", domains[0], answer)
             # these ips will be associated with the query in our db
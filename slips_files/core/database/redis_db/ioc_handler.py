@@ -1,5 +1,6 @@
 import json
 import ast
+from typing import Optional
 
 
 class IoCHandler:
@@ -141,6 +142,14 @@ class IoCHandler:
         """
         return self.rcache.hgetall("IoC_ip_ranges")
 
+    def get_malicious_ip_range(self, ip_range: str) -> Optional[str]:
+        """
+        Returns the info of the given malicious ip range
+        return format is json.dumps{'source':..,'tags':..,
+                                    'threat_level':... ,'description'}
+        """
+        return self.rcache.hget("IoC_ip_ranges", ip_range)
+
     def get_IPs_in_IoC(self):
         """
         Get all IPs and their description from IoC_ips
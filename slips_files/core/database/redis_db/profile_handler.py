@@ -1,21 +1,27 @@
 import json
 import sys
+import threading
 import time
 import traceback
+from collections import OrderedDict
+from contextlib import contextmanager
 from dataclasses import asdict
 from math import floor
 from typing import (
+    Any,
     Tuple,
     Union,
     Optional,
     List,
     Set,
+    Dict,
 )
 
 import redis
 import validators
 
 from slips_files.common.abstracts.observer import IObservable
+from slips_files.common.flow_encoding import encode_new_flow
 from slips_files.core.output import Output
 
 
@@ -26,6 +32,32 @@ class ProfileHandler(IObservable):
     """
 
     name = "DB"
+    # each thread has its own pipeline buffering the writes of the flow
+    # it's adding to the profiles, see start_pipeline(). so the writes
+    # of other threads, like timers, are never sent with or lost with
+    # the pipeline of a flow
+    thread_state = threading.local()
+    # the start of the first tw and the start of each tw this process
+    # already added to the db, see get_timewindow()
+    cached_file_start: Optional[float] = None
+    # least recently used first
+    registered_tws: Optional["OrderedDict[Tuple[str, str], float]"] = None
+    # the least recently used tws are forgotten once there are more
+    max_registered_tws = 10000
+    registered_tws_lock = threading.Lock()
+    # the last value of ArchivedTWsVersion seen by this process
+    archived_tws_version: Optional[str] = None
+    # the tws modified since the last time they were written to
+    # ModifiedTW, see mark_profile_tw_as_modified()
+    modified_tws: Optional[Dict[str, float]] = None
+    modified_tws_timer: Optional[threading.Timer] = None
+    modified_tws_lock = threading.Lock()
+    # how often the modified tws are written to the db, and the old tws
+    # are closed, in seconds
+    modified_tws_tick = 1
+    # the keys of each tw other than its hash and its aggregates,
+    # e.g. profile_x_timewindow1_timeline
+    tw_key_suffixes = ("timeline", "evidence")
 
     def __init__(self, logger: Output):
         IObservable.__init__(self)
@@ -47,7 +79,13 @@ class ProfileHandler(IObservable):
             2 - unsupported and unhandled types (cases that may cause errors)
             3 - red warnings that needs examination - developer warnings
         :param text: text to print. Can include format like f'Test {here}'
+            or a function that returns the text, it's only called if the
+            text is going to be printed
         """
+        if self.is_discarded(verbose, debug):
+            return
+        if callable(text):
+            text = text()
 
         self.notify_observers(
             {
@@ -58,6 +96,71 @@ class ProfileHandler(IObservable):
             }
         )
 
+    @property
+    def pipe(self):
+        """
+        returns the pipeline opened by this thread, if any
+        """
+        return getattr(self.thread_state, "pipe", None)
+
+    @pipe.setter
+    def pipe(self, pipe):
+        self.thread_state.pipe = pipe
+
+    @property
+    def writer(self):
+        """
+        returns the pipeline of the flow being added if there's one,
+        otherwise returns the redis client
+        """
+        return self.r if self.pipe is None else self.pipe
+
+    def start_pipeline(self):
+        """
+        Buffers the profile writes and the publishes of the flow being
+        added in a redis pipeline instead of sending each one of them
+        in its own round trip.
+        Nothing is sent to redis until flush_pipeline() is called, so
+        the buffered writes are not visible to reads done in between.
+        """
+        self.pipe = self.r.pipeline(transaction=False)
+
+    def flush_pipeline(self):
+        """
+        Sends all the buffered writes to redis in 1 round trip.
+        The publishes are sent after the writes that precede them, so
+        modules reading the db when they receive a msg always see the
+        data of the flow that triggered it
+        """
+        if self.pipe is None:
+            return
+        pipe, self.pipe = self.pipe, None
+        pipe.execute()
+
+    @contextmanager
+    def batched_writes(self):
+        """
+        yields the pipeline of the flow being added if there's one,
+        otherwise yields a new pipeline that is executed on exit.
+        used for sending many writes of the same function in 1 round trip
+        """
+        if self.pipe is not None:
+            yield self.pipe
+            return
+        pipe = self.r.pipeline(transaction=False)
+        yield pipe
+        pipe.execute()
+
+    def get_tw_aggregate_key(
+        self, profileid: str, twid: str, key_name: str
+    ) -> str:
+        """
+        returns the name of the redis key where the aggregated data of
+        the given key_name is stored for the given profile and tw
+        e.g. profile_1.1.1.1_timewindow1_DstPortsClientTCPEstablished
+        """
+        return f"{profileid}{self.separator}{twid}{self.separator}{key_name}"
+
     def is_doh_server(self, ip: str) -> bool:
         """returns whether the given ip is a DoH server"""
         info: dict = self.get_ip_info(ip)
@@ -122,26 +225,95 @@ class ProfileHandler(IObservable):
             tw_start = float(flowtime - (31536000 * 100))
             tw_number: int = 1
         else:
-            starttime_of_first_tw: str = self.r.hget("analysis", "file_start")
-            if starttime_of_first_tw:
-                starttime_of_first_tw = float(starttime_of_first_tw)
-                tw_number: int = (
-                    floor((flowtime - starttime_of_first_tw) / self.width) + 1
-                )
-
-                tw_start: float = starttime_of_first_tw + (
-                    self.width * (tw_number - 1)
-                )
-            else:
-                # this is the first timewindow
-                tw_number: int = 1
-                tw_start: float = flowtime
+            starttime_of_first_tw: float = self.get_cached_file_start()
+            if starttime_of_first_tw is None:
+                # the input proc sets it using the ts of the first line,
+                # this is only reached if that ts couldn't be read.
+                # the first profiled flow starts the first tw, and only
+                # one profiler worker can set it
+                self.r.hsetnx("analysis", "file_start", flowtime)
+                starttime_of_first_tw = self.get_cached_file_start()
+
+            tw_number: int = (
+                floor((flowtime - starttime_of_first_tw) / self.width) + 1
+            )
+            tw_start: float = starttime_of_first_tw + (
+                self.width * (tw_number - 1)
+            )
 
         tw_id: str = f"timewindow{tw_number}"
 
-        self.add_new_tw(profileid, tw_id, tw_start)
+        if self.registered_tws is None:
+            self.invalidate_tw_cache()
+
+        # the db is only touched when a tw is opened
+        with self.registered_tws_lock:
+            registered_start: Optional[float] = self.registered_tws.get(
+                (profileid, tw_id)
+            )
+            if registered_start is not None:
+                self.registered_tws.move_to_end((profileid, tw_id))
+
+        if registered_start is None or tw_start < registered_start:
+            # tw_start < registered_start is only possible when using
+            # only-one-tw, the tw should start before this flow that is
+            # coming from the past
+            self.add_new_tw(profileid, tw_id, tw_start)
+            self.register_tw(profileid, tw_id, tw_start)
         return tw_id
 
+    def register_tw(self, profileid: str, twid: str, tw_start: float):
+        """
+        remembers that the given tw was added to the db by this process
+        """
+        with self.registered_tws_lock:
+            self.registered_tws[(profileid, twid)] = tw_start
+            self.registered_tws.move_to_end((profileid, twid))
+            while len(self.registered_tws) > self.max_registered_tws:
+                self.registered_tws.popitem(last=False)
+
+    def get_cached_file_start(self) -> Optional[float]:
+        """
+        returns the start time of the first tw. it never changes once
+        it's set, so it's only read from the db until it's there
+        """
+        if self.cached_file_start is None:
+            if file_start := self.r.hget("analysis", "file_start"):
+                self.cached_file_start = float(file_start)
+        return self.cached_file_start
+
+    def invalidate_tw_cache(
+        self, profileid: Optional[str] = None, twid: Optional[str] = None
+    ):
+        """
+        makes get_timewindow() forget about the given tw, or about all
+        the tws and the start of the first tw if none is given,
+        so they're read from/written to the db again
+        should be called whenever tws are removed from the db
+        """
+        with self.registered_tws_lock:
+            if profileid and twid:
+                if self.registered_tws:
+                    self.registered_tws.pop((profileid, twid), None)
+                return
+
+            self.cached_file_start = None
+            self.registered_tws = OrderedDict()
+
+    def check_archived_tws(self):
+        """
+        makes get_timewindow() forget about all the tws once any tw was
+        archived by another process, the archived tws are no longer
+        in the db
+        """
+        version: Optional[str] = self.r.get("ArchivedTWsVersion")
+        if version == self.archived_tws_version:
+            return
+        if self.archived_tws_version is not None and self.registered_tws:
+            with self.registered_tws_lock:
+                self.registered_tws.clear()
+        self.archived_tws_version = version
+
     def add_out_http(
         self,
         profileid,
@@ -182,7 +354,7 @@ class ProfileHandler(IObservable):
         self.publish("new_http", to_send)
         self.publish("new_url", to_send)
 
-        self.print(f"Adding HTTP flow to DB: {http_flow_dict}", 3, 0)
+        self.print(lambda: f"Adding HTTP flow to DB: {http_flow_dict}", 3, 0)
 
         http_flow.pop("flow", None)
         http_flow["uid"] = flow.uid
@@ -277,7 +449,7 @@ class ProfileHandler(IObservable):
                 flow.uid,
                 flow.qtype_name,
                 srcip,
-                twid,
+                ttls=flow.TTLs,
             )
             # send each dns answer to TI module
             for answer in flow.answers:
@@ -320,7 +492,7 @@ class ProfileHandler(IObservable):
         starttime = str(flow.starttime)
         uid = flow.uid
         ip = str(flow.daddr)
-        spkts = flow.spkts
+        spkts = int(flow.spkts)
         state_hist = flow.state_hist if hasattr(flow, "state_hist") else ""
 
         if "^" in state_hist:
@@ -337,57 +509,24 @@ class ProfileHandler(IObservable):
         # Choose which port to use based if we were asked Dst or Src
         port = str(sport) if port_type == "Src" else str(dport)
 
-        # If we are the Client, we want to store the dstips only
-        # If we are the Server, we want to store the srcips only
-        ip_key = "srcips" if role == "Server" else "dstips"
-
         # Get the state. Established, NotEstablished
         summaryState = self.get_final_state_from_flags(state, pkts)
 
-        old_profileid_twid_data = self.get_data_from_profile_tw(
-            profileid, twid, port_type, summaryState, proto, role, "Ports"
-        )
-
-        try:
-            # we already have info about this dport, update it
-            port_data = old_profileid_twid_data[port]
-            port_data["totalflows"] += 1
-            port_data["totalpkt"] += pkts
-            port_data["totalbytes"] += totbytes
-
-            # if there's a conn from this ip on this port, update the pkts of this conn
-            if ip in port_data[ip_key]:
-                port_data[ip_key][ip]["pkts"] += pkts
-                port_data[ip_key][ip]["spkts"] += spkts
-                port_data[ip_key][ip]["uid"].append(uid)
-            else:
-                port_data[ip_key][ip] = {
-                    "pkts": pkts,
-                    "spkts": spkts,
-                    "stime": starttime,
-                    "uid": [uid],
-                }
-
-        except KeyError:
-            # First time for this dport
-            port_data = {
-                "totalflows": 1,
-                "totalpkt": pkts,
-                "totalbytes": totbytes,
-                ip_key: {
-                    ip: {
-                        "pkts": pkts,
-                        "spkts": spkts,
-                        "stime": starttime,
-                        "uid": [uid],
-                    }
-                },
-            }
-        old_profileid_twid_data[port] = port_data
-        data = json.dumps(old_profileid_twid_data)
-        hash_key = f"{profileid}{self.separator}{twid}"
         key_name = f"{port_type}Ports{role}{proto}{summaryState}"
-        self.r.hset(hash_key, key_name, str(data))
+        hash_key = self.get_tw_aggregate_key(profileid, twid, key_name)
+        # the data of each port is stored flat in the hash of this
+        # key_name and updated in place, see get_data_from_profile_tw()
+        # for how it's read back
+        with self.batched_writes() as pipe:
+            self.register_tw_aggregate(pipe, profileid, twid, key_name)
+            pipe.hincrby(hash_key, f"{port}|totalflows", 1)
+            pipe.hincrby(hash_key, f"{port}|totalpkt", pkts)
+            pipe.hincrby(hash_key, f"{port}|totalbytes", totbytes)
+            # the conns from/to this ip on this port
+            pipe.hincrby(hash_key, f"{port}|{ip}|pkts", pkts)
+            pipe.hincrby(hash_key, f"{port}|{ip}|spkts", spkts)
+            pipe.hsetnx(hash_key, f"{port}|{ip}|stime", starttime)
+            pipe.rpush(f"{hash_key}{self.separator}uids", f"{port}|{ip}|{uid}")
         self.mark_profile_tw_as_modified(profileid, twid, starttime)
 
     def get_final_state_from_flags(self, state, pkts):
@@ -560,10 +699,16 @@ class ProfileHandler(IObservable):
             # Not Establihed]
             # Example: key_name = 'SrcPortClientTCPEstablished'
             key = direction + type_data + role + protocol.upper() + state
-            data = self.r.hget(f"{profileid}{self.separator}{twid}", key)
+            hash_key = self.get_tw_aggregate_key(profileid, twid, key)
+            pipe = self.r.pipeline(transaction=False)
+            pipe.hgetall(hash_key)
+            pipe.lrange(f"{hash_key}{self.separator}uids", 0, -1)
+            fields, uids = pipe.execute()
 
-            if data:
-                return json.loads(data)
+            if fields:
+                if type_data == "Ports":
+                    return self.decode_ports_data(fields, uids, role)
+                return self.decode_ips_data(fields, uids)
 
             self.print(
                 f"There is no data for Key: {key}. Profile {profileid} TW {twid}",
@@ -580,79 +725,70 @@ class ProfileHandler(IObservable):
             )
             self.print(traceback.format_exc(), 0, 1)
 
-    def update_ip_info(
-        self,
-        old_profileid_twid_data: dict,
-        pkts,
-        dport,
-        spkts,
-        totbytes,
-        ip,
-        starttime,
-        uid,
-    ) -> dict:
+    @staticmethod
+    def decode_ports_data(fields: dict, uids: list, role: str) -> dict:
+        """
+        rebuilds the dict of ports stored by add_port()
+        :param fields: the hash of the ports of a tw, its fields are
+            '<port>|<counter>' and '<port>|<ip>|<counter>'
+        :param uids: list of '<port>|<ip>|<uid>'
+        :return: {port: {totalflows, totalpkt, totalbytes,
+            dstips or srcips: {ip: {pkts, spkts, stime, uid: [..]}}}}
         """
-        #  Updates how many times each individual DstPort was contacted,
-        the total flows sent by this ip and their uids,
-        the total packets sent by this ip,
-        and total bytes sent by this ip
-        """
-        dport = str(dport)
-        spkts = int(spkts)
-        pkts = int(pkts)
-        totbytes = int(totbytes)
-        if ip in old_profileid_twid_data:
-            # update info about an existing ip
-            ip_data = old_profileid_twid_data[ip]
-            ip_data["totalflows"] += 1
-            ip_data["totalpkt"] += pkts
-            ip_data["totalbytes"] += totbytes
-            ip_data["uid"].append(uid)
-
-            ip_data["dstports"]: dict
-
-            if dport in ip_data["dstports"]:
-                ip_data["dstports"][dport] += spkts
+        ip_key = "srcips" if role == "Server" else "dstips"
+        ports = {}
+        for field, value in fields.items():
+            port, *ip, attr = field.split("|")
+            port_data = ports.setdefault(port, {ip_key: {}})
+            if not ip:
+                port_data[attr] = int(value)
+                continue
+            ip_data = port_data[ip_key].setdefault(ip[0], {"uid": []})
+            ip_data[attr] = value if attr == "stime" else int(value)
+
+        for entry in uids:
+            port, ip, uid = entry.split("|", 2)
+            try:
+                ports[port][ip_key][ip]["uid"].append(uid)
+            except KeyError:
+                continue
+        return ports
+
+    @staticmethod
+    def decode_ips_data(fields: dict, uids: list) -> dict:
+        """
+        rebuilds the dict of ips stored by add_ips()
+        :param fields: the hash of the ips of a tw, its fields are
+            '<ip>|<counter>' and '<ip>|dstports|<dport>'
+        :param uids: list of '<ip>|<uid>'
+        :return: {ip: {totalflows, totalpkt, totalbytes, stime,
+            uid: [..], dstports: {dport: spkts}}}
+        """
+        ips = {}
+        for field, value in fields.items():
+            ip, attr, *dport = field.split("|")
+            ip_data = ips.setdefault(ip, {"uid": [], "dstports": {}})
+            if dport:
+                ip_data["dstports"][dport[0]] = int(value)
             else:
-                ip_data["dstports"].update({dport: spkts})
-        else:
-            # First time seeing this ip
-            ip_data = {
-                "totalflows": 1,
-                "totalpkt": pkts,
-                "totalbytes": totbytes,
-                "stime": starttime,
-                "uid": [uid],
-                "dstports": {dport: spkts},
-            }
-        old_profileid_twid_data.update({ip: ip_data})
+                ip_data[attr] = value if attr == "stime" else int(value)
 
-        return old_profileid_twid_data
+        for entry in uids:
+            ip, uid = entry.split("|", 1)
+            if ip in ips:
+                ips[ip]["uid"].append(uid)
+        return ips
 
     def update_times_contacted(self, ip, direction, profileid, twid):
         """
         :param ip: the ip that we want to update the times we contacted
         """
 
-        # Get the hash of the timewindow
-        profileid_twid = f"{profileid}{self.separator}{twid}"
-
-        # Get the DstIPs data for this tw in this profile
         # The format is {'1.1.1.1' :  3}
-        ips_contacted = self.r.hget(profileid_twid, f"{direction}IPs")
-        if not ips_contacted:
-            ips_contacted = {}
-
-        try:
-            ips_contacted = json.loads(ips_contacted)
-            # Add 1 because we found this ip again
-            ips_contacted[ip] += 1
-        except (TypeError, KeyError):
-            # There was no previous data stored in the DB
-            ips_contacted[ip] = 1
-
-        ips_contacted = json.dumps(ips_contacted)
-        self.r.hset(profileid_twid, f"{direction}IPs", str(ips_contacted))
+        key_name = f"{direction}IPs"
+        hash_key = self.get_tw_aggregate_key(profileid, twid, key_name)
+        self.register_tw_aggregate(self.writer, profileid, twid, key_name)
+        self.writer.hincrby(hash_key, ip, 1)
 
     def add_ips(self, profileid, twid, flow, role):
         """
@@ -724,49 +860,24 @@ class ProfileHandler(IObservable):
         # Get the state. Established, NotEstablished
         summaryState = self.get_final_state_from_flags(flow.state, flow.pkts)
         key_name = f"{direction}IPs{role}{flow.proto.upper()}{summaryState}"
-        # Get the previous data about this key
-        old_profileid_twid_data = self.get_data_from_profile_tw(
-            profileid,
-            twid,
-            direction,
-            summaryState,
-            flow.proto,
-            role,
-            "IPs",
-        )
-        profileid_twid_data: dict = self.update_ip_info(
-            old_profileid_twid_data,
-            flow.pkts,
-            flow.dport,
-            flow.spkts,
-            flow.bytes,
-            ip,
-            starttime,
-            uid,
-        )
-
-        # Store this data in the profile hash
-        self.r.hset(
-            f"{profileid}{self.separator}{twid}",
-            key_name,
-            json.dumps(profileid_twid_data),
-        )
+        hash_key = self.get_tw_aggregate_key(profileid, twid, key_name)
+        # updates how many times each individual DstPort was contacted,
+        # the total flows sent by this ip and their uids,
+        # the total packets sent by this ip,
+        # and total bytes sent by this ip
+        # see get_data_from_profile_tw() for how it's read back
+        with self.batched_writes() as pipe:
+            self.register_tw_aggregate(pipe, profileid, twid, key_name)
+            pipe.hincrby(hash_key, f"{ip}|totalflows", 1)
+            pipe.hincrby(hash_key, f"{ip}|totalpkt", int(flow.pkts))
+            pipe.hincrby(hash_key, f"{ip}|totalbytes", int(flow.bytes))
+            pipe.hsetnx(hash_key, f"{ip}|stime", starttime)
+            pipe.hincrby(
+                hash_key, f"{ip}|dstports|{flow.dport}", int(flow.spkts)
+            )
+            pipe.rpush(f"{hash_key}{self.separator}uids", f"{ip}|{uid}")
         return True
 
-    def get_all_contacted_ips_in_profileid_twid(self, profileid, twid) -> dict:
-        """
-        Get all the contacted IPs in a given profile and TW
-        """
-        all_flows: dict = self.get_all_flows_in_profileid_twid(profileid, twid)
-        if not all_flows:
-            return {}
-        contacted_ips = {}
-        for uid, flow in all_flows.items():
-            # get the daddr of this flow
-            daddr = flow["daddr"]
-            contacted_ips[daddr] = uid
-        return contacted_ips
-
     def markProfileTWAsBlocked(self, profileid, twid):
         """Add this profile and tw to the list of blocked
         a profile is only blocked if it was blocked using the user's
@@ -829,30 +940,13 @@ class ProfileHandler(IObservable):
             "module_labels": {},
         }
 
-        # Convert to json string
-        flow_dict = json.dumps(flow_dict)
         # The key was not there before. So this flow is not repeated
         # Store the label in our uniq set, and increment it by 1
         if label:
-            self.r.zincrby("labels", 1, label)
-
-        flow_dict = {flow.uid: flow_dict}
+            self.writer.zincrby("labels", 1, label)
 
-        # Get the dictionary and convert to json string
-        flow_dict = json.dumps(flow_dict)
         # Prepare the data to publish.
-        to_send = {
-            "profileid": profileid,
-            "twid": twid,
-            "flow": flow_dict,
-            "stime": flow.starttime,
-        }
-        to_send = json.dumps(to_send)
-
-        # set the pcap/file stime in the analysis key
-        if self.first_flow:
-            self.set_input_metadata({"file_start": flow.starttime})
-            self.first_flow = False
+        to_send: str = encode_new_flow(profileid, twid, flow.uid, flow_dict)
 
         # dont send arp flows in this channel, they have their own new_arp channel
         if flow.type_ != "arp":
@@ -932,7 +1026,7 @@ class ProfileHandler(IObservable):
         }
         to_send = json.dumps(to_send)
         self.publish("new_ssh", to_send)
-        self.print(f"Adding SSH flow to DB: {ssh_flow_dict}", 3, 0)
+        self.print(lambda: f"Adding SSH flow to DB: {ssh_flow_dict}", 3, 0)
         self.give_threat_intelligence(
             profileid,
             twid,
@@ -973,7 +1067,7 @@ class ProfileHandler(IObservable):
         }
         to_send = json.dumps(to_send)
         self.publish("new_notice", to_send)
-        self.print(f"Adding notice flow to DB: {notice_flow}", 3, 0)
+        self.print(lambda: f"Adding notice flow to DB: {notice_flow}", 3, 0)
         self.give_threat_intelligence(
             profileid,
             twid,
@@ -1023,7 +1117,7 @@ class ProfileHandler(IObservable):
         }
         to_send = json.dumps(to_send)
         self.publish("new_ssl", to_send)
-        self.print(f"Adding SSL flow to DB: {ssl_flow}", 3, 0)
+        self.print(lambda: f"Adding SSL flow to DB: {ssl_flow}", 3, 0)
         # Check if the server_name (SNI) is detected by the threat intelligence.
         # Empty field in the end, cause we have extrafield for the IP.
         # If server_name is not empty, set in the IPsInfo and send to TI
@@ -1054,16 +1148,10 @@ class ProfileHandler(IObservable):
             # Verify that the SNI is equal to any of the domains in the DNS
             # resolution
             # only add this SNI to our db if it has a DNS resolution
-            if dns_resolutions := self.r.hgetall("DNSresolution"):
-                # dns_resolutions is a dict with {ip:{'ts'..,'domains':...,
-                # 'uid':..}}
-                for ip, resolution in dns_resolutions.items():
-                    resolution = json.loads(resolution)
-                    if SNI_port["server_name"] in resolution["domains"]:
-                        # add SNI to our db as it has a DNS resolution
-                        sni_ipdata.append(SNI_port)
-                        self.set_ip_info(flow.daddr, {"SNI": sni_ipdata})
-                        break
+            if self.r.hexists("DomainsResolved", SNI_port["server_name"]):
+                # add SNI to our db as it has a DNS resolution
+                sni_ipdata.append(SNI_port)
+                self.set_ip_info(flow.daddr, {"SNI": sni_ipdata})
 
     def get_profileid_from_ip(self, ip: str) -> Optional[str]:
         """
@@ -1107,13 +1195,50 @@ class ProfileHandler(IObservable):
         """
         Get the src ip for a specific TW for a specific profileid
         """
-        return self.r.hget(profileid + self.separator + twid, "SrcIPs")
+        return self.get_ips_contacted(profileid, twid, "Src")
 
     def get_dstips_from_profile_tw(self, profileid, twid):
         """
         Get the dst ip for a specific TW for a specific profileid
         """
-        return self.r.hget(profileid + self.separator + twid, "DstIPs")
+        return self.get_ips_contacted(profileid, twid, "Dst")
+
+    def get_ips_contacted(
+        self, profileid: str, twid: str, direction: str
+    ) -> Optional[str]:
+        """
+        returns a json serialized dict with the number of times each
+        ip was contacted in the given tw, e.g. {'1.1.1.1' :  3}
+        :param direction: 'Src' or 'Dst'
+        """
+        hash_key = self.get_tw_aggregate_key(
+            profileid, twid, f"{direction}IPs"
+        )
+        if ips_contacted := self.r.hgetall(hash_key):
+            ips_contacted = {ip: int(n) for ip, n in ips_contacted.items()}
+            return json.dumps(ips_contacted)
+
+    def was_ip_contacted(self, profileid: str, twid: str, ip: str) -> bool:
+        """
+        returns whether the given profile connected to the given ip
+        in the given tw.
+        uses the DstIPs of the tw, updated by add_ips() for each conn
+        flow, so no flows are read
+        """
+        hash_key = self.get_tw_aggregate_key(profileid, twid, "DstIPs")
+        return bool(self.r.hexists(hash_key, ip))
+
+    def was_any_ip_contacted(
+        self, profileid: str, twid: str, ips: List[str]
+    ) -> bool:
+        """
+        returns whether the given profile connected to any of the given
+        ips in the given tw, using one query
+        """
+        if not ips:
+            return False
+        hash_key = self.get_tw_aggregate_key(profileid, twid, "DstIPs")
+        return any(self.r.hmget(hash_key, ips))
 
     def get_t2_for_profile_tw(self, profileid, twid, tupleid, tuple_key: str):
         """
@@ -1219,7 +1344,11 @@ class ProfileHandler(IObservable):
         """
         try:
             # Add the new TW to the index of TW
-            self.r.zadd(f"tws{profileid}", {timewindow: float(startoftw)})
+            if not self.r.zadd(
+                f"tws{profileid}", {timewindow: float(startoftw)}
+            ):
+                # we already have this tw
+                return
             self.print(
                 f"Created and added to DB for "
                 f"{profileid}: a new tw: {timewindow}. "
@@ -1549,18 +1678,18 @@ class ProfileHandler(IObservable):
                 return False
 
             # Add the profile to the index. The index is called 'profiles'
-            self.r.sadd("profiles", str(profileid))
+            self.writer.sadd("profiles", str(profileid))
             # Create the hashmap with the profileid.
             # The hasmap of each profile is named with the profileid
             # Add the start time of profile
-            self.r.hset(profileid, "starttime", starttime)
+            self.writer.hset(profileid, "starttime", starttime)
             # For now duration of the TW is fixed
-            self.r.hset(profileid, "duration", duration)
+            self.writer.hset(profileid, "duration", duration)
             # When a new profiled is created assign threat level = 0
             # and confidence = 0.05
             confidence = 0.05
             self.update_threat_level(profileid, "info", confidence)
-            self.r.hset(profileid, "confidence", confidence)
+            self.writer.hset(profileid, "confidence", confidence)
             # The IP of the profile should also be added as a new IP
             # we know about.
             ip = profileid.split(self.separator)[1]
@@ -1598,6 +1727,7 @@ class ProfileHandler(IObservable):
         modification_time = float(sit) - self.width
         if close_all:
             # close all tws no matter when they were last modified
+            self.flush_modified_tws()
             modification_time = float("inf")
 
         profiles_tws_to_close = self.r.zrangebyscore(
@@ -1608,8 +1738,8 @@ class ProfileHandler(IObservable):
             profile_tw_to_close_id = profile_tw_to_close[0]
             profile_tw_to_close_time = profile_tw_to_close[1]
             self.print(
-                f"The profile id {profile_tw_to_close_id} has to be closed"
-                f" because it was"
+                lambda: f"The profile id {profile_tw_to_close_id} has to be "
+                f"closed because it was"
                 f" last modifed on {profile_tw_to_close_time} and we are "
                 f"closing everything older than {modification_time}."
                 f" Current time {sit}. "
@@ -1623,9 +1753,150 @@ class ProfileHandler(IObservable):
         """
         Mark the TW as closed so tools can work on its data
         """
+        # may be called from the modified tws timer, so this doesn't use
+        # the pipeline of the flow being added
         self.r.sadd("ClosedTW", profileid_tw)
         self.r.zrem("ModifiedTW", profileid_tw)
-        self.publish("tw_closed", profileid_tw)
+        self.r.publish("tw_closed", profileid_tw)
+        # no more flows are expected in this tw
+        self.invalidate_tw_cache(*profileid_tw.rsplit(self.separator, 1))
+
+    def get_tws_to_archive(self) -> List[Tuple[str, str]]:
+        """
+        returns the closed tws that exceed the retention policy set by
+        closed_tws_to_keep and closed_tws_max_age
+        :return: list of (profileid, twid) tuples
+        """
+        if not (self.closed_tws_to_keep or self.closed_tws_max_age):
+            return []
+
+        closed_tws: Dict[str, List[str]] = {}
+        for profileid_tw in self.r.smembers("ClosedTW"):
+            profileid, twid = profileid_tw.rsplit(self.separator, 1)
+            closed_tws.setdefault(profileid, []).append(twid)
+
+        # tws that ended before this time are too old
+        oldest_tw_end = (
+            float(self.getSlipsInternalTime()) - self.closed_tws_max_age
+        )
+        to_archive = []
+        for profileid, twids in closed_tws.items():
+            twids.sort(key=lambda twid: int(twid.replace("timewindow", "")))
+            to_keep = twids
+            if self.closed_tws_to_keep:
+                to_keep = twids[-self.closed_tws_to_keep :]
+                to_archive.extend(
+                    (profileid, twid)
+                    for twid in twids[: -self.closed_tws_to_keep]
+                )
+
+            if not self.closed_tws_max_age:
+                continue
+            for twid in to_keep:
+                tw_start = self.r.zscore(f"tws{profileid}", twid)
+                if (
+                    tw_start is not None
+                    and float(tw_start) + self.width < oldest_tw_end
+                ):
+                    to_archive.append((profileid, twid))
+        return to_archive
+
+    def get_tw_keys(self, profileid: str, twid: str) -> List[str]:
+        """
+        returns the names of all the keys of the given tw,
+        e.g. profile_x_timewindow1, profile_x_timewindow1_timeline,
+        profile_x_timewindow1_evidence and their aggregates.
+        the aggregates are found in the registry of the tw, see
+        register_tw_aggregate(), so the keyspace is never scanned
+        """
+        prefix = f"{profileid}{self.separator}{twid}"
+        registry = self.get_tw_aggregate_key(profileid, twid, "aggregates")
+        keys = [prefix, registry]
+        keys.extend(
+            f"{prefix}{self.separator}{suffix}"
+            for suffix in self.tw_key_suffixes
+        )
+        for key_name in self.r.smembers(registry):
+            key = self.get_tw_aggregate_key(profileid, twid, key_name)
+            keys.extend((key, f"{key}{self.separator}uids"))
+        return keys
+
+    def register_tw_aggregate(self, pipe, profileid, twid, key_name: str):
+        """
+        adds the given aggregate key name to the registry of the tw, so
+        it's found by get_tw_keys() when the tw is archived
+        """
+        pipe.sadd(
+            self.get_tw_aggregate_key(profileid, twid, "aggregates"),
+            key_name,
+        )
+
+    def export_keys(self, keys: List[str]) -> Dict[str, Tuple[str, Any]]:
+        """
+        reads the given keys
+        :return: dict with each existing key and a tuple of its redis type
+        and its data. zsets are returned as a dict with each member and
+        its score
+        """
+        pipe = self.r.pipeline(transaction=False)
+        for key in keys:
+            pipe.type(key)
+        key_types: List[str] = pipe.execute()
+
+        readers = {
+            "hash": pipe.hgetall,
+            "zset": lambda key: pipe.zrange(key, 0, -1, withscores=True),
+            "list": lambda key: pipe.lrange(key, 0, -1),
+            "set": pipe.smembers,
+            "string": pipe.get,
+        }
+        existing_keys = [
+            (key, key_type)
+            for key, key_type in zip(keys, key_types)
+            if key_type in readers
+        ]
+        for key, key_type in existing_keys:
+            readers[key_type](key)
+
+        exported = {}
+        for (key, key_type), data in zip(existing_keys, pipe.execute()):
+            if key_type == "zset":
+                data = dict(data)
+            elif key_type == "set":
+                data = sorted(data)
+            exported[key] = (key_type, data)
+        return exported
+
+    def archive_tw(
+        self, profileid: str, twid: str
+    ) -> Optional[Dict[str, Tuple[str, Any]]]:
+        """
+        exports all the keys of the given closed tw and deletes them from
+        redis, along with the tw from tws<profileid> and ClosedTW.
+        the keys are watched while they're exported, so the tw is only
+        deleted if nothing was written to it in the meantime
+        :return: the exported keys as returned by export_keys(), or None
+        if the tw was modified while being exported. it's archived
+        in a later call
+        """
+        profileid_tw = f"{profileid}{self.separator}{twid}"
+        keys: List[str] = self.get_tw_keys(profileid, twid)
+        with self.r.pipeline() as pipe:
+            try:
+                pipe.watch(*keys)
+                exported = self.export_keys(keys)
+                pipe.multi()
+                if exported:
+                    pipe.delete(*exported)
+                pipe.srem("ClosedTW", profileid_tw)
+                pipe.zrem(f"tws{profileid}", twid)
+                # tells the other processes to forget the tws they
+                # registered
+                pipe.incr("ArchivedTWsVersion")
+                pipe.execute()
+            except redis.exceptions.WatchError:
+                return None
+        return exported
 
     def mark_profile_tw_as_modified(self, profileid, twid, timestamp):
         """
@@ -1636,13 +1907,57 @@ class ProfileHandler(IObservable):
            in the TW itself
         3- To update the internal time of slips
         4- To check if we should 'close' some TW
+        the modifications are coalesced and written to the db once per
+        modified_tws_tick by flush_modified_tws()
         """
         timestamp = time.time()
-        data = {f"{profileid}{self.separator}{twid}": float(timestamp)}
-        self.r.zadd("ModifiedTW", data)
-        self.publish("tw_modified", f"{profileid}:{twid}")
+        with self.modified_tws_lock:
+            if self.modified_tws is None:
+                self.modified_tws = {}
+            self.modified_tws[f"{profileid}{self.separator}{twid}"] = timestamp
+            if (
+                self.modified_tws_timer is None
+                or not self.modified_tws_timer.is_alive()
+            ):
+                # not a daemon thread, so the pending modifications are
+                # flushed before the process exits
+                self.modified_tws_timer = threading.Timer(
+                    self.modified_tws_tick, self.handle_modified_tws_tick
+                )
+                self.modified_tws_timer.start()
+
+    def handle_modified_tws_tick(self):
+        """
+        runs modified_tws_tick seconds after a tw is marked as modified.
+        writes the modified tws to the db and closes the old ones
+        """
+        with self.modified_tws_lock:
+            # the next modification starts a new timer
+            self.modified_tws_timer = None
+        self.flush_modified_tws()
         # Check if we should close some TW
         self.check_tw_to_close()
+        self.check_archived_tws()
+
+    def flush_modified_tws(self):
+        """
+        adds the tws modified since the last flush to ModifiedTW and
+        publishes each of them once in tw_modified
+        """
+        with self.modified_tws_lock:
+            modified_tws: Optional[Dict[str, float]] = self.modified_tws
+            self.modified_tws = {}
+        if not modified_tws:
+            return
+
+        # may be called from the timer thread, so this uses its own
+        # pipeline
+        pipe = self.r.pipeline(transaction=False)
+        pipe.zadd("ModifiedTW", modified_tws)
+        for profileid_tw in modified_tws:
+            profileid, twid = profileid_tw.rsplit(self.separator, 1)
+            pipe.publish("tw_modified", f"{profileid}:{twid}")
+        pipe.execute()
 
     def publish_new_letter(
         self, new_symbol: str, profileid: str, twid: str, tupleid: str, flow
@@ -1762,7 +2077,7 @@ class ProfileHandler(IObservable):
                 prev_symbols[tupleid] = symbol
 
             prev_symbols = json.dumps(prev_symbols)
-            self.r.hset(profileid_twid, direction, prev_symbols)
+            self.writer.hset(profileid_twid, direction, prev_symbols)
             self.mark_profile_tw_as_modified(profileid, twid, flow.starttime)
 
         except Exception:
@@ -1792,7 +2107,9 @@ class ProfileHandler(IObservable):
 
     def add_timeline_line(self, profileid, twid, data, timestamp):
         """Add a line to the timeline of this profileid and twid"""
-        self.print(f"Adding timeline for {profileid}, {twid}: {data}", 3, 0)
+        self.print(
+            lambda: f"Adding timeline for {profileid}, {twid}: {data}", 3, 0
+        )
         key = str(
             profileid + self.separator + twid + self.separator + "timeline"
         )
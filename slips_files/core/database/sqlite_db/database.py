@@ -1,13 +1,21 @@
-from typing import List, Dict
+from typing import (
+    Any,
+    List,
+    Dict,
+    Tuple,
+)
 import os.path
 import sqlite3
 import json
 import csv
+import time
 from dataclasses import asdict
-from threading import Lock
+from itertools import groupby
+from threading import Lock, Thread
 from time import sleep
 from slips_files.core.output import Output
 from slips_files.common.abstracts.observer import IObservable
+from slips_files.common.parsers.config_parser import ConfigParser
 
 
 class SQLiteDB(IObservable):
@@ -23,8 +31,25 @@ class SQLiteDB(IObservable):
         self.logger = logger
         self.add_observer(self.logger)
         self._flows_db = os.path.join(output_dir, "flows.sqlite")
+        self.read_configuration()
+        # flows are buffered and written in batches, this list has the
+        # (query, params) of each write in the order they were buffered
+        self.write_buffer: List[Tuple[str, tuple]] = []
+        self.last_flush = time.time()
+        self.buffer_lock = Lock()
+        # held while swapping and writing the buffer, so the batches are
+        # committed in the order they were buffered
+        self.flush_lock = Lock()
+        # started with the first buffered write, to write the flows
+        # that are buffered when no more flows are coming
+        self.flusher = None
         self.connect()
 
+    def read_configuration(self):
+        conf = ConfigParser()
+        self.flush_size: int = conf.sqlite_flush_size()
+        self.flush_interval: float = conf.sqlite_flush_interval()
+
     def connect(self):
         """
         Creates the db if it doesn't exist and connects to it
@@ -41,9 +66,21 @@ class SQLiteDB(IObservable):
         )
 
         self.cursor = self.conn.cursor()
+        # WAL lets the modules read the flows while the profiler
+        # is writing them
+        self.cursor.execute("PRAGMA journal_mode=WAL")
+        self.cursor.execute("PRAGMA synchronous=NORMAL")
         if db_newly_created:
             # only init tables if the db is newly created
             self.init_tables()
+        else:
+            # may be missing from dbs created by older versions
+            self.create_table(
+                "archived_tws",
+                "profileid TEXT, twid TEXT, key TEXT PRIMARY KEY, "
+                "key_type TEXT, data TEXT",
+            )
+        self.create_indexes()
 
     def get_number_of_tables(self):
         """
@@ -60,10 +97,22 @@ class SQLiteDB(IObservable):
             "flows": "uid TEXT PRIMARY KEY, flow TEXT, label TEXT, profileid TEXT, twid TEXT, aid TEXT",
             "altflows": "uid TEXT PRIMARY KEY, flow TEXT, label TEXT, profileid TEXT, twid TEXT, flow_type TEXT",
             "alerts": "alert_id TEXT PRIMARY KEY, alert_time TEXT, ip_alerted TEXT, timewindow TEXT, tw_start TEXT, tw_end TEXT, label TEXT",
+            "archived_tws": "profileid TEXT, twid TEXT, key TEXT PRIMARY KEY, key_type TEXT, data TEXT",
         }
         for table_name, schema in table_schema.items():
             self.create_table(table_name, schema)
 
+    def create_indexes(self):
+        """
+        creates the indexes used for getting the flows
+        of a profile and a tw
+        """
+        for table_name in ("flows", "altflows", "archived_tws"):
+            self.execute(
+                f"CREATE INDEX IF NOT EXISTS {table_name}_profileid_twid "
+                f"ON {table_name} (profileid, twid)"
+            )
+
     def _init_db(self):
         """
         creates the db if it doesn't exist and clears it if it exists
@@ -117,19 +166,6 @@ class SQLiteDB(IObservable):
             return json.loads(flow)
         return False
 
-    def get_all_contacted_ips_in_profileid_twid(self, profileid, twid) -> dict:
-        all_flows: dict = self.get_all_flows_in_profileid_twid(profileid, twid)
-
-        if not all_flows:
-            return {}
-
-        contacted_ips = {}
-        for uid, flow in all_flows.items():
-            # get the daddr of this flow
-            daddr = flow["daddr"]
-            contacted_ips[daddr] = uid
-        return contacted_ips
-
     def get_all_flows_in_profileid_twid(self, profileid, twid):
         condition = f'profileid = "{profileid}" ' f'AND twid = "{twid}"'
         all_flows: list = self.select("flows", condition=condition)
@@ -174,6 +210,7 @@ class SQLiteDB(IObservable):
         """
         sets the given new_label to each flow in the uids list
         """
+        self.flush_buffer()
         for uid in uids:
             # add the label to the flow (conn.log flow)
             query = f'UPDATE flows SET label="{new_label}" WHERE uid="{uid}"'
@@ -224,6 +261,8 @@ class SQLiteDB(IObservable):
     def iterate_flows(self):
         """returns an iterator"""
 
+        self.flush_buffer()
+
         # generator function to iterate over the rows
         def row_generator():
             # select all flows and altflows
@@ -263,7 +302,7 @@ class SQLiteDB(IObservable):
                 label,
                 flow.aid,
             )
-            self.execute(
+            self.buffer_write(
                 "INSERT OR REPLACE INTO flows (profileid, twid, uid, flow, label, aid) "
                 "VALUES (?, ?, ?, ?, ?, ?);",
                 parameters,
@@ -277,7 +316,7 @@ class SQLiteDB(IObservable):
                 label,
             )
 
-            self.execute(
+            self.buffer_write(
                 "INSERT OR REPLACE INTO flows (profileid, twid, uid, flow, label) "
                 "VALUES (?, ?, ?, ?, ?);",
                 parameters,
@@ -309,7 +348,7 @@ class SQLiteDB(IObservable):
             label,
             flow.type_,
         )
-        self.execute(
+        self.buffer_write(
             "INSERT OR REPLACE INTO altflows (profileid, twid, uid, flow, label, flow_type) "
             "VALUES (?, ?, ?, ?, ?, ?);",
             parameters,
@@ -338,6 +377,74 @@ class SQLiteDB(IObservable):
             ),
         )
 
+    @staticmethod
+    def merge_archived_key(key_type: str, old_data: Any, new_data: Any):
+        """
+        merges the data of a key that was archived before with the data
+        of the same key that was added to redis after archiving it
+        """
+        if key_type in ("hash", "zset"):
+            return {**old_data, **new_data}
+        if key_type == "list":
+            return old_data + new_data
+        if key_type == "set":
+            return sorted(set(old_data) | set(new_data))
+        return new_data
+
+    def archive_tw(
+        self, profileid: str, twid: str, keys: Dict[str, Tuple[str, Any]]
+    ):
+        """
+        stores the redis keys of the given closed tw
+        :param keys: dict with each key name and a tuple of its redis type
+        and its data, as returned by RedisDB.archive_tw()
+        """
+        archived: Dict[str, Tuple[str, Any]] = self.get_archived_tw(
+            profileid, twid
+        )
+        query = (
+            "INSERT OR REPLACE INTO archived_tws "
+            "(profileid, twid, key, key_type, data) "
+            "VALUES (?, ?, ?, ?, ?);"
+        )
+        writes = []
+        for key, (key_type, data) in keys.items():
+            if key in archived:
+                data = self.merge_archived_key(
+                    key_type, archived[key][1], data
+                )
+            writes.append(
+                (query, (profileid, twid, key, key_type, json.dumps(data)))
+            )
+
+        self.executemany(writes)
+
+    def get_archived_tw(
+        self, profileid: str, twid: str
+    ) -> Dict[str, Tuple[str, Any]]:
+        """
+        returns the archived redis keys of the given tw
+        :return: dict with each key name and a tuple of its redis type
+        and its data
+        """
+        self.execute(
+            "SELECT key, key_type, data FROM archived_tws "
+            "WHERE profileid = ? AND twid = ?",
+            (profileid, twid),
+        )
+        return {
+            key: (key_type, json.loads(data))
+            for key, key_type, data in self.fetchall()
+        }
+
+    def is_tw_archived(self, profileid: str, twid: str) -> bool:
+        self.execute(
+            "SELECT 1 FROM archived_tws "
+            "WHERE profileid = ? AND twid = ? LIMIT 1",
+            (profileid, twid),
+        )
+        return self.fetchone() is not None
+
     def insert(self, table_name, values):
         query = f"INSERT INTO {table_name} VALUES ({values})"
         self.execute(query)
@@ -351,6 +458,7 @@ class SQLiteDB(IObservable):
         self.execute(query)
 
     def select(self, table_name, columns="*", condition=None):
+        self.flush_buffer()
         query = f"SELECT {columns} FROM {table_name}"
         if condition:
             query += f" WHERE {condition}"
@@ -362,6 +470,7 @@ class SQLiteDB(IObservable):
         """
         returns th enumber of matching rows in the given table based on a specific contioins
         """
+        self.flush_buffer()
         query = f"SELECT COUNT(*) FROM {table}"
 
         if condition:
@@ -371,6 +480,7 @@ class SQLiteDB(IObservable):
         return self.fetchone()[0]
 
     def close(self):
+        self.flush_buffer()
         self.cursor.close()
         self.conn.close()
 
@@ -392,6 +502,89 @@ class SQLiteDB(IObservable):
         self.cursor_lock.release()
         return res
 
+    def buffer_write(self, query: str, params: tuple):
+        """
+        buffers the given write query, the buffer is written to the db
+        once it has self.flush_size writes or once it's older than
+        self.flush_interval seconds
+        """
+        with self.buffer_lock:
+            self.write_buffer.append((query, params))
+            should_flush = (
+                len(self.write_buffer) >= self.flush_size
+                or time.time() - self.last_flush >= self.flush_interval
+            )
+
+        if self.flusher is None:
+            self.flusher = Thread(
+                target=self.flush_buffer_periodically, daemon=True
+            )
+            self.flusher.start()
+
+        if should_flush:
+            self.flush_buffer()
+
+    def flush_buffer_periodically(self):
+        """
+        writes the buffered flows every self.flush_interval seconds
+        even if no new flows are coming
+        """
+        while True:
+            sleep(self.flush_interval)
+            if time.time() - self.last_flush >= self.flush_interval:
+                self.flush_buffer()
+
+    def flush_buffer(self):
+        """
+        writes all the buffered queries to the db in 1 transaction
+        """
+        with self.flush_lock:
+            with self.buffer_lock:
+                if not self.write_buffer:
+                    return
+                buffer, self.write_buffer = self.write_buffer, []
+                self.last_flush = time.time()
+
+            self.executemany(buffer)
+
+    def executemany(self, writes: List[Tuple[str, tuple]]):
+        """
+        wrapper for sqlite executemany() that executes all the given
+        writes in 1 transaction, in the given order. consecutive writes
+        of the same query are executed with 1 executemany() call.
+        when the db is locked by another process, the transaction is
+        retried until it succeeds
+        :param writes: list of (query, params) tuples
+        """
+        delay = 0.1
+        while True:
+            with self.cursor_lock:
+                try:
+                    self.cursor.execute("BEGIN")
+                    for query, group in groupby(writes, key=lambda w: w[0]):
+                        self.cursor.executemany(
+                            query, [params for _, params in group]
+                        )
+                    self.conn.commit()
+                    return
+                except sqlite3.Error as e:
+                    self.conn.rollback()
+                    error = e
+
+            if "database is locked" not in str(error):
+                break
+            # Retry after a short delay
+            sleep(delay)
+            delay = min(delay * 2, 5)
+
+        # retrying won't fix other errors, e.g. a malformed query
+        self.print(
+            f"Error executing {len(writes)} buffered queries - {error}. "
+            f"Queries discarded",
+            0,
+            1,
+        )
+
     def execute(self, query, params=None):
         """
         wrapper for sqlite execute() To avoid 'Recursive use of cursors not allowed' error
@@ -17,10 +17,15 @@
 # Contact: eldraco@gmail.com, sebastian.garcia@agents.fel.cvut.cz, stratosphere@aic.fel.cvut.cz
 
 import json
-from typing import List, Dict, Optional
+from dataclasses import dataclass, field, replace
+from typing import (
+    Dict,
+    Optional,
+    Set,
+    Tuple,
+)
 from datetime import datetime
 from colorama import Fore, Style
-from os import path
 import sys
 import os
 import time
@@ -31,6 +36,7 @@ from slips_files.common.parsers.config_parser import ConfigParser
 from slips_files.common.slips_utils import utils
 from slips_files.core.helpers.whitelist.whitelist import Whitelist
 from slips_files.core.helpers.notify import Notify
+from slips_files.core.helpers.log_writer import BufferedLogWriter
 from slips_files.common.abstracts.core import ICore
 from slips_files.core.evidence_structure.evidence import (
     dict_to_evidence,
@@ -45,6 +51,21 @@ from slips_files.core.evidence_structure.evidence import (
 IS_IN_A_DOCKER_CONTAINER = os.environ.get("IS_IN_A_DOCKER_CONTAINER", False)
 
 
+@dataclass
+class TWEvidence:
+    """
+    the state of the evidence of a profile in a timewindow, updated with
+    every evidence processed by the EvidenceHandler
+    """
+
+    # the evidence that passed the filters and weren't part of an alert
+    # yet, in the order they were received
+    evidence: Dict[str, Evidence] = field(default_factory=dict)
+    accumulated_threat_level: float = 0
+    # the IDs of the evidence that were part of past alerts
+    alerted_ids: Set[str] = field(default_factory=set)
+
+
 # Evidence Process
 class EvidenceHandler(ICore):
     """
@@ -75,20 +96,26 @@ class EvidenceHandler(ICore):
 
         self.c1 = self.db.subscribe("evidence_added")
         self.c2 = self.db.subscribe("new_blame")
+        self.c3 = self.db.subscribe("tw_closed")
         self.channels = {
             "evidence_added": self.c1,
             "new_blame": self.c2,
+            "tw_closed": self.c3,
         }
+        # the evidence of each (profileid, twid), see get_tw_evidence()
+        self.tw_evidence: Dict[Tuple[str, str], TWEvidence] = {}
 
         # clear output/alerts.log
-        self.logfile = self.clean_file(self.output_dir, "alerts.log")
-        utils.change_logfiles_ownership(self.logfile.name, self.UID, self.GID)
+        logfile_path = self.clean_file(self.output_dir, "alerts.log")
+        utils.change_logfiles_ownership(logfile_path, self.UID, self.GID)
+        self.logfile = BufferedLogWriter(logfile_path)
 
         self.is_interface = self.is_running_on_interface()
 
         # clear output/alerts.json
-        self.jsonfile = self.clean_file(self.output_dir, "alerts.json")
-        utils.change_logfiles_ownership(self.jsonfile.name, self.UID, self.GID)
+        jsonfile_path = self.clean_file(self.output_dir, "alerts.json")
+        utils.change_logfiles_ownership(jsonfile_path, self.UID, self.GID)
+        self.jsonfile = BufferedLogWriter(jsonfile_path)
 
         self.print(f"Storing Slips logs in {self.output_dir}")
         # this list will have our local and public ips when using -i
@@ -162,14 +189,13 @@ class EvidenceHandler(ICore):
 
         return wrapped_txt
 
-    def clean_file(self, output_dir, file_to_clean):
+    def clean_file(self, output_dir, file_to_clean) -> str:
         """
-        Clear the file if exists and return an open handle to it
+        Clear the file if exists, or create it, and return its path
         """
         logfile_path = os.path.join(output_dir, file_to_clean)
-        if path.exists(logfile_path):
-            open(logfile_path, "w").close()
-        return open(logfile_path, "a")
+        open(logfile_path, "w").close()
+        return logfile_path
 
     def handle_unable_to_log_evidence(self):
         self.print("Error in add_to_json_log_file()")
@@ -200,8 +226,7 @@ class EvidenceHandler(ICore):
                     "timewindow": int(timewindow.replace("timewindow", "")),
                 }
             )
-            json.dump(idea_dict, self.jsonfile)
-            self.jsonfile.write("\n")
+            self.jsonfile.write(f"{json.dumps(idea_dict)}\n")
         except KeyboardInterrupt:
             return True
         except Exception:
@@ -214,9 +239,7 @@ class EvidenceHandler(ICore):
         """
         try:
             # write to alerts.log
-            self.logfile.write(data)
-            self.logfile.write("\n")
-            self.logfile.flush()
+            self.logfile.write(f"{data}\n")
         except KeyboardInterrupt:
             return True
         except Exception:
@@ -421,17 +444,51 @@ class EvidenceHandler(ICore):
         self.logfile.close()
         self.jsonfile.close()
 
-    def get_evidence_that_were_part_of_a_past_alert(
-        self, profileid: str, twid: str
-    ) -> List[str]:
-        past_alerts: dict = self.db.get_profileid_twid_alerts(profileid, twid)
-        try:
-            past_evidence_ids = list(past_alerts.values())[0]
-            past_evidence_ids: List[str] = json.loads(past_evidence_ids)
-        except IndexError:
-            # no past evidence
-            past_evidence_ids = []
-        return past_evidence_ids
+    def get_tw_evidence(self, profileid: str, twid: str) -> TWEvidence:
+        """
+        returns the evidence of the given profile and tw.
+        it's kept in memory and only read from the db if it's not there,
+        e.g. when slips is restarted or an evidence of a closed tw arrives
+        """
+        if tw_evidence := self.tw_evidence.get((profileid, twid)):
+            return tw_evidence
+
+        tw_evidence = TWEvidence(
+            accumulated_threat_level=float(
+                self.db.get_accumulated_threat_level(profileid, twid)
+            )
+        )
+        past_alerts: Dict[str, str] = self.db.get_profileid_twid_alerts(
+            profileid, twid
+        )
+        for evidence_ids in past_alerts.values():
+            tw_evidence.alerted_ids.update(json.loads(evidence_ids))
+
+        db_evidence: Dict[str, str] = (
+            self.db.get_twid_evidence(profileid, twid) or {}
+        )
+        for evidence in db_evidence.values():
+            evidence: Evidence = dict_to_evidence(json.loads(evidence))
+            if self.is_filtered_evidence(evidence, tw_evidence.alerted_ids):
+                continue
+            if self.db.is_whitelisted_evidence(evidence.id):
+                continue
+            # sometimes the db has evidence that didn't come yet to
+            # evidence.py and they are alerted without checking the
+            # whitelist! they're added here once they're processed
+            if not self.db.is_evidence_processed(evidence.id):
+                continue
+            tw_evidence.evidence[evidence.id] = evidence
+
+        self.tw_evidence[(profileid, twid)] = tw_evidence
+        return tw_evidence
+
+    def handle_tw_closed(self, profileid_tw: str):
+        """
+        drops the evidence of the closed tw from memory
+        """
+        profileid, twid = profileid_tw.rsplit(self.separator, 1)
+        self.tw_evidence.pop((profileid, twid), None)
 
     def is_evidence_done_by_others(self, evidence: Evidence) -> bool:
         # given all the tw evidence, we should only
@@ -444,58 +501,22 @@ class EvidenceHandler(ICore):
         self, profileid: str, twid: str
     ) -> Optional[Dict[str, Evidence]]:
         """
-        filters and returns all the evidence for this profile in this TW
-        returns the dict with filtered evidence
+        returns all the filtered evidence for this profile in this TW
+        that weren't part of an alert yet
         """
-        tw_evidence: Dict[str, dict] = self.db.get_twid_evidence(
+        tw_evidence: Dict[str, Evidence] = self.get_tw_evidence(
             profileid, twid
-        )
+        ).evidence
         if not tw_evidence:
             return
 
-        past_evidence_ids: List[str] = (
-            self.get_evidence_that_were_part_of_a_past_alert(profileid, twid)
-        )
-
-        # to store all the ids causing this alert in the database
-        self.IDs_causing_an_alert = []
-        filtered_evidence = {}
-
-        for id, evidence in tw_evidence.items():
-            id: str
-            evidence: str
-            evidence: dict = json.loads(evidence)
-            evidence: Evidence = dict_to_evidence(evidence)
-
-            if self.is_filtered_evidence(evidence, past_evidence_ids):
-                continue
-
-            if self.db.is_whitelisted_evidence(id):
-                continue
-
-            # delete not processed evidence
-            # sometimes the db has evidence that didn't come yet to evidence.py
-            # and they are alerted without checking the whitelist!
-            # to fix this, we keep track of processed evidence
-            # that came to new_evidence channel and were processed by it.
-            # so they are ready to be a part of an alert
-            if not self.db.is_evidence_processed(id):
-                continue
-
-            evidence_id: str = evidence.id
-            # we keep track of these IDs to be able to label the flows
-            # of these evidence later if this was detected as an alert
-            # now this should be done in its' own function but this is more
-            # optimal so we don't loop through all evidence again. i'll
-            # just leave it like that:D
-            self.IDs_causing_an_alert.append(evidence_id)
-
-            filtered_evidence[evidence_id] = evidence
-
-        return filtered_evidence
+        # we keep track of these IDs to be able to label the flows
+        # of these evidence later if this was detected as an alert
+        self.IDs_causing_an_alert = list(tw_evidence)
+        return dict(tw_evidence)
 
     def is_filtered_evidence(
-        self, evidence: Evidence, past_evidence_ids: List[str]
+        self, evidence: Evidence, past_evidence_ids: Set[str]
     ):
         """
         filters the following
@@ -599,6 +620,11 @@ class EvidenceHandler(ICore):
         self.send_to_exporting_module(tw_evidence)
         # reset the accumulated threat level now that an alert is generated
         self.db.set_accumulated_threat_level(profileid, twid, 0)
+        # the next alert in this tw should only have new evidence
+        current_tw_evidence: TWEvidence = self.get_tw_evidence(profileid, twid)
+        current_tw_evidence.alerted_ids.update(self.IDs_causing_an_alert)
+        current_tw_evidence.evidence.clear()
+        current_tw_evidence.accumulated_threat_level = 0
 
     def get_evidence_to_log(self, evidence: Evidence, flow_datetime) -> str:
         """
@@ -659,13 +685,13 @@ class EvidenceHandler(ICore):
         twid: str = str(evidence.timewindow)
         evidence_threat_level: float = self.get_threat_level(evidence)
 
+        tw_evidence: TWEvidence = self.get_tw_evidence(profileid, twid)
+        tw_evidence.accumulated_threat_level += evidence_threat_level
+        # stored in the db to be able to continue after restarting slips
         self.db.update_accumulated_threat_level(
             profileid, twid, evidence_threat_level
         )
-        accumulated_threat_level: float = self.db.get_accumulated_threat_level(
-            profileid, twid
-        )
-        return accumulated_threat_level
+        return tw_evidence.accumulated_threat_level
 
     def show_popup(self, alert: str):
         # remove the colors from the alerts before printing
@@ -717,6 +743,7 @@ class EvidenceHandler(ICore):
                     )
                 flow_datetime = utils.convert_format(timestamp, "iso")
 
+                original_description: str = evidence.description
                 evidence: Evidence = (
                     self.add_threat_level_to_evidence_description(evidence)
                 )
@@ -732,18 +759,21 @@ class EvidenceHandler(ICore):
                     evidence.profile.ip, evidence.victim, evidence_type
                 )
 
-                past_evidence_ids: List[str] = (
-                    self.get_evidence_that_were_part_of_a_past_alert(
-                        profileid, twid
+                tw_evidence: TWEvidence = self.get_tw_evidence(profileid, twid)
+                if not self.is_filtered_evidence(
+                    evidence, tw_evidence.alerted_ids
+                ):
+                    # the stored copy doesn't have the threat level in
+                    # its description, it's added when printing the alert
+                    tw_evidence.evidence[evidence.id] = replace(
+                        evidence, description=original_description
                     )
-                )
-                if not self.is_filtered_evidence(evidence, past_evidence_ids):
                     accumulated_threat_level: float = (
                         self.update_accumulated_threat_level(evidence)
                     )
                 else:
                     accumulated_threat_level: float = (
-                        self.db.get_accumulated_threat_level(profileid, twid)
+                        tw_evidence.accumulated_threat_level
                     )
                 # prepare evidence for json log file
                 idea_dict: dict = idea_format(evidence)
@@ -823,6 +853,9 @@ class EvidenceHandler(ICore):
                             blocked=blocked,
                         )
 
+            if msg := self.get_msg("tw_closed"):
+                self.handle_tw_closed(msg["data"])
+
             if msg := self.get_msg("new_blame"):
                 data = msg["data"]
                 try:
@@ -0,0 +1,165 @@
+import multiprocessing
+import queue
+import zlib
+from typing import (
+    List,
+    Optional,
+)
+
+from slips_files.common.abstracts.core import ICore
+from slips_files.core.profiler import (
+    Profiler,
+    SUPPORTED_INPUT_TYPES,
+)
+
+
+class FlowParser(ICore):
+    """
+    Parses the lines read by the input process into flows and sends
+    them to the profilers.
+
+    When parser workers are enabled in slips.yaml, the input process
+    sends the lines to these workers instead of to the profilers, so
+    the parsing is done by a pool of processes and the profilers only
+    add the parsed flows to the profiles and tws.
+    """
+
+    name = "FlowParser"
+
+    def init(
+        self,
+        parser_queue: multiprocessing.Queue = None,
+        profiler_queues: List[multiprocessing.Queue] = None,
+        is_parser_done_event: multiprocessing.Event = None,
+        is_profiler_done_events: List[multiprocessing.Event] = None,
+        worker_id: int = 0,
+    ):
+        # the input process sends the lines to parse in this queue
+        self.parser_queue = parser_queue
+        # one queue per profiler worker
+        self.profiler_queues: List[multiprocessing.Queue] = profiler_queues
+        # is set by this proc to tell input proc that we are done
+        # processing and it can exit no issue
+        self.is_parser_done_event = is_parser_done_event
+        self.is_profiler_done_events: List[multiprocessing.Event] = (
+            is_profiler_done_events
+        )
+        self.worker_id = worker_id
+        if worker_id:
+            self.name = f"FlowParser_{worker_id}"
+        self.input_type = False
+        self.parsed_lines = 0
+        # the total flows are sent by the input process with the first
+        # line, they're sent to the profilers with the next parsed flow
+        self.total_flows = 0
+
+    def get_profiler_worker(self, flow) -> int:
+        """
+        returns the id of the profiler worker that should
+        process the given flow.
+        the worker is chosen using a consistent hash of the saddr of the
+        flow, so all the flows of the same profile are profiled in order
+        by the same worker
+        """
+        if len(self.profiler_queues) == 1:
+            return 0
+
+        if not flow:
+            return self.worker_id % len(self.profiler_queues)
+
+        saddr = str(getattr(flow, "saddr", ""))
+        return zlib.crc32(saddr.encode()) % len(self.profiler_queues)
+
+    def parse_msg(self, msg: dict) -> Optional[dict]:
+        """
+        parses the line in the given msg received from the input process
+        returns the msg to send to the profilers, or None if there's
+        nothing to send
+        """
+        line = msg["line"]
+        self.total_flows = msg.get("total_flows", self.total_flows)
+
+        # the type of the input is only defined once
+        if not self.input_type:
+            self.input_type = Profiler.define_separator(
+                line, msg["input_type"]
+            )
+            if not self.input_type:
+                self.print("Can't determine input type.")
+                return
+
+        # only create the input obj once,
+        # the rest of the flows will use the same input handler
+        if not hasattr(self, "input"):
+            self.input = SUPPORTED_INPUT_TYPES[self.input_type]()
+
+        flow = self.input.process_line(line)
+        self.parsed_lines += 1
+        if msg.get("broadcast"):
+            # the lines sent to all workers, like headers, aren't flows
+            return
+
+        # lines that aren't flows are sent too, the profilers use them
+        # to update the pbar
+        to_send = {"flow": flow, "input_type": self.input_type}
+        if self.total_flows:
+            to_send["total_flows"] = self.total_flows
+            self.total_flows = 0
+        return to_send
+
+    def parse_frame(self, frame: List[dict]):
+        """
+        parses the lines of the given frame and sends them to the
+        profilers, one frame per profiler
+        """
+        frames: List[List[dict]] = [[] for _ in self.profiler_queues]
+        for msg in frame:
+            if to_send := self.parse_msg(msg):
+                worker_id = self.get_profiler_worker(to_send["flow"])
+                frames[worker_id].append(to_send)
+
+        for worker_id, parsed_frame in enumerate(frames):
+            if parsed_frame:
+                self.profiler_queues[worker_id].put(parsed_frame)
+
+    def stop_profilers(self):
+        """
+        is called when the input process is done. tells the profilers
+        that no more flows are coming from this worker and waits for them
+        to finish
+        """
+        self.print(f"Stopping. Parsed {self.parsed_lines} lines.", 2, 0)
+        for profiler_queue in self.profiler_queues:
+            profiler_queue.put("stop")
+        # each profiler is done once it receives the stop msg of all
+        # parser workers
+        for is_profiler_done_event in self.is_profiler_done_events:
+            is_profiler_done_event.wait()
+        self.is_parser_done_event.set()
+
+    def shutdown_gracefully(self):
+        # the profilers are either done or stopping, this proc shouldn't
+        # wait for the flows in the profiler queues to be read on exit
+        for profiler_queue in self.profiler_queues:
+            profiler_queue.cancel_join_thread()
+        # don't keep the input process waiting for this worker
+        self.is_parser_done_event.set()
+
+    def main(self):
+        while not self.should_stop():
+            try:
+                # the input process sends the lines in frames (lists of
+                # msgs). the msg can be a str only when it's a 'stop' msg
+                frame = self.parser_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            except Exception:
+                # ValueError is raised when the queue is closed
+                continue
+
+            if frame == "stop":
+                self.stop_profilers()
+                return 1
+
+            self.parse_frame(frame)
+        return 1
@@ -18,7 +18,9 @@
 
 import os
 import json
+import threading
 import time
+from typing import Optional
 from watchdog.events import RegexMatchingEventHandler
 from slips_files.common.imports import *
 
@@ -26,18 +28,28 @@ from slips_files.common.imports import *
 class FileEventHandler(RegexMatchingEventHandler):
     REGEX = [r".*\.log$", r".*\.conf$"]
 
-    def __init__(self, dir_to_monitor, input_type, db):
+    def __init__(
+        self,
+        dir_to_monitor,
+        input_type,
+        db,
+        zeek_files_changed: Optional[threading.Event] = None,
+    ):
         super().__init__(self.REGEX)
         self.dir_to_monitor = dir_to_monitor
         utils.drop_root_privs()
         self.db = db
         self.input_type = input_type
+        # is set to tell the input process to get the new zeek files
+        self.zeek_files_changed = zeek_files_changed
 
     def on_created(self, event):
         """this will be triggered everytime zeek creates a log file"""
         filename, ext = os.path.splitext(event.src_path)
         if "log" in ext:
             self.db.add_zeek_file(filename + ext)
+            if self.zeek_files_changed:
+                self.zeek_files_changed.set()
 
     def on_moved(self, event):
         """
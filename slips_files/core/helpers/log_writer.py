@@ -0,0 +1,147 @@
+import os
+import sys
+import threading
+import time
+import weakref
+from multiprocessing import util
+from typing import List, Optional, TextIO
+
+
+class BufferedLogWriter:
+    """
+    Appends lines to a log file in batches from a background thread,
+    instead of opening and writing the file once per line.
+
+    - the lines are written every flush_interval seconds, or right
+    away once max_buffered_lines are buffered.
+    - the file is fsynced at most every fsync_interval seconds.
+    - unbuffered writers write every line right away, e.g. errors.log,
+    so errors aren't lost if slips crashes or is killed.
+    - everything buffered is written when close() or flush_all() is
+    called and when the process exits cleanly.
+    - lines written after close() are ignored, the file isn't reopened.
+
+    every slips process has its own copy of the writers created before it
+    was started, so the buffer, the file and the thread are recreated the
+    first time a process writes
+    """
+
+    flush_interval = 1
+    fsync_interval = 5
+    max_buffered_lines = 1000
+
+    init_lock = threading.Lock()
+    # all the writers of this process, for flush_all()
+    writers = weakref.WeakSet()
+
+    def __init__(self, path: str, unbuffered=False):
+        self.path = path
+        self.unbuffered = unbuffered
+        self.pid: Optional[int] = None
+        self.writers.add(self)
+
+    @classmethod
+    def flush_all(cls):
+        """
+        writes and fsyncs the buffered lines of all writers, used when
+        slips is stopping, since the exit finalizers only run on a
+        clean exit
+        """
+        for writer in list(cls.writers):
+            writer.flush(fsync=True)
+
+    def init_for_this_process(self):
+        self.pid = os.getpid()
+        self.buffer: List[str] = []
+        self.lock = threading.Lock()
+        # only the thread that flushes the buffer uses the file
+        self.file_lock = threading.Lock()
+        self.file: Optional[TextIO] = None
+        self.last_fsync = time.monotonic()
+        self.closed = threading.Event()
+        # number of lines ignored because they were written after close()
+        self.ignored_lines = 0
+        self.flusher = threading.Thread(
+            target=self.keep_flushing,
+            name=f"log_writer_{os.path.basename(self.path)}",
+            daemon=True,
+        )
+        self.flusher.start()
+        # multiprocessing runs these when the process exits
+        util.Finalize(self, self.close, exitpriority=0)
+
+    def write(self, line: str):
+        """
+        buffers the given line, it should end with a \\n
+        """
+        if self.pid != os.getpid():
+            with self.init_lock:
+                if self.pid != os.getpid():
+                    self.init_for_this_process()
+
+        if self.closed.is_set():
+            self.ignore_line_after_close()
+            return
+
+        with self.lock:
+            self.buffer.append(line)
+            should_flush = (
+                self.unbuffered or len(self.buffer) >= self.max_buffered_lines
+            )
+
+        if should_flush:
+            self.flush()
+
+    def ignore_line_after_close(self):
+        self.ignored_lines += 1
+        # only tell the user once
+        if self.ignored_lines == 1:
+            print(
+                f"Ignoring the lines written to {self.path} after it "
+                f"was closed.",
+                file=sys.stderr,
+            )
+
+    def keep_flushing(self):
+        while not self.closed.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self, fsync=False):
+        """
+        writes the buffered lines to the file
+        """
+        if self.pid != os.getpid():
+            # nothing was written by this process
+            return
+
+        with self.lock:
+            lines, self.buffer = self.buffer, []
+
+        with self.file_lock:
+            if lines:
+                if not self.file:
+                    self.file = open(self.path, "a")
+                self.file.writelines(lines)
+                self.file.flush()
+
+            if not self.file:
+                return
+
+            now = time.monotonic()
+            if fsync or now - self.last_fsync >= self.fsync_interval:
+                os.fsync(self.file.fileno())
+                self.last_fsync = now
+
+    def close(self):
+        """
+        writes everything buffered and closes the file
+        """
+        if self.pid != os.getpid():
+            return
+
+        self.closed.set()
+        self.flush(fsync=True)
+        with self.file_lock:
+            if self.file:
+                self.file.close()
+                self.file = None
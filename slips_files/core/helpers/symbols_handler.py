@@ -29,7 +29,13 @@ class SymbolHandler(IObservable):
             2 - unsupported and unhandled types (cases that may cause errors)
             3 - red warnings that needs examination - developer warnings
         :param text: text to print. Can include format like f'Test {here}'
+            or a function that returns the text, it's only called if the
+            text is going to be printed
         """
+        if self.is_discarded(verbose, debug):
+            return
+        if callable(text):
+            text = text()
 
         self.notify_observers(
             {
@@ -69,7 +75,7 @@ class SymbolHandler(IObservable):
             current_size = int(current_size)
             now_ts = float(flow.starttime)
             self.print(
-                "Starting compute symbol. Profileid: {}, "
+                lambda: "Starting compute symbol. Profileid: {}, "
                 "Tupleid {}, time:{} ({}), dur:{}, size:{}".format(
                     profileid,
                     tupleid,
@@ -152,8 +158,10 @@ class SymbolHandler(IObservable):
                         # Strongly not periodicity
                         TD = 4
                 self.print(
-                    "Compute Periodicity: Profileid: {}, Tuple: {}, T1={}, "
-                    "T2={}, TD={}".format(profileid, tupleid, T1, T2, TD),
+                    lambda: "Compute Periodicity: Profileid: {}, Tuple: {}, "
+                    "T1={}, T2={}, TD={}".format(
+                        profileid, tupleid, T1, T2, TD
+                    ),
                     3,
                     0,
                 )
@@ -270,7 +278,7 @@ class SymbolHandler(IObservable):
             timechar = compute_timechar()
             # self.print("TimeChar: {}".format(timechar), 0, 1)
             self.print(
-                "Profileid: {}, Tuple: {}, Periodicity: {}, "
+                lambda: "Profileid: {}, Tuple: {}, Periodicity: {}, "
                 "Duration: {}, Size: {}, Letter: {}. TimeChar: {}".format(
                     profileid,
                     tupleid,
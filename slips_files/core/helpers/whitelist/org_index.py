@@ -0,0 +1,101 @@
+import ipaddress
+from typing import (
+    Dict,
+    Iterable,
+    Set,
+)
+
+import tldextract
+
+from slips_files.common.ip_ranges import IPRangesIndex
+
+
+class OrgIndex:
+    """
+    The IPs, domains and ASNs of the orgs in slips_files/organizations_info,
+    indexed together so the orgs of an IP, a domain or an ASN are found
+    with one lookup instead of checking every org
+    """
+
+    def __init__(self):
+        # the orgs added to this index
+        self.orgs: Set[str] = set()
+        # {subnet: orgs}
+        self.subnets: Dict[str, Set[str]] = {}
+        self.subnets_index = IPRangesIndex()
+        # {org domain: orgs}
+        self.domains: Dict[str, Set[str]] = {}
+        # {parent domain of an org domain: orgs}, down to the registered
+        # domain. e.g. org.com for xyz.org.com
+        self.parent_domains: Dict[str, Set[str]] = {}
+        # {asn: orgs}
+        self.asns: Dict[str, Set[str]] = {}
+
+    @staticmethod
+    def get_parent_domains(domain: str) -> Iterable[str]:
+        labels = domain.split(".")
+        suffix = tldextract.extract(domain).suffix
+        suffix_labels = len(suffix.split(".")) if suffix else 0
+        for i in range(1, len(labels) - suffix_labels):
+            yield ".".join(labels[i:])
+
+    def add_org(
+        self,
+        org: str,
+        subnets: Iterable[str],
+        domains: Iterable[str],
+        asns: Iterable[str],
+    ) -> bool:
+        """
+        indexes the given info of the org
+        returns False if there's no info to index
+        """
+        subnets, domains, asns = list(subnets), list(domains), list(asns)
+        if not (subnets or domains or asns):
+            return False
+
+        self.orgs.add(org)
+        for subnet in subnets:
+            try:
+                # the same format is used in the index and in the keys
+                subnet = str(ipaddress.ip_network(subnet, strict=False))
+            except ValueError:
+                continue
+            self.subnets.setdefault(subnet, set()).add(org)
+        if subnets:
+            self.subnets_index = IPRangesIndex(self.subnets)
+
+        for domain in domains:
+            domain = domain.lower()
+            self.domains.setdefault(domain, set()).add(org)
+            for parent_domain in self.get_parent_domains(domain):
+                self.parent_domains.setdefault(parent_domain, set()).add(org)
+
+        for asn in asns:
+            self.asns.setdefault(asn, set()).add(org)
+        return True
+
+    def get_ip_orgs(self, ip: str) -> Set[str]:
+        orgs = set()
+        for subnet in self.subnets_index.lookup_all(ip):
+            orgs.update(self.subnets[subnet])
+        return orgs
+
+    def get_domain_orgs(self, domain: str) -> Set[str]:
+        """
+        returns the orgs that have the given domain, a parent of it,
+        or a subdomain of it
+        """
+        domain = domain.lower()
+        # if an org has xyz.org.com, and the domain is org.com
+        orgs = set(self.parent_domains.get(domain, ()))
+
+        # match subdomains too
+        # if an org has org.com, and the domain is xyz.org.com
+        labels = domain.split(".")
+        for i in range(len(labels)):
+            orgs.update(self.domains.get(".".join(labels[i:]), ()))
+        return orgs
+
+    def get_asn_orgs(self, asn: str) -> Set[str]:
+        return self.asns.get(asn, set())
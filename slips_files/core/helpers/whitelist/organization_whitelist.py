@@ -1,15 +1,14 @@
-import ipaddress
 import json
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 from slips_files.common.abstracts.whitelist_analyzer import IWhitelistAnalyzer
-from slips_files.common.slips_utils import utils
 from slips_files.core.evidence_structure.evidence import (
     IoCType,
     Direction,
 )
 from slips_files.core.helpers.whitelist.domain_whitelist import DomainAnalyzer
 from slips_files.core.helpers.whitelist.ip_whitelist import IPAnalyzer
+from slips_files.core.helpers.whitelist.org_index import OrgIndex
 
 
 class OrgAnalyzer(IWhitelistAnalyzer):
@@ -29,66 +28,68 @@ class OrgAnalyzer(IWhitelistAnalyzer):
         self.ip_analyzer = IPAnalyzer(self.db)
         self.domain_analyzer = DomainAnalyzer(self.db)
         self.org_info_path = "slips_files/organizations_info/"
+        # the info of all orgs, see get_org_index()
+        self.org_index = OrgIndex()
 
-    def is_domain_in_org(self, domain: str, org: str):
+    def reset_org_index(self):
+        """
+        drops the indexed org info so it's read again from the db
+        the next time it's needed
+        """
+        self.org_index = OrgIndex()
+
+    def read_org_info(self, org: str, info_type: str) -> List[str]:
+        try:
+            return json.loads(self.db.get_org_info(org, info_type))
+        except (TypeError, ValueError):
+            return []
+
+    def get_org_index(self, *orgs: str) -> OrgIndex:
+        """
+        returns the index of the IPs, domains and ASNs of all orgs,
+        the info of the given orgs is read from the db and indexed if
+        it isn't already
+        """
+        for org in orgs:
+            if org in self.org_index.orgs:
+                continue
+
+            subnets = []
+            try:
+                # org subnets are stored in the db sorted by first octet
+                for ranges in self.db.get_org_IPs(org).values():
+                    subnets.extend(ranges)
+            except (AttributeError, TypeError):
+                pass
+
+            # the org info may not be loaded by the update manager yet,
+            # in that case the org isn't indexed and is read again the
+            # next time
+            self.org_index.add_org(
+                org,
+                subnets,
+                self.read_org_info(org, "domains"),
+                self.read_org_info(org, "asn"),
+            )
+        return self.org_index
+
+    def is_domain_in_org(self, domain: str, org: str) -> bool:
         """
         Checks if the given domains belongs to the given org using
         the hardcoded org domains in organizations_info/org_domains
         """
-        try:
-            org_domains = json.loads(self.db.get_org_info(org, "domains"))
-            flow_tld = self.domain_analyzer.get_tld(domain)
-
-            for org_domain in org_domains:
-                org_domain_tld = self.domain_analyzer.get_tld(org_domain)
-
-                if flow_tld != org_domain_tld:
-                    continue
-
-                # match subdomains too
-                # if org has org.com, and the flow_domain is xyz.org.com
-                # whitelist it
-                if org_domain in domain:
-                    return True
-
-                # if org has xyz.org.com, and the flow_domain is org.com
-                # whitelist it
-                if domain in org_domain:
-                    return True
-
-        except (KeyError, TypeError):
-            # comes here if the whitelisted org doesn't have domains in
-            # slips/organizations_info (not a famous org)
-            # and ip doesn't have asn info.
-            # so we don't know how to link this ip to the whitelisted org!
-            return False
+        return org in self.get_org_index(org).get_domain_orgs(domain)
 
-    def is_ip_in_org(self, ip: str, org):
+    def is_ip_in_org(self, ip: str, org) -> bool:
         """
         Check if the given ip belongs to the given org
         """
-        try:
-            org_subnets: dict = self.db.get_org_IPs(org)
-
-            first_octet: str = utils.get_first_octet(ip)
-            if not first_octet:
-                return
-            ip_obj = ipaddress.ip_address(ip)
-            # organization IPs are sorted by first octet for faster search
-            for range_ in org_subnets.get(first_octet, []):
-                if ip_obj in ipaddress.ip_network(range_):
-                    return True
-        except (KeyError, TypeError):
-            # comes here if the whitelisted org doesn't have
-            # info in slips/organizations_info (not a famous org)
-            # and ip doesn't have asn info.
-            pass
-        return False
+        return org in self.get_org_index(org).get_ip_orgs(ip)
 
-    def is_ip_asn_in_org_asn(self, ip: str, org):
+    def get_ip_asn(self, ip: str) -> Optional[str]:
         """
-        returns true if the ASN of the given IP is listed in
-         the ASNs of the given org
+        returns the uppercase ASN of the given IP, False if it's unknown
+        and None if there's no ASN info of the IP
         """
         ip_data = self.db.get_ip_info(ip)
         if not ip_data:
@@ -103,10 +104,25 @@ class OrgAnalyzer(IWhitelistAnalyzer):
             return False
 
         # because all ASN stored in slips organization_info/ are uppercase
-        ip_asn: str = ip_asn.upper()
+        return ip_asn.upper()
 
-        org_asn: List[str] = json.loads(self.db.get_org_info(org, "asn"))
-        return org.upper() in ip_asn or ip_asn in org_asn
+    def is_asn_in_org(self, ip_asn: str, org: str) -> bool:
+        """
+        :param ip_asn: uppercase ASN as returned by get_ip_asn()
+        """
+        if org.upper() in ip_asn:
+            return True
+        return org in self.get_org_index(org).get_asn_orgs(ip_asn)
+
+    def is_ip_asn_in_org_asn(self, ip: str, org):
+        """
+        returns true if the ASN of the given IP is listed in
+         the ASNs of the given org
+        """
+        ip_asn = self.get_ip_asn(ip)
+        if not ip_asn:
+            return ip_asn
+        return self.is_asn_in_org(ip_asn, org)
 
     def is_whitelisted(self, flow) -> bool:
         """checks if the given flow is whitelisted"""
@@ -174,6 +190,7 @@ class OrgAnalyzer(IWhitelistAnalyzer):
         if not whitelisted_orgs:
             return False
 
+        orgs = []
         for org in whitelisted_orgs:
             dir_from_whitelist = whitelisted_orgs[org]["from"]
             if not self.match.direction(direction, dir_from_whitelist):
@@ -184,12 +201,23 @@ class OrgAnalyzer(IWhitelistAnalyzer):
                 what_to_ignore, whitelist_what_to_ignore
             ):
                 continue
+            orgs.append(org)
 
-            cases = {
-                IoCType.DOMAIN.name: self.is_domain_in_org,
-                IoCType.IP.name: self.is_ip_part_of_a_whitelisted_org,
-            }
-            if cases[ioc_type](ioc, org):
-                return True
+        if not orgs:
+            return False
 
+        # the orgs of the ioc are found once, then checked against the
+        # whitelisted ones
+        org_index: OrgIndex = self.get_org_index(*orgs)
+        if ioc_type == IoCType.DOMAIN.name:
+            ioc_orgs = org_index.get_domain_orgs(ioc)
+            return any(org in ioc_orgs for org in orgs)
+
+        ioc_orgs = org_index.get_ip_orgs(ioc)
+        ip_asn = self.get_ip_asn(ioc)
+        for org in orgs:
+            if org in ioc_orgs:
+                return True
+            if ip_asn and self.is_asn_in_org(ip_asn, org):
+                return True
         return False
@@ -42,6 +42,8 @@ class Whitelist(IObservable):
         self.db.set_whitelist("domains", self.parser.whitelisted_domains)
         self.db.set_whitelist("organizations", self.parser.whitelisted_orgs)
         self.db.set_whitelist("macs", self.parser.whitelisted_mac)
+        # compile the org info again in case the whitelisted orgs changed
+        self.org_analyzer.reset_org_index()
 
     def print(self, text, verbose=1, debug=0):
         """
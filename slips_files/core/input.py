@@ -12,6 +12,7 @@
 # GNU General Public License for more details.
 
 import datetime
+import heapq
 import json
 import os
 import signal
@@ -24,8 +25,15 @@ import time
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 # Contact: eldraco@gmail.com, sebastian.garcia@agents.fel.cvut.cz, stratosphere@aic.fel.cvut.cz
+import zlib
 from pathlib import Path
-from re import split
+from re import split, search
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
 
 from watchdog.observers import Observer
 
@@ -36,6 +44,7 @@ from slips_files.common.parsers.config_parser import ConfigParser
 from slips_files.common.slips_utils import utils
 import multiprocessing
 from slips_files.core.helpers.filemonitor import FileEventHandler
+from slips_files.core.input_profilers.zeek_tsv import split_line
 
 SUPPORTED_LOGFILES = (
     "conn",
@@ -53,6 +62,11 @@ SUPPORTED_LOGFILES = (
     "software",
     "weird",
 )
+# the size of the read buffer of each zeek log file
+ZEEK_FILE_BUFFER_SIZE = 2**20
+# how often the zeek files that reached their end are read again, in
+# seconds, zeek keeps appending lines to them
+ZEEK_EOF_POLL_INTERVAL = 0.1
 
 
 # Input Process
@@ -64,17 +78,18 @@ class Input(ICore):
     def init(
         self,
         is_input_done: multiprocessing.Semaphore = None,
-        profiler_queue=None,
+        profiler_queues: List[multiprocessing.Queue] = None,
         input_type=None,
         input_information=None,
         cli_packet_filter=None,
         zeek_or_bro=None,
         zeek_dir=None,
         line_type=None,
-        is_profiler_done_event: multiprocessing.Event = None,
+        is_profiler_done_events: List[multiprocessing.Event] = None,
     ):
         self.input_type = input_type
-        self.profiler_queue = profiler_queue
+        # one queue per profiler worker
+        self.profiler_queues: List[multiprocessing.Queue] = profiler_queues
         # in case of reading from stdin, the user must tell slips what
         # type of lines is the input using -f <type>
         self.line_type: str = line_type
@@ -102,6 +117,9 @@ class Input(ICore):
             target=self.remove_old_zeek_files, daemon=True
         )
         self.open_file_handlers = {}
+        # set by the filemonitor when zeek creates or rotates a log file,
+        # the zeek files to read are only refreshed from the db then
+        self.zeek_files_changed = threading.Event()
         self.c1 = self.db.subscribe("remove_old_files")
         self.channels = {"remove_old_files": self.c1}
         self.timeout = None
@@ -111,9 +129,33 @@ class Input(ICore):
         # used to give the profiler the total amount of flows to
         # read with the first flow only
         self.is_first_flow = True
-        # is set by the profiler to tell this proc that we it is done processing
-        # the input process and shut down and close the profiler queue no issue
-        self.is_profiler_done_event = is_profiler_done_event
+        # the start of the first tw is set by this proc using the ts of
+        # the first line, before any line is sent to the profilers, so
+        # all the profiler workers use the same tws
+        self.is_file_start_set = False
+        # are set by the profilers to tell this proc that they are done
+        # processing the input process and shut down and close the profiler
+        # queues no issue
+        self.is_profiler_done_events: List[multiprocessing.Event] = (
+            is_profiler_done_events
+        )
+        # index of the saddr in the argus lines, is set once we read the
+        # header of the given binetflow file
+        self.argus_saddr_idx = None
+        # index of the starttime in the argus lines, same as the saddr
+        self.argus_starttime_idx = None
+        # {zeek tab separated file: the index of the ts in its lines}
+        self.zeek_ts_idx: Dict[str, int] = {}
+        # lines are sent to the profilers in frames instead of 1 by 1.
+        # each profiler queue has its own frame that is sent when it
+        # reaches self.batch_size lines, or when its oldest line is
+        # older than self.batch_max_delay seconds
+        self.frames: List[list] = [[] for _ in self.profiler_queues]
+        self.frames_start_time: List[float] = [0] * len(self.profiler_queues)
+        self.frames_lock = threading.Lock()
+        self.frames_flusher = threading.Thread(
+            target=self.flush_old_frames_periodically, daemon=True
+        )
 
     def is_done_processing(self):
         """
@@ -127,9 +169,12 @@ class Input(ICore):
             "Telling Profiler to stop because " "no more input is arriving.",
             log_to_logfiles_only=True,
         )
-        self.profiler_queue.put("stop")
+        self.flush_frames()
+        for profiler_queue in self.profiler_queues:
+            profiler_queue.put("stop")
         self.print("Waiting for Profiler to stop.", log_to_logfiles_only=True)
-        self.is_profiler_done_event.wait()
+        for is_profiler_done_event in self.is_profiler_done_events:
+            is_profiler_done_event.wait()
         self.print("Input is done processing.", log_to_logfiles_only=True)
         self.done_processing.release()
 
@@ -142,14 +187,17 @@ class Input(ICore):
         self.enable_rotation = conf.rotation()
         self.rotation_period = conf.rotation_period()
         self.keep_rotated_files_for = conf.keep_rotated_files_for()
+        self.batch_size: int = conf.profiler_queue_batch_size()
+        self.batch_max_delay: float = conf.profiler_queue_batch_max_delay()
 
     def stop_queues(self):
-        """Stops the profiler queue"""
+        """Stops the profiler queues"""
         # By default if a process is not the creator of the queue then on
         # exit it will attempt to join the queue’s background thread. The
         # process can call cancel_join_thread() to make join_thread()
         # do nothing.
-        self.profiler_queue.cancel_join_thread()
+        for profiler_queue in self.profiler_queues:
+            profiler_queue.cancel_join_thread()
 
     def read_nfdump_output(self) -> int:
         """
@@ -212,7 +260,9 @@ class Input(ICore):
         except KeyError:
             # First time opening this file.
             try:
-                file_handler = open(filename, "r")
+                file_handler = open(
+                    filename, "r", buffering=ZEEK_FILE_BUFFER_SIZE
+                )
                 lock = threading.Lock()
                 lock.acquire()
                 self.open_file_handlers[filename] = file_handler
@@ -229,26 +279,39 @@ class Input(ICore):
                 return False
         return file_handler
 
-    def get_ts_from_line(self, zeek_line: str):
+    def get_ts_from_line(self, zeek_line: str, ts_idx: int = 0):
         """
         used only by zeek log files
-        :param line: can be a json or a json serialized dict
+        :param zeek_line: a tab separated or a json line
+        :param ts_idx: the index of the ts in zeek tab separated lines
+        returns the ts and the line to send to the profilers. json lines
+        aren't decoded here, only their ts is sliced, they're decoded
+        by the profilers or the flow parser workers
         """
         if self.is_zeek_tabs:
             # It is not JSON format. It is tab format line.
             nline = zeek_line
-            nline_list = (
-                nline.split("\t") if "\t" in nline else split(r"\s{2,}", nline)
-            )
-            timestamp = nline_list[0]
-        else:
+            # only split the line up to the ts
             try:
-                nline = json.loads(zeek_line)
-            except json.decoder.JSONDecodeError:
+                timestamp = (
+                    nline.split("\t", ts_idx + 1)[ts_idx]
+                    if "\t" in nline
+                    else split(r"\s{2,}", nline, ts_idx + 1)[ts_idx]
+                )
+            except IndexError:
                 return False, False
-            # In some Zeek files there may not be a ts field
-            # Like in some weird smb files
-            timestamp = nline.get("ts", 0)
+        else:
+            nline = zeek_line
+            start = zeek_line.find('"ts":')
+            if start == -1:
+                # In some Zeek files there may not be a ts field
+                # Like in some weird smb files
+                return False, False
+            start += len('"ts":')
+            end = zeek_line.find(",", start)
+            if end == -1:
+                end = zeek_line.find("}", start)
+            timestamp = zeek_line[start:end].strip().strip('"')
         try:
             timestamp = float(timestamp)
         except ValueError:
@@ -280,21 +343,47 @@ class Input(ICore):
             # to get the new dict of open handles.
             return False
 
+        while zeek_line.startswith("#"):
+            if self.is_zeek_tabs:
+                self.handle_zeek_tabs_header(filename, zeek_line)
+            zeek_line = file_handle.readline()
+
         # Did the file end?
-        if not zeek_line or zeek_line.startswith("#"):
+        if not zeek_line:
             # We reached the end of one of the files that we were reading.
             # Wait for more lines to come from another file
             return False
 
-        timestamp, nline = self.get_ts_from_line(zeek_line)
+        timestamp, nline = self.get_ts_from_line(
+            zeek_line, self.zeek_ts_idx.get(filename, 0)
+        )
         if not timestamp:
             return False
 
-        self.file_time[filename] = timestamp
+        heapq.heappush(self.file_time, (timestamp, filename))
         # Store the line in the cache
         self.cache_lines[filename] = {"type": filename, "data": nline}
         return True
 
+    def handle_zeek_tabs_header(self, filename: str, zeek_line: str):
+        """
+        the profilers parse the lines of zeek tab separated files using
+        the #fields and #types in the header of each file
+        """
+        if not zeek_line.startswith(("#fields", "#types")):
+            return
+
+        if zeek_line.startswith("#fields"):
+            fields: List[str] = split_line(zeek_line)[1:]
+            if "ts" in fields:
+                self.zeek_ts_idx[filename] = fields.index("ts")
+
+        # every profiler worker needs the header to parse the lines
+        # of this file
+        self.give_profiler(
+            {"type": filename, "data": zeek_line}, broadcast=True
+        )
+
     def reached_timeout(self) -> bool:
         # If we don't have any cached lines to send,
         # it may mean that new lines are not arriving. Check
@@ -323,21 +412,14 @@ class Input(ICore):
 
     def get_earliest_line(self):
         """
-        loops through all the caches lines and returns the line with the
-        earliest ts
+        pops the cached line with the earliest ts
         """
         # Now read lines in order. The line with the earliest timestamp first
-        files_sorted_by_ts = sorted(self.file_time, key=self.file_time.get)
         try:
             # get the file that has the earliest flow
-            file_with_earliest_flow = files_sorted_by_ts[0]
+            _, file_with_earliest_flow = heapq.heappop(self.file_time)
         except IndexError:
-            # No more sorted keys. Just loop waiting for more lines
-            # It may happen that we check all the files in the folder,
-            # and there is still no files for us.
-            # To cover this case, just refresh the list of files
-            self.zeek_files = self.db.get_all_zeek_files()
-            # time.sleep(1)
+            # No more cached lines. Just loop waiting for more lines
             return False, False
 
         # to fix the problem of evidence being generated BEFORE their corresponding flows are added to our db
@@ -350,27 +432,64 @@ class Input(ICore):
         #         file_with_earliest_flow = key
         #         break
         # comes here if we're done with all conn.log flows and it's time to process other files
-        earliest_line = self.cache_lines[file_with_earliest_flow]
+        earliest_line = self.cache_lines.pop(file_with_earliest_flow)
         return earliest_line, file_with_earliest_flow
 
+    def update_zeek_files(self):
+        """
+        gets the zeek files to read from the db.
+        is called once at the start and then only when the filemonitor
+        detects that zeek created or rotated a log file
+        """
+        self.zeek_files_changed.clear()
+        self.zeek_files = [
+            filename
+            for filename in self.db.get_all_zeek_files()
+            if not self.is_ignored_file(filename)
+        ]
+
     def read_zeek_files(self) -> int:
-        self.zeek_files = self.db.get_all_zeek_files()
+        """
+        sends the lines of all zeek files to the profilers ordered by ts.
+        the next line of each file is cached, and the cached lines are
+        kept in a heap of (ts, filename) so the earliest one is found
+        without sorting all of them for every line.
+        the files that reached their end are polled for new lines every
+        ZEEK_EOF_POLL_INTERVAL seconds
+        """
+        self.update_zeek_files()
         self.open_file_handlers = {}
-        self.file_time = {}
+        # heap of the (ts, filename) of the cached lines
+        self.file_time: List[Tuple[float, str]] = []
         self.cache_lines = {}
+        # files that have no cached line and should be read
+        files_to_read = set(self.zeek_files)
+        last_eof_poll = time.monotonic()
         # Try to keep track of when was the last update so we stop this reading
         self.last_updated_file_time = datetime.datetime.now()
         while not self.should_stop():
             self.check_if_time_to_del_rotated_files()
-            # Go to all the files generated by Zeek and read 1
-            # line from each of them
-            for filename in self.zeek_files:
-                if self.is_ignored_file(filename):
-                    continue
-
+            if self.zeek_files_changed.is_set():
+                # Get the new list of files. Since new files may have been
+                # created by Zeek while we were processing them.
+                self.update_zeek_files()
+                files_to_read.update(self.zeek_files)
+
+            now = time.monotonic()
+            if (
+                not self.file_time
+                or now - last_eof_poll >= ZEEK_EOF_POLL_INTERVAL
+            ):
+                # poll the files that reached their end for new lines,
+                # the ones that have a cached line aren't read again
+                files_to_read.update(self.zeek_files)
+                last_eof_poll = now
+
+            for filename in files_to_read:
                 # reads 1 line from the given file and cache it
                 # from in self.cache_lines
                 self.cache_nxt_line_in_file(filename)
+            files_to_read.clear()
 
             if self.reached_timeout():
                 break
@@ -386,12 +505,8 @@ class Input(ICore):
             # when testing, no need to read the whole file!
             if self.lines == 10 and self.testing:
                 break
-            # Delete this line from the cache and the time list
-            del self.cache_lines[file_with_earliest_flow]
-            del self.file_time[file_with_earliest_flow]
-            # Get the new list of files. Since new files may have been created by
-            # Zeek while we were processing them.
-            self.zeek_files = self.db.get_all_zeek_files()
+            # only the file of the sent line has no cached line now
+            files_to_read.add(file_with_earliest_flow)
 
         self.close_all_handles()
         return self.lines
@@ -532,7 +647,9 @@ class Input(ICore):
             t_line = file_stream.readline()
             type_ = "argus-tabs" if "\t" in t_line else "argus"
             line = {"type": type_, "data": t_line}
-            self.give_profiler(line)
+            self.set_argus_columns_idx(t_line)
+            # every profiler worker needs the header to define its columns
+            self.give_profiler(line, broadcast=True)
             self.lines += 1
 
             # go through the rest of the file
@@ -635,7 +752,10 @@ class Input(ICore):
         # Get the file eventhandler
         # We have to set event_handler and event_observer before running zeek.
         event_handler = FileEventHandler(
-            self.zeek_dir, self.input_type, self.db
+            self.zeek_dir,
+            self.input_type,
+            self.db,
+            zeek_files_changed=self.zeek_files_changed,
         )
         # Create an observer
         self.event_observer = Observer()
@@ -751,11 +871,16 @@ class Input(ICore):
                 )
                 # os.remove(old_log_file)
                 lock.release()
+                self.zeek_files_changed.set()
 
     def shutdown_gracefully(self):
         self.print(f"Stopping. Total lines read: {self.lines}")
         self.stop_observer()
         self.stop_queues()
+        try:
+            self.frames_flusher.join(3)
+        except Exception:
+            pass
         try:
             self.remover_thread.join(3)
         except Exception:
@@ -903,10 +1028,133 @@ class Input(ICore):
 
         self.is_done_processing()
 
-    def give_profiler(self, line):
+    def set_argus_columns_idx(self, header: str):
+        """
+        sets the index of the source address and the starttime columns
+        using the header of the given argus file
+        """
+        separator = "\t" if "\t" in header else ","
+        for idx, field in enumerate(header.strip().split(separator)):
+            field = field.lower()
+            if "srca" in field:
+                self.argus_saddr_idx = idx
+            elif "starttime" in field:
+                self.argus_starttime_idx = idx
+
+    def get_saddr_from_line(self, line: dict) -> str:
+        """
+        extracts the source address of the given line without fully
+        parsing it. used for choosing the profiler worker of each line
+        returns an empty str if the saddr can't be extracted
+        """
+        data = line["data"]
+        if isinstance(data, dict):
+            # zeek json lines read from stdin are decoded by this proc
+            return data.get("id.orig_h", "")
+
+        line_type = line.get("line_type", self.input_type)
+        try:
+            if "suricata" in line_type:
+                saddr = search(r'"src_ip":\s*"([^"]+)"', data)
+                return saddr.group(1) if saddr else ""
+
+            if data.startswith("{"):
+                # zeek json lines
+                saddr = search(r'"id\.orig_h":\s*"([^"]+)"', data)
+                return saddr.group(1) if saddr else ""
+
+            if line_type == "nfdump":
+                return data.split(",")[3]
+
+            if line_type in ("argus", "binetflow", "binetflow-tabs"):
+                separator = "\t" if "\t" in data else ","
+                # argus lines read from stdin have predefined indices
+                idx = self.argus_saddr_idx
+                if idx is None:
+                    idx = 3
+                return data.split(separator)[idx]
+
+            # zeek tab separated lines
+            return data.split("\t")[2]
+        except (IndexError, AttributeError):
+            return ""
+
+    def get_starttime_from_line(self, line: dict) -> Optional[float]:
+        """
+        extracts the ts of the given line as a unix timestamp.
+        only used for the first line, so json lines are fully decoded
+        returns None if the ts can't be extracted
+        """
+        data = line["data"]
+        line_type = line.get("line_type", self.input_type)
+        try:
+            if isinstance(data, dict):
+                # zeek json lines read from stdin are decoded by this proc
+                ts = data["ts"]
+            elif "suricata" in line_type:
+                event: dict = json.loads(data)
+                # the profilers use the start of suricata flows
+                if event.get("event_type") == "flow":
+                    ts = event["flow"]["start"]
+                else:
+                    ts = event["timestamp"]
+            elif data.startswith("{"):
+                # zeek json lines
+                ts = json.loads(data)["ts"]
+            elif line_type == "nfdump":
+                ts = data.split(",")[0]
+            elif line_type in ("argus", "binetflow", "binetflow-tabs"):
+                separator = "\t" if "\t" in data else ","
+                # argus lines read from stdin have predefined indices
+                idx = self.argus_starttime_idx or 0
+                ts = data.split(separator)[idx].strip()
+            else:
+                # zeek tab separated lines
+                idx = self.zeek_ts_idx.get(line["type"], 0)
+                ts = data.split("\t")[idx]
+            return float(utils.convert_format(ts, "unixtimestamp"))
+        except (IndexError, KeyError, TypeError, ValueError):
+            return None
+
+    def set_file_start(self, line: dict):
+        """
+        sets the start of the first tw to the ts of the given line.
+        it's only done once, before the first line is sent to the
+        profilers, so they all agree on the start of every tw
+        """
+        self.is_file_start_set = True
+        starttime: Optional[float] = self.get_starttime_from_line(line)
+        if starttime is None:
+            # the profilers set it using the first flow they profile
+            self.print(
+                "Unable to read the ts of the first flow, the first "
+                "timewindow starts with the first profiled flow.",
+                0,
+                1,
+            )
+            return
+        self.db.set_input_metadata({"file_start": starttime})
+
+    def get_profiler_worker(self, line: dict) -> int:
+        """
+        returns the id of the profiler worker that should
+        process the given line.
+        the worker is chosen using a consistent hash of the saddr of the
+        line, so all the flows of the same profile are profiled in order
+        by the same worker
+        """
+        if len(self.profiler_queues) == 1:
+            return 0
+
+        saddr: str = self.get_saddr_from_line(line)
+        return zlib.crc32(saddr.encode()) % len(self.profiler_queues)
+
+    def give_profiler(self, line, broadcast=False):
         """
         sends the given txt/dict to the profilerqueue for process
         sends the total amount of flows to process with the first flow only
+        :param broadcast: if True, the line is sent to all the profiler
+        workers, for example the header of argus files
         """
         to_send = {"line": line, "input_type": self.input_type}
         # send the total flows slips is going to read to the profiler
@@ -921,12 +1169,77 @@ class Input(ICore):
                     "total_flows": self.total_flows,
                 }
             )
+        if not broadcast:
+            if not self.is_file_start_set:
+                self.set_file_start(line)
+            self.add_to_frame(self.get_profiler_worker(line), to_send)
+            return
+
+        for worker_id in range(len(self.profiler_queues)):
+            to_send["broadcast"] = True
+            self.add_to_frame(worker_id, to_send)
+            # only 1 worker should receive the total flows
+            to_send = {"line": line, "input_type": self.input_type}
+
+    def add_to_frame(self, worker_id: int, msg: dict):
+        """
+        adds the given msg to the frame of the given profiler worker,
+        and sends the frame if it's full or too old
+        """
+        with self.frames_lock:
+            frame: list = self.frames[worker_id]
+            if not frame:
+                self.frames_start_time[worker_id] = time.time()
+            frame.append(msg)
+
+            if (
+                len(frame) >= self.batch_size
+                or time.time() - self.frames_start_time[worker_id]
+                >= self.batch_max_delay
+            ):
+                self.send_frame(worker_id)
+
+    def send_frame(self, worker_id: int):
+        """
+        sends the frame of the given worker to its profiler queue.
+        the caller should be holding self.frames_lock
+        """
+        frame: list = self.frames[worker_id]
+        if not frame:
+            return
         # when the queue is full, the default behaviour is to block
         # if necessary until a free slot is available
-        self.profiler_queue.put(to_send)
+        self.profiler_queues[worker_id].put(frame)
+        self.frames[worker_id] = []
+
+    def flush_frames(self):
+        """sends all the pending frames to the profilers"""
+        with self.frames_lock:
+            for worker_id in range(len(self.frames)):
+                self.send_frame(worker_id)
+
+    def flush_old_frames_periodically(self):
+        """
+        this thread keeps the latency of the profiler queues bounded
+        when lines are arriving slowly, for example when reading from an
+        interface or from stdin, by sending every frame that is older
+        than self.batch_max_delay
+        """
+        while not self.should_stop():
+            time.sleep(self.batch_max_delay)
+            now = time.time()
+            with self.frames_lock:
+                for worker_id, frame in enumerate(self.frames):
+                    if (
+                        frame
+                        and now - self.frames_start_time[worker_id]
+                        >= self.batch_max_delay
+                    ):
+                        self.send_frame(worker_id)
 
     def main(self):
         utils.drop_root_privs()
+        self.frames_flusher.start()
         if "-i" in sys.argv or self.db.is_growing_zeek_dir():
             # this thread should be started from run() to get the PID of inputprocess and have shared variables
             # if it started from __init__() it will have the PID of slips.py therefore,
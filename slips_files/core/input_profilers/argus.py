@@ -2,7 +2,6 @@ import sys
 import traceback
 
 from slips_files.common.abstracts.input_type import IInputType
-from slips_files.common.slips_utils import utils
 from slips_files.core.flows.argus import ArgusConn
 
 
@@ -39,7 +38,7 @@ class Argus(IInputType):
                 return default_
 
         self.flow: ArgusConn = ArgusConn(
-            utils.convert_to_datetime(get_value_of("starttime")),
+            self.to_epoch(get_value_of("starttime")),
             get_value_of("endtime"),
             get_value_of("dur"),
             get_value_of("proto"),
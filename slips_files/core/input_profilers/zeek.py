@@ -1,8 +1,11 @@
-from datetime import datetime
-from re import split
+import json
+from typing import (
+    Dict,
+    List,
+    Optional,
+)
 
 from slips_files.common.abstracts.input_type import IInputType
-from slips_files.common.slips_utils import utils
 from slips_files.core.flows.zeek import (
     Conn,
     DNS,
@@ -19,6 +22,12 @@ from slips_files.core.flows.zeek import (
     Software,
     Weird,
 )
+from slips_files.core.input_profilers.zeek_tsv import (
+    FLOW_COLUMNS,
+    ZeekTSVExtractor,
+    get_log_type,
+    split_line,
+)
 
 
 class ZeekJSON(IInputType):
@@ -31,6 +40,13 @@ class ZeekJSON(IInputType):
         (parse them into column_values dict) to send to the database
         """
         line = new_line["data"]
+        if isinstance(line, str):
+            # the input process sends the lines of the zeek files as
+            # they're read
+            try:
+                line = json.loads(line)
+            except json.decoder.JSONDecodeError:
+                return False
         file_type = new_line["type"]
         # all zeek lines recieved from stdin should be of type conn
         if (
@@ -46,7 +62,9 @@ class ZeekJSON(IInputType):
             file_type = file_type.split("/")[-1]
 
         if ts := line.get("ts", False):
-            starttime: datetime = utils.convert_to_datetime(ts)
+            # flows are stored with epoch starttimes, the ts is only
+            # converted if zeek isn't using epoch timestamps
+            starttime: float = self.to_epoch(ts)
         else:
             starttime = ""
 
@@ -262,239 +280,55 @@ class ZeekTabs(IInputType):
     separator = "\t"
 
     def __init__(self):
-        pass
+        # {zeek log file: the extractor compiled from its header}
+        self.extractors: Dict[str, ZeekTSVExtractor] = {}
+        # {zeek log file: its #fields} until its #types are received
+        self.fields: Dict[str, List[str]] = {}
 
-    def process_line(self, new_line: dict):
+    def handle_header_line(self, filename: str, line: str):
         """
-        Process the tab line from zeek.
+        the input process sends the #fields and #types header lines of
+        each zeek log file to all profiler workers before the flows
+        of the file
         """
-        line = new_line["data"]
-        line = line.rstrip("\n")
-        # the data is either \t separated or space separated
-        # zeek files that are space separated are either separated by 2 or 3 spaces so we can't use python's split()
-        # using regex split, split line when you encounter more than 2 spaces in a row
-        line = line.split("\t") if "\t" in line else split(r"\s{2,}", line)
-
-        if ts := line[0]:
-            starttime = utils.convert_to_datetime(ts)
-        else:
-            starttime = ""
-
-        def get_value_at(index: int, default_=""):
-            try:
-                val = line[index]
-                return default_ if val == "-" else val
-            except IndexError:
-                return default_
-
-        # uid = get_value_at(1)
-        # saddr = get_value_at(2, '')
-        # saddr = get_value_at(3, '')
-
-        if "conn.log" in new_line["type"]:
-            self.flow: Conn = Conn(
-                starttime,
-                get_value_at(1, False),
-                get_value_at(2),
-                get_value_at(4),
-                float(get_value_at(8, 0)),
-                get_value_at(6, False),
-                get_value_at(7),
-                int(get_value_at(3)),
-                int(get_value_at(5)),
-                int(get_value_at(16, 0)),
-                int(get_value_at(18, 0)),
-                int(get_value_at(9, 0)),
-                int(get_value_at(10, 0)),
-                get_value_at(21),
-                get_value_at(22),
-                get_value_at(11),
-                get_value_at(15),
-            )
-
-        elif "dns.log" in new_line["type"]:
-            self.flow: DNS = DNS(
-                starttime,
-                get_value_at(1, False),
-                get_value_at(2),
-                get_value_at(4),
-                get_value_at(9),
-                get_value_at(11),
-                get_value_at(13),
-                get_value_at(15),
-                get_value_at(21),
-                get_value_at(22),
-            )
+        header, *values = split_line(line)
+        if header == "#fields":
+            self.fields[filename] = values
+            # the lines of the file are parsed using the new header
+            self.extractors.pop(filename, None)
+        elif header == "#types" and filename in self.fields:
+            self.compile_extractor(filename, types=values)
 
-        elif "http.log" in new_line["type"]:
-            self.flow: HTTP = HTTP(
-                starttime,
-                get_value_at(1, False),
-                get_value_at(2),
-                get_value_at(4),
-                get_value_at(7),
-                get_value_at(8),
-                get_value_at(9),
-                get_value_at(11),
-                get_value_at(12),
-                int(get_value_at(13, 0)),
-                int(get_value_at(14, 0)),
-                get_value_at(15),
-                get_value_at(16),
-                get_value_at(28),
-                get_value_at(26),
-            )
+    def compile_extractor(
+        self, filename: str, types: List[str] = None
+    ) -> Optional[ZeekTSVExtractor]:
+        log_type = get_log_type(filename)
+        fields = self.fields.pop(filename)
+        if log_type not in FLOW_COLUMNS:
+            return
+        extractor = ZeekTSVExtractor(log_type, fields, types)
+        self.extractors[filename] = extractor
+        return extractor
 
-        elif "ssl.log" in new_line["type"]:
-            self.flow: SSL = SSL(
-                starttime,
-                get_value_at(1, False),
-                get_value_at(2),
-                get_value_at(4),
-                get_value_at(6),
-                get_value_at(3),
-                get_value_at(5),
-                get_value_at(7),
-                get_value_at(10),
-                get_value_at(13),
-                get_value_at(14),
-                get_value_at(15),
-                get_value_at(16),
-                get_value_at(17),
-                get_value_at(20),
-                get_value_at(8),
-                get_value_at(9),
-                get_value_at(21),
-                get_value_at(22),
-                get_value_at(23),
-            )
+    def process_line(self, new_line: dict):
+        """
+        Process the tab line from zeek.
+        """
+        line: str = new_line["data"]
+        filename: str = new_line["type"]
+        if line.startswith("#"):
+            self.handle_header_line(filename, line)
+            return False
 
-        elif "ssh.log" in new_line["type"]:
-            # Zeek can put in column 7 the auth success if it has one
-            # or the auth attempts only. However if the auth
-            # success is there, the auth attempts are too.
-            auth_success = get_value_at(7)
-            if "T" in auth_success:
-                self.flow: SSH = SSH(
-                    starttime,
-                    get_value_at(1, False),
-                    get_value_at(2),
-                    get_value_at(4),
-                    get_value_at(6),
-                    get_value_at(7),
-                    get_value_at(8),
-                    get_value_at(10),
-                    get_value_at(11),
-                    get_value_at(12),
-                    get_value_at(13),
-                    get_value_at(14),
-                    get_value_at(15),
-                    get_value_at(16),
-                    get_value_at(17),
-                )
-            else:
-                self.flow: SSH = SSH(
-                    starttime,
-                    get_value_at(1, False),
-                    get_value_at(2),
-                    get_value_at(4),
-                    get_value_at(6),
-                    "",
-                    get_value_at(7),
-                    get_value_at(9),
-                    get_value_at(10),
-                    get_value_at(11),
-                    get_value_at(12),
-                    get_value_at(13),
-                    get_value_at(14),
-                    get_value_at(15),
-                    get_value_at(16),
-                )
-        elif "dhcp.log" in new_line["type"]:
-            self.flow: DHCP = DHCP(
-                starttime,
-                get_value_at(1, False),
-                get_value_at(2),
-                get_value_at(
-                    3
-                ),  #  daddr in dhcp.log is the server_addr at index 3 not 4 like most log files
-                get_value_at(2),  # client_addr is the same as saddr
-                get_value_at(3),
-                get_value_at(5),
-                get_value_at(4),
-                get_value_at(8),
-            )
-        elif "smtp.log" in new_line["type"]:
-            self.flow: SMTP = SMTP(
-                starttime,
-                get_value_at(1, False),
-                get_value_at(2),
-                get_value_at(4),
-                get_value_at(20),
-            )
-        elif "tunnel.log" in new_line["type"]:
-            self.flow: Tunnel = Tunnel(
-                starttime,
-                get_value_at(1, False),
-                get_value_at(2),
-                get_value_at(4),
-                get_value_at(3),
-                get_value_at(5),
-                get_value_at(6),
-                get_value_at(7),
-            )
-        elif "notice.log" in new_line["type"]:
-            # portscan notices don't have id.orig_h or id.resp_h fields,
-            # instead they have src and dst
-            self.flow: Notice = Notice(
-                starttime,
-                get_value_at(1, False),
-                get_value_at(13, "-"),  #  src field
-                get_value_at(4),
-                get_value_at(3),
-                get_value_at(5, ""),
-                get_value_at(10),  # note
-                get_value_at(11),  # msg
-                get_value_at(15),  # scanned_port
-                get_value_at(13, "-"),  # scanning_ip
-                get_value_at(14),  # dst
-            )
-        elif "files.log" in new_line["type"]:
-            self.flow: Files = Files(
-                starttime,
-                get_value_at(4, False),
-                get_value_at(2),
-                get_value_at(3),
-                get_value_at(13),
-                get_value_at(19),
-                get_value_at(5),
-                get_value_at(7),
-                get_value_at(19),
-                get_value_at(2),
-                get_value_at(3),
-            )
-        elif "arp.log" in new_line["type"]:
-            self.flow: ARP = ARP(
-                starttime,
-                get_value_at(1, False),
-                get_value_at(4),
-                get_value_at(5),
-                get_value_at(2),
-                get_value_at(3),
-                get_value_at(6),
-                get_value_at(7),
-                get_value_at(1),
-            )
+        extractor: Optional[ZeekTSVExtractor] = self.extractors.get(filename)
+        if not extractor:
+            if filename not in self.fields:
+                # we don't know the columns of this file
+                return False
+            # no #types were received, the values aren't converted
+            extractor = self.compile_extractor(filename)
+            if not extractor:
+                return False
 
-        elif "weird" in new_line["type"]:
-            self.flow: Weird = Weird(
-                starttime,
-                get_value_at(1, False),
-                get_value_at(2),
-                get_value_at(4),
-                get_value_at(6),
-                get_value_at(7),
-            )
-        else:
-            return False
+        self.flow = extractor.extract(line)
         return self.flow
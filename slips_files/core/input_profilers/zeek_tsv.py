@@ -0,0 +1,402 @@
+"""
+Parses the lines of zeek tab separated log files using the
+#fields and #types header of each file instead of fixed column indices,
+so zeek versions with different columns are parsed correctly.
+"""
+
+import os
+from re import split
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from slips_files.core.flows.zeek import (
+    Conn,
+    DNS,
+    HTTP,
+    SSL,
+    SSH,
+    DHCP,
+    FTP,
+    SMTP,
+    Tunnel,
+    Notice,
+    Files,
+    ARP,
+    Software,
+    Weird,
+)
+
+# the default values of the #set_separator, #empty_field
+# and #unset_field headers
+SET_SEPARATOR = ","
+EMPTY_FIELD = "(empty)"
+UNSET_FIELD = "-"
+
+
+class Column(NamedTuple):
+    # the zeek field of this column. if it's a tuple, the first field
+    # found in the header is used, zeek renamed some fields
+    field: Union[str, Tuple[str, ...]]
+    default: Any = ""
+    # use the first item of set and vector fields
+    first_item: bool = False
+
+
+# the columns of each log file, in the order of the arguments of its
+# flow class after the starttime
+FLOW_COLUMNS: Dict[str, Tuple[type, Tuple[Column, ...]]] = {
+    "conn": (
+        Conn,
+        (
+            Column("uid", False),
+            Column("id.orig_h"),
+            Column("id.resp_h"),
+            Column("duration", 0),
+            Column("proto"),
+            Column("service"),
+            Column("id.orig_p"),
+            Column("id.resp_p"),
+            Column("orig_pkts", 0),
+            Column("resp_pkts", 0),
+            Column("orig_bytes", 0),
+            Column("resp_bytes", 0),
+            Column("orig_l2_addr"),
+            Column("resp_l2_addr"),
+            Column("conn_state"),
+            Column("history"),
+        ),
+    ),
+    "dns": (
+        DNS,
+        (
+            Column("uid", False),
+            Column("id.orig_h"),
+            Column("id.resp_h"),
+            Column("query"),
+            Column("qclass_name"),
+            Column("qtype_name"),
+            Column("rcode_name"),
+            Column("answers"),
+            Column("TTLs"),
+        ),
+    ),
+    "http": (
+        HTTP,
+        (
+            Column("uid", False),
+            Column("id.orig_h"),
+            Column("id.resp_h"),
+            Column("method"),
+            Column("host"),
+            Column("uri"),
+            Column("version"),
+            Column("user_agent"),
+            Column("request_body_len", 0),
+            Column("response_body_len", 0),
+            Column("status_code"),
+            Column("status_msg"),
+            Column("resp_mime_types"),
+            Column("resp_fuids"),
+        ),
+    ),
+    "ssl": (
+        SSL,
+        (
+            Column("uid", False),
+            Column("id.orig_h"),
+            Column("id.resp_h"),
+            Column("version"),
+            Column("id.orig_p"),
+            Column("id.resp_p"),
+            Column("cipher"),
+            Column("resumed"),
+            Column("established"),
+            Column(("cert_chain_fuids", "cert_chain_fps")),
+            Column(("client_cert_chain_fuids", "client_cert_chain_fps")),
+            Column("subject"),
+            Column("issuer"),
+            Column("validation_status"),
+            Column("curve"),
+            Column("server_name"),
+            Column("ja3"),
+            Column("ja3s"),
+            Column("is_DoH"),
+        ),
+    ),
+    "ssh": (
+        SSH,
+        (
+            Column("uid", False),
+            Column("id.orig_h"),
+            Column("id.resp_h"),
+            Column("version"),
+            Column("auth_success"),
+            Column("auth_attempts"),
+            Column("client"),
+            Column("server"),
+            Column("cipher_alg"),
+            Column("mac_alg"),
+            Column("compression_alg"),
+            Column("kex_alg"),
+            Column("host_key_alg"),
+            Column("host_key"),
+        ),
+    ),
+    "dhcp": (
+        DHCP,
+        (
+            Column("uids", []),
+            Column("client_addr"),  # saddr
+            Column("server_addr"),  # daddr
+            Column("client_addr"),
+            Column("server_addr"),
+            Column("host_name"),
+            Column("mac"),  # this is the client mac
+            Column("requested_addr"),
+        ),
+    ),
+    "ftp": (
+        FTP,
+        (
+            Column("uid"),
+            Column("id.orig_h"),
+            Column("id.resp_h"),
+            Column("data_channel.resp_p", False),
+        ),
+    ),
+    "smtp": (
+        SMTP,
+        (
+            Column("uid"),
+            Column("id.orig_h"),
+            Column("id.resp_h"),
+            Column("last_reply"),
+        ),
+    ),
+    "tunnel": (
+        Tunnel,
+        (
+            Column("uid"),
+            Column("id.orig_h"),
+            Column("id.resp_h"),
+            Column("id.orig_p"),
+            Column("id.resp_p"),
+            Column("tunnel_type"),
+            Column("action"),
+        ),
+    ),
+    "notice": (
+        Notice,
+        (
+            Column("uid"),
+            Column("id.orig_h"),
+            Column("id.resp_h"),
+            Column("id.orig_p"),
+            Column("id.resp_p"),
+            Column("note"),
+            Column("msg"),
+            Column("p"),  # scanned_port
+            Column("src"),  # scanning_ip
+            Column("dst"),
+        ),
+    ),
+    "files": (
+        Files,
+        (
+            # older zeek versions have conn_uids instead of uid
+            Column(("uid", "conn_uids"), first_item=True),
+            Column("id.orig_h"),
+            Column("id.resp_h"),
+            Column("seen_bytes"),  # downloaded file size
+            Column("md5"),
+            Column("source"),
+            Column("analyzers"),
+            Column("sha1"),
+            Column("tx_hosts"),
+            Column("rx_hosts"),
+        ),
+    ),
+    "arp": (
+        ARP,
+        (
+            # arp.log has no uid
+            Column(("uid", "operation")),
+            Column("orig_h"),
+            Column("resp_h"),
+            Column("src_mac"),
+            Column("dst_mac"),
+            Column("orig_hw"),
+            Column("resp_hw"),
+            Column("operation"),
+        ),
+    ),
+    "software": (
+        Software,
+        (
+            Column("uid"),
+            Column("host"),
+            Column("resp_h"),
+            Column("software_type"),
+            Column("unparsed_version"),
+            Column("version.major"),
+            Column("version.minor"),
+        ),
+    ),
+    "weird": (
+        Weird,
+        (
+            Column("uid"),
+            Column("id.orig_h"),
+            Column("id.resp_h"),
+            Column("name"),
+            Column("addl"),
+        ),
+    ),
+}
+
+# {zeek type: function to convert the values of this type}
+CONVERTERS: Dict[str, Callable[[str], Any]] = {
+    "time": float,
+    "interval": float,
+    "double": float,
+    "count": int,
+    "int": int,
+    "port": int,
+}
+
+
+def split_line(line: str) -> List[str]:
+    """
+    splits the given zeek tab separated line to its values
+    """
+    line = line.rstrip("\n")
+    # the data is either \t separated or space separated
+    # zeek files that are space separated are either separated by 2 or 3
+    # spaces so we can't use python's split()
+    # using regex split, split line when you encounter more than 2
+    # spaces in a row
+    return line.split("\t") if "\t" in line else split(r"\s{2,}", line)
+
+
+def get_converter(zeek_type: str) -> Callable[[str], Any]:
+    """
+    returns a function that converts the values of the given zeek type
+    to the same python types zeek json logs have
+    """
+    if zeek_type.startswith(("set[", "vector[")):
+        convert_item = CONVERTERS.get(zeek_type[zeek_type.index("[") + 1 : -1])
+
+        def convert_container(value: str) -> list:
+            if value == EMPTY_FIELD:
+                return []
+            items = value.split(SET_SEPARATOR)
+            return list(map(convert_item, items)) if convert_item else items
+
+        return convert_container
+
+    if convert := CONVERTERS.get(zeek_type):
+        return convert
+
+    def convert_str(value: str) -> str:
+        return "" if value == EMPTY_FIELD else value
+
+    return convert_str
+
+
+def get_log_type(filename: str) -> str:
+    """
+    returns the type of the given zeek log file,
+    e.g. dns for /zeek_files/dns.log and dns.2022-05-11-14-43-20.log
+    """
+    return os.path.basename(filename).split(".")[0]
+
+
+class ZeekTSVExtractor:
+    """
+    Converts the lines of one zeek tab separated log file to flows.
+
+    The index and the converter of every column of the flow are found
+    once using the header of the file, each line is then split once and
+    only the needed values are converted.
+    """
+
+    def __init__(
+        self, log_type: str, fields: List[str], types: List[str] = None
+    ):
+        self.flow_class, columns = FLOW_COLUMNS[log_type]
+        types = types or []
+        # {field: (its index, its converter)}
+        field_info = {
+            field: (
+                idx,
+                get_converter(types[idx]) if idx < len(types) else None,
+            )
+            for idx, field in enumerate(fields)
+        }
+        self.ts_idx: Optional[int] = field_info.get("ts", (None,))[0]
+        # (index, converter, default, first_item) of each column
+        self.columns: List[
+            Tuple[Optional[int], Optional[Callable], Any, bool]
+        ] = []
+        for column in columns:
+            field_names = (
+                (column.field,)
+                if isinstance(column.field, str)
+                else column.field
+            )
+            idx, convert = next(
+                (
+                    field_info[field]
+                    for field in field_names
+                    if field in field_info
+                ),
+                (None, None),
+            )
+            self.columns.append(
+                (idx, convert, column.default, column.first_item)
+            )
+
+    def get_starttime(self, values: List[str]):
+        if self.ts_idx is None:
+            return ""
+        try:
+            return float(values[self.ts_idx])
+        except (IndexError, ValueError):
+            return ""
+
+    def extract(self, line: str):
+        """
+        returns the flow of the given line
+        """
+        values = split_line(line)
+        nvalues = len(values)
+        args = [self.get_starttime(values)]
+        for idx, convert, default, first_item in self.columns:
+            if idx is None or idx >= nvalues:
+                args.append(default)
+                continue
+
+            value = values[idx]
+            if value == UNSET_FIELD:
+                args.append(default)
+                continue
+
+            if convert:
+                try:
+                    value = convert(value)
+                except ValueError:
+                    value = default
+
+            if first_item and isinstance(value, list):
+                value = value[0] if value else default
+            args.append(value)
+
+        return self.flow_class(*args)
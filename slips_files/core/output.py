@@ -26,6 +26,7 @@ from slips_files.common.abstracts.observer import IObserver
 from slips_files.common.parsers.config_parser import ConfigParser
 from slips_files.common.slips_utils import utils
 from slips_files.common.style import red
+from slips_files.core.helpers.log_writer import BufferedLogWriter
 
 
 class Output(IObserver):
@@ -38,8 +39,6 @@ class Output(IObserver):
     """
 
     name = "Output"
-    slips_logfile_lock = Lock()
-    errors_logfile_lock = Lock()
     cli_lock = Lock()
 
     def __init__(
@@ -68,6 +67,10 @@ class Output(IObserver):
         self.stop_daemon = stop_daemon
         self.errors_logfile = stderr
         self.slips_logfile = slips_logfile
+        self.errors_log_writer = BufferedLogWriter(
+            self.errors_logfile, unbuffered=True
+        )
+        self.slips_log_writer = BufferedLogWriter(self.slips_logfile)
         # if we're using -S, no need to init all the logfiles
         # we just need an instance of this class to be able
         # to start the db from the daemon class
@@ -144,10 +147,7 @@ class Output(IObserver):
         date_time = datetime.now()
         date_time = utils.convert_format(date_time, utils.alerts_format)
 
-        self.slips_logfile_lock.acquire()
-        with open(self.slips_logfile, "a") as slips_logfile:
-            slips_logfile.write(f"{date_time} [{sender}] {msg}\n")
-        self.slips_logfile_lock.release()
+        self.slips_log_writer.write(f"{date_time} [{sender}] {msg}\n")
 
     def change_stdout(self):
         """
@@ -196,10 +196,9 @@ class Output(IObserver):
         date_time = datetime.now()
         date_time = utils.convert_format(date_time, utils.alerts_format)
 
-        self.errors_logfile_lock.acquire()
-        with open(self.errors_logfile, "a") as errors_logfile:
-            errors_logfile.write(f'{date_time} [{msg["from"]}] {msg["txt"]}\n')
-        self.errors_logfile_lock.release()
+        self.errors_log_writer.write(
+            f'{date_time} [{msg["from"]}] {msg["txt"]}\n'
+        )
 
     def handle_printing_stats(self, stats: str):
         """
@@ -229,6 +228,18 @@ class Output(IObserver):
         """
         return 0 < debug <= 3 and debug <= self.debug
 
+    def discards(self, verbose: int, debug: int) -> bool:
+        """
+        returns True if output_line() neither prints nor logs the msgs
+        with the given verbose and debug levels
+        """
+        # errors are always logged to errors.log
+        return not (
+            self.enough_verbose(verbose)
+            or self.enough_debug(debug)
+            or debug == 1
+        )
+
     def output_line(self, msg: dict):
         """
         Prints to terminal and logfiles depending on the debug and verbose
@@ -289,6 +300,7 @@ class Output(IObserver):
             self.tell_pbar(
                 {
                     "event": "update_bar",
+                    "flows": msg.get("flows", 1),
                 }
             )
 
@@ -298,6 +310,8 @@ class Output(IObserver):
         each msg shhould be in the following format
         {
             bar: 'update' or 'init'
+            flows: the number of processed flows to add to the pbar,
+                    only given when we send bar:'update'
             log_to_logfiles_only: bool that indicates wheteher we
             wanna log the text to all logfiles or the cli only?
             txt: text to log to the logfiles and/or the cli
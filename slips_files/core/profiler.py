@@ -17,6 +17,7 @@
 # stratosphere@aic.fel.cvut.cz
 from dataclasses import asdict
 import queue
+import time
 import ipaddress
 import pprint
 import multiprocessing
@@ -66,6 +67,8 @@ class Profiler(ICore):
         profiler_queue=None,
         is_profiler_done_event: multiprocessing.Event = None,
         has_pbar: bool = False,
+        worker_id: int = 0,
+        producers: int = 1,
     ):
         # when profiler is done processing, it releases this semaphore,
         # that's how the process_manager knows it's done
@@ -74,12 +77,26 @@ class Profiler(ICore):
         self.done_processing: multiprocessing.Semaphore = is_profiler_done
         # every line put in this queue should be profiled
         self.profiler_queue = profiler_queue
+        # when using more than 1 profiler worker, each worker receives
+        # the flows of the source IPs that hash to its id
+        self.worker_id = worker_id
+        if worker_id:
+            self.name = f"Profiler_{worker_id}"
+        # the number of processes sending flows to this worker, the input
+        # process or the flow parsers. each one sends a 'stop' msg when
+        # it's done
+        self.stop_msgs_left = producers
         self.timeformat = None
         self.input_type = False
         self.whitelisted_flows_ctr = 0
         self.rec_lines = 0
         self.is_localnet_set = False
         self.has_pbar = has_pbar
+        # the number of processed flows that weren't sent to the pbar yet.
+        # they're sent at most every pbar_update_interval seconds
+        self.pbar_updates = 0
+        self.pbar_update_interval = 0.1
+        self.last_pbar_update = 0.0
         self.whitelist = Whitelist(self.logger, self.db)
         self.read_configuration()
         self.symbol = SymbolHandler(self.logger, self.db)
@@ -178,7 +195,9 @@ class Profiler(ICore):
         # 5th. Store the data according to the paremeters
         # Now that we have the profileid and twid, add the data from the flow
         # in this tw for this profile
-        self.print(f"Storing data in the profile: {self.profileid}", 3, 0)
+        self.print(
+            lambda: f"Storing data in the profile: {self.profileid}", 3, 0
+        )
         self.convert_starttime_to_epoch()
         # For this 'forward' profile, find the id in the
         # database of the tw where the flow belongs.
@@ -313,7 +332,8 @@ class Profiler(ICore):
 
         return True
 
-    def define_separator(self, line: dict, input_type: str):
+    @staticmethod
+    def define_separator(line: dict, input_type: str):
         """
         :param line: dict with the line as read from the input file/dir
         given to slips using -f and the name of the logfile this line was read from
@@ -326,7 +346,8 @@ class Profiler(ICore):
         if input_type in ("zeek_folder", "zeek_log_file", "pcap", "interface"):
             # is it tab separated or comma separated?
             actual_line = line["data"]
-            if isinstance(actual_line, dict):
+            # zeek json lines are sent undecoded by the input process
+            if isinstance(actual_line, dict) or actual_line.startswith("{"):
                 return "zeek"
             return "zeek-tabs"
         elif input_type in ("stdin"):
@@ -343,6 +364,11 @@ class Profiler(ICore):
             f"Stopping. Total lines read: {self.rec_lines}",
             log_to_logfiles_only=True,
         )
+        # write the flows and the modified tws that are still buffered
+        # before telling the rest of slips that we're done
+        self.db.flush_buffered_flows()
+        self.db.flush_modified_tws()
+        self.update_pbar(force=True)
         # By default if a process(profiler) is not the creator of
         # the queue(profiler_queue) then on
         # exit it will attempt to join the queue’s background thread.
@@ -376,6 +402,11 @@ class Profiler(ICore):
         if msg != "stop":
             return False
 
+        self.stop_msgs_left -= 1
+        if self.stop_msgs_left > 0:
+            # other processes are still sending flows to this worker
+            return False
+
         self.print(
             f"Stopping profiler process. Number of whitelisted "
             f"conn flows: "
@@ -410,6 +441,27 @@ class Profiler(ICore):
         )
         self.supported_pbar = True
 
+    def update_pbar(self, force=False):
+        """
+        tells output.py to advance the pbar by the number of flows
+        processed since the last update.
+        the updates are sent at most every pbar_update_interval seconds
+        unless force is given
+        """
+        if not self.pbar_updates:
+            return
+
+        now = time.monotonic()
+        if (
+            not force
+            and now - self.last_pbar_update < self.pbar_update_interval
+        ):
+            return
+
+        self.notify_observers({"bar": "update", "flows": self.pbar_updates})
+        self.pbar_updates = 0
+        self.last_pbar_update = now
+
     def get_private_client_ips(self) -> List[str]:
         """
         returns the private ips found in the client_ips param
@@ -454,32 +506,27 @@ class Profiler(ICore):
     def pre_main(self):
         utils.drop_root_privs()
 
-    def main(self):
-        while not self.should_stop():
-            try:
-                # this msg can be a str only when it's a 'stop' msg indicating
-                # that this module should stop
-                msg = self.profiler_queue.get(timeout=1, block=False)
-                # ALYA, DO NOT REMOVE THIS CHECK
-                # without it, there's no way thi module will know it's time to
-                # stop and no new fows are coming
-                if self.check_for_stop_msg(msg):
-                    return 1
-                line: dict = msg["line"]
-                input_type: str = msg["input_type"]
-                total_flows: int = msg.get("total_flows", 0)
-            except queue.Empty:
-                continue
-            except Exception:
-                # ValueError is raised when the queue is closed
-                continue
+    def process_msg(self, msg: dict) -> bool:
+        """
+        processes one flow received from the input process
+        returns False if the type of the given input can't be determined
+        """
+        total_flows: int = msg.get("total_flows", 0)
+        if "flow" in msg:
+            # the line was already parsed by a flow parser worker
+            self.rec_lines += 1
+            self.input_type = msg["input_type"]
+            self.flow = msg["flow"]
+        else:
+            line: dict = msg["line"]
+            input_type: str = msg["input_type"]
 
             # TODO who is putting this True here?
             if line is True:
-                continue
+                return True
 
             # Received new input data
-            self.print(f"< Received Line: {line}", 2, 0)
+            self.print(lambda: f"< Received Line: {line}", 2, 0)
             self.rec_lines += 1
 
             # self.input_type is set only once by define_separator
@@ -487,8 +534,6 @@ class Profiler(ICore):
             if not self.input_type:
                 # Find the type of input received
                 self.input_type = self.define_separator(line, input_type)
-                if self.has_pbar:
-                    self.init_pbar(total_flows)
 
             # What type of input do we have?
             if not self.input_type:
@@ -501,16 +546,58 @@ class Profiler(ICore):
             if not hasattr(self, "input"):
                 self.input = SUPPORTED_INPUT_TYPES[self.input_type]()
 
-            # get the correct input type class and process the line based on it
+            # get the correct input type class and process the line
+            # based on it
             self.flow = self.input.process_line(line)
-            if self.flow:
+
+        # the total flows are only sent with the very first flow,
+        # so when using many profiler workers, only the worker
+        # that receives it initializes the pbar
+        if self.has_pbar and total_flows:
+            self.init_pbar(total_flows)
+
+        if self.flow:
+            # all the redis writes of this flow are sent at once
+            self.db.start_pipeline()
+            try:
                 self.add_flow_to_profile()
                 self.handle_setting_local_net()
+            finally:
+                self.db.flush_pipeline()
+
+        # now that one flow is processed tell output.py
+        # to update the bar
+        # the lines sent to all workers, like headers, aren't flows
+        if self.has_pbar and not msg.get("broadcast"):
+            self.pbar_updates += 1
+            self.update_pbar()
+        return True
+
+    def main(self):
+        while not self.should_stop():
+            try:
+                # the input process sends the flows in frames (lists of
+                # msgs). the msg can be a str only when it's a 'stop' msg
+                # indicating that this module should stop
+                frame = self.profiler_queue.get(timeout=1)
+                # ALYA, DO NOT REMOVE THIS CHECK
+                # without it, there's no way thi module will know it's time to
+                # stop and no new fows are coming
+                if self.check_for_stop_msg(frame):
+                    return 1
+                if frame == "stop":
+                    continue
+            except queue.Empty:
+                # no flows are coming, don't keep the pbar behind
+                self.update_pbar(force=True)
+                continue
+            except Exception:
+                # ValueError is raised when the queue is closed
+                continue
 
-            # now that one flow is processed tell output.py
-            # to update the bar
-            if self.has_pbar:
-                self.notify_observers({"bar": "update"})
+            for msg in frame:
+                if not self.process_msg(msg):
+                    return False
 
             # listen on this channel in case whitelist.conf is changed,
             # we need to process the new changes
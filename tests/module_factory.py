@@ -16,6 +16,8 @@ from modules.update_manager.update_manager import UpdateManager
 from modules.leak_detector.leak_detector import LeakDetector
 from slips_files.core.database.database_manager import DBManager
 from slips_files.core.profiler import Profiler
+from slips_files.core.flow_parser import FlowParser
+from slips_files.core.evidencehandler import EvidenceHandler
 from slips_files.core.output import Output
 from modules.threat_intelligence.threat_intelligence import ThreatIntel
 from modules.threat_intelligence.urlhaus import URLhaus
@@ -226,14 +228,14 @@ class ModuleFactory:
                 6379,
                 self.dummy_termination_event,
                 is_input_done=dummy_semaphore,
-                profiler_queue=self.profiler_queue,
+                profiler_queues=[self.profiler_queue],
                 input_type=input_type,
                 input_information=input_information,
                 cli_packet_filter=None,
                 zeek_or_bro=check_zeek_or_bro(),
                 zeek_dir=zeek_tmp_dir,
                 line_type=line_type,
-                is_profiler_done_event=self.dummy_termination_event,
+                is_profiler_done_events=[self.dummy_termination_event],
             )
         input.db.rdb = mock_db
         input.is_done_processing = do_nothing
@@ -301,6 +303,32 @@ class ModuleFactory:
         profiler.db = mock_db
         return profiler
 
+    def create_flow_parser_obj(self, mock_db):
+        flow_parser = FlowParser(
+            self.logger,
+            "output/",
+            6379,
+            self.dummy_termination_event,
+            parser_queue=Queue(),
+            profiler_queues=[Queue(), Queue()],
+            is_parser_done_event=Event(),
+            is_profiler_done_events=[Event(), Event()],
+        )
+        flow_parser.print = do_nothing
+        flow_parser.db = mock_db
+        return flow_parser
+
+    def create_evidence_handler_obj(self, mock_db):
+        evidence_handler = EvidenceHandler(
+            self.logger,
+            "output/",
+            6379,
+            self.dummy_termination_event,
+        )
+        evidence_handler.print = do_nothing
+        evidence_handler.db = mock_db
+        return evidence_handler
+
     def create_redis_manager_obj(self, main):
         return RedisManager(main)
 
@@ -1,8 +1,11 @@
 import redis
 import os
 import json
+import threading
 import time
 import pytest
+import sqlite3
+from unittest.mock import Mock
 
 from slips_files.common.slips_utils import utils
 from slips_files.core.flows.zeek import Conn
@@ -93,19 +96,19 @@ def test_add_ips():
     db.add_new_tw(profileid, "timewindow1", 0.0)
     # make sure ip is added
     assert db.add_ips(profileid, twid, flow, "Server") is True
-    hash_id = f"{profileid}_{twid}"
-    stored_dstips = db.r.hget(hash_id, "SrcIPs")
-    assert stored_dstips == '{"192.168.1.1": 1}'
+    stored_srcips = db.get_srcips_from_profile_tw(profileid, twid)
+    assert stored_srcips == '{"192.168.1.1": 1}'
 
 
 def test_add_port():
     new_flow = flow
     new_flow.state = "Not Established"
     db.add_port(profileid, twid, flow, "Server", "Dst")
-    hash_key = f"{profileid}_{twid}"
-    added_ports = db.r.hgetall(hash_key)
-    assert "DstPortsServerTCPNot Established" in added_ports.keys()
-    assert flow.daddr in added_ports["DstPortsServerTCPNot Established"]
+    added_ports = db.get_data_from_profile_tw(
+        profileid, twid, "Dst", "Not Established", "TCP", "Server", "Ports"
+    )
+    assert str(flow.dport) in added_ports
+    assert flow.daddr in added_ports[str(flow.dport)]["srcips"]
 
 
 def test_set_evidence():
@@ -157,6 +160,27 @@ def test_subscribe():
     assert type(db.subscribe("tw_modified")) == redis.client.PubSub
 
 
+def test_subscribe_shared_pubsub():
+    pubsub = db.subscribe("new_ip")
+    # the channels of a module share the same pubsub
+    assert db.subscribe("tw_closed") is pubsub
+    assert db.subscribe("new_alert", shared=False) is not pubsub
+    # except the high volume channels
+    assert db.subscribe("new_flow") is not pubsub
+
+    # drop the msgs published by other tests
+    while db.get_message(pubsub, timeout=0.1):
+        pass
+
+    db.publish("tw_closed", "tw")
+    db.publish("new_ip", "ip")
+    received = []
+    while msg := db.get_message(pubsub, timeout=0.1):
+        if msg["type"] == "message":
+            received.append((msg["channel"], msg["data"]))
+    assert received == [("tw_closed", "tw"), ("new_ip", "ip")]
+
+
 def test_profile_moddule_labels():
     """tests set and get_profile_module_label"""
     module_label = "malicious"
@@ -247,3 +271,448 @@ def test_update_max_threat_level(
     assert (
         db.update_max_threat_level(profileid, cur_threat_level) == expected_max
     )
+
+
+def test_pipeline():
+    profileid_ = "profile_192.168.1.10"
+    twid_ = "timewindow3"
+    db.start_pipeline()
+    db.update_times_contacted("8.8.8.8", "Dst", profileid_, twid_)
+    # buffered writes are not sent until the pipeline is flushed
+    assert db.get_dstips_from_profile_tw(profileid_, twid_) is None
+    db.flush_pipeline()
+    assert db.get_dstips_from_profile_tw(profileid_, twid_) == (
+        '{"8.8.8.8": 1}'
+    )
+    # writes are sent right away when there's no pipeline
+    db.update_times_contacted("8.8.8.8", "Dst", profileid_, twid_)
+    assert db.get_dstips_from_profile_tw(profileid_, twid_) == (
+        '{"8.8.8.8": 2}'
+    )
+
+
+def test_get_data_from_profile_tw_ports():
+    profileid_ = "profile_192.168.1.11"
+    twid_ = "timewindow1"
+    conn = Conn(
+        "1601998398.945854",
+        "uid1",
+        "192.168.1.11",
+        "8.8.8.8",
+        5,
+        "TCP",
+        "",
+        1234,
+        443,
+        10,
+        20,
+        4,
+        6,
+        "",
+        "",
+        "S0",
+        "",
+    )
+    db.add_port(profileid_, twid_, conn, "Client", "Dst")
+    conn.uid = "uid2"
+    db.add_port(profileid_, twid_, conn, "Client", "Dst")
+
+    ports = db.get_data_from_profile_tw(
+        profileid_, twid_, "Dst", "Not Established", "TCP", "Client", "Ports"
+    )
+    assert ports == {
+        "443": {
+            "totalflows": 2,
+            "totalpkt": 60,
+            "totalbytes": 20,
+            "dstips": {
+                "8.8.8.8": {
+                    "pkts": 60,
+                    "spkts": 20,
+                    "stime": "1601998398.945854",
+                    "uid": ["uid1", "uid2"],
+                }
+            },
+        }
+    }
+
+
+def test_get_data_from_profile_tw_ips():
+    profileid_ = "profile_192.168.1.12"
+    twid_ = "timewindow1"
+    conn = Conn(
+        "1601998398.945854",
+        "uid1",
+        "192.168.1.12",
+        "8.8.8.8",
+        5,
+        "UDP",
+        "",
+        1234,
+        53,
+        10,
+        20,
+        4,
+        6,
+        "",
+        "",
+        "S0",
+        "",
+    )
+    db.add_ips(profileid_, twid_, conn, "Client")
+    conn.uid = "uid2"
+    conn.dport = 123
+    db.add_ips(profileid_, twid_, conn, "Client")
+
+    ips = db.get_data_from_profile_tw(
+        profileid_, twid_, "Dst", "Not Established", "UDP", "Client", "IPs"
+    )
+    assert ips == {
+        "8.8.8.8": {
+            "totalflows": 2,
+            "totalpkt": 60,
+            "totalbytes": 20,
+            "stime": "1601998398.945854",
+            "uid": ["uid1", "uid2"],
+            "dstports": {"53": 10, "123": 10},
+        }
+    }
+
+
+def test_get_timewindow_cache(monkeypatch):
+    db.rdb.invalidate_tw_cache()
+    db.r.hset("analysis", "file_start", 1000)
+    add_new_tw = Mock()
+    monkeypatch.setattr(db.rdb, "add_new_tw", add_new_tw)
+    monkeypatch.setattr(db.rdb, "width", 100)
+
+    assert db.get_timewindow(1050, profileid) == "timewindow1"
+    assert db.get_timewindow(1099, profileid) == "timewindow1"
+    assert db.get_timewindow(1100, profileid) == "timewindow2"
+    # the db is only touched when a new tw is opened
+    assert add_new_tw.call_count == 2
+    add_new_tw.assert_called_with(profileid, "timewindow2", 1100)
+
+    db.invalidate_tw_cache(profileid, "timewindow2")
+    db.get_timewindow(1100, profileid)
+    assert add_new_tw.call_count == 3
+
+
+def test_get_timewindow_sets_the_missing_file_start(monkeypatch):
+    db.rdb.invalidate_tw_cache()
+    db.r.hdel("analysis", "file_start")
+    monkeypatch.setattr(db.rdb, "add_new_tw", Mock())
+    monkeypatch.setattr(db.rdb, "width", 100)
+
+    assert db.get_timewindow(1050, profileid) == "timewindow1"
+    # another profiler worker already set it
+    db.r.hset("analysis", "file_start", 1000)
+    db.rdb.invalidate_tw_cache()
+    assert db.get_timewindow(1050, profileid) == "timewindow1"
+    assert db.get_timewindow(1150, profileid) == "timewindow2"
+    # the first flow that reaches the db sets it, the rest use it
+    db.r.hdel("analysis", "file_start")
+    db.rdb.invalidate_tw_cache()
+    db.get_timewindow(1150, profileid)
+    assert db.get_timewindow(1050, profileid) == "timewindow0"
+    assert float(db.r.hget("analysis", "file_start")) == 1150
+
+
+def test_get_timewindow_cache_only_one_tw(monkeypatch):
+    db.rdb.invalidate_tw_cache()
+    add_new_tw = Mock()
+    monkeypatch.setattr(db.rdb, "add_new_tw", add_new_tw)
+    monkeypatch.setattr(db.rdb, "width", 9999999999)
+    hundred_years = 31536000 * 100
+
+    db.get_timewindow(hundred_years + 50, profileid)
+    db.get_timewindow(hundred_years + 60, profileid)
+    assert add_new_tw.call_count == 1
+    # a flow from the past moves the start of the tw
+    assert db.get_timewindow(hundred_years + 10, profileid) == "timewindow1"
+    assert add_new_tw.call_count == 2
+    add_new_tw.assert_called_with(profileid, "timewindow1", 10)
+
+
+def test_sqlite_buffered_flows(monkeypatch):
+    monkeypatch.setattr(db.sqlite, "flush_size", 3)
+    monkeypatch.setattr(db.sqlite, "flush_interval", 1000)
+    db.sqlite.flush_buffer()
+    db.sqlite.delete("flows", "uid LIKE 'buffered%'")
+    flows_count = db.sqlite.get_flows_count()
+    # the flows are written by another connection, like other slips
+    # processes would read them
+    other_conn = sqlite3.connect(db.sqlite.get_db_path())
+
+    def count_flows_on_disk() -> int:
+        return other_conn.execute("SELECT COUNT(*) FROM flows").fetchone()[0]
+
+    for uid in ("buffered1", "buffered2"):
+        flow.uid = uid
+        db.sqlite.add_flow(flow, profileid, twid)
+    assert count_flows_on_disk() == flows_count
+    # the 3rd flow fills the buffer
+    flow.uid = "buffered3"
+    db.sqlite.add_flow(flow, profileid, twid)
+    assert count_flows_on_disk() == flows_count + 3
+
+    # reads done by the writing process see the buffered flows
+    flow.uid = "buffered4"
+    db.sqlite.add_flow(flow, profileid, twid)
+    assert "buffered4" in db.sqlite.get_all_flows_in_profileid_twid(
+        profileid, twid
+    )
+    other_conn.close()
+    flow.uid = "1234"
+
+
+def test_mark_profile_tw_as_modified():
+    db.rdb.flush_modified_tws()
+    pubsub = db.subscribe(
+        "tw_modified", ignore_subscribe_messages=False, shared=False
+    )
+    profileid_tw = f"{profileid}_{twid}"
+    db.r.zrem("ModifiedTW", profileid_tw)
+
+    db.mark_profile_tw_as_modified(profileid, twid, "")
+    db.mark_profile_tw_as_modified(profileid, twid, "")
+    # the modifications are coalesced until the next tick
+    assert db.r.zscore("ModifiedTW", profileid_tw) is None
+    db.rdb.modified_tws_timer.cancel()
+
+    db.flush_modified_tws()
+    assert db.r.zscore("ModifiedTW", profileid_tw) is not None
+    published = []
+    while msg := db.get_message(pubsub, timeout=0.1):
+        if msg["type"] == "message":
+            published.append(msg["data"])
+    assert published == [f"{profileid}:{twid}"]
+
+
+def test_archive_closed_tws():
+    archived_profileid = "profile_10.0.0.9"
+    for tw_number in (1, 2):
+        tw = f"timewindow{tw_number}"
+        db.r.zadd(f"tws{archived_profileid}", {tw: tw_number * 3600})
+        db.r.hset(f"{archived_profileid}_{tw}", "OutTuples", "{}")
+        db.r.zadd(f"{archived_profileid}_{tw}_timeline", {"flow": 1.0})
+        db.r.hset(f"{archived_profileid}_{tw}_evidence", "id", "evidence")
+        db.mark_profile_tw_as_closed(f"{archived_profileid}_{tw}")
+
+    db.rdb.closed_tws_to_keep = 1
+    try:
+        assert db.archive_closed_tws() == 1
+    finally:
+        db.rdb.closed_tws_to_keep = 0
+
+    # only the oldest closed tw is archived
+    assert db.is_tw_archived(archived_profileid, "timewindow1")
+    assert not db.is_tw_archived(archived_profileid, "timewindow2")
+    assert not db.r.exists(f"{archived_profileid}_timewindow1_timeline")
+    assert db.r.exists(f"{archived_profileid}_timewindow2_timeline")
+    # the archived tw is only listed in the sqlite db
+    assert db.r.zscore(f"tws{archived_profileid}", "timewindow1") is None
+    assert db.r.zscore(f"tws{archived_profileid}", "timewindow2")
+
+    archived = db.get_archived_tw(archived_profileid, "timewindow1")
+    assert archived == {
+        f"{archived_profileid}_timewindow1": ("hash", {"OutTuples": "{}"}),
+        f"{archived_profileid}_timewindow1_timeline": (
+            "zset",
+            {"flow": 1.0},
+        ),
+        f"{archived_profileid}_timewindow1_evidence": (
+            "hash",
+            {"id": "evidence"},
+        ),
+    }
+
+
+def test_was_ip_contacted():
+    profileid_ = "profile_192.168.1.12"
+    twid_ = "timewindow1"
+    db.update_times_contacted("8.8.8.8", "Dst", profileid_, twid_)
+    # ips that contacted the profile aren't contacted by it
+    db.update_times_contacted("1.1.1.1", "Src", profileid_, twid_)
+
+    assert db.was_ip_contacted(profileid_, twid_, "8.8.8.8")
+    assert not db.was_ip_contacted(profileid_, twid_, "1.1.1.1")
+    assert not db.was_ip_contacted(profileid_, "timewindow2", "8.8.8.8")
+    assert db.was_any_ip_contacted(profileid_, twid_, ["1.1.1.1", "8.8.8.8"])
+    assert not db.was_any_ip_contacted(profileid_, twid_, ["1.1.1.1"])
+    assert not db.was_any_ip_contacted(profileid_, twid_, [])
+
+
+def test_set_dns_resolution_caps_the_domains_of_each_ip():
+    ip = "93.184.216.40"
+    max_domains = db.rdb.max_domains_per_resolution
+    for i in range(max_domains + 5):
+        db.set_dns_resolution(
+            f"domain{i}.com", [ip], 1000.0 + i, "uid", "A", "192.168.1.1"
+        )
+
+    domains = db.get_dns_resolution(ip)["domains"]
+    assert len(domains) == max_domains
+    # the oldest domains are dropped
+    assert "domain0.com" not in domains
+    assert domains[-1] == f"domain{max_domains + 4}.com"
+    assert db.get_dns_resolution(ip)["resolved-by"] == ["192.168.1.1"]
+
+
+def test_dns_resolutions_expire_after_their_ttl():
+    ip = "93.184.216.41"
+    ts = 2000.0
+    db.set_dns_resolution(
+        "example.org", [ip], ts, "uid", "A", "192.168.1.1", ttls=[300.0]
+    )
+    assert db.has_dns_resolution(ip)
+    assert db.is_ip_resolved(ip, 24)
+    assert db.is_ip_resolved(ip, 1, ts + 300 + 3600)
+    assert not db.is_ip_resolved(ip, 1, ts + 300 + 3601)
+
+    retention = db.rdb.dns_resolution_retention
+    db.delete_expired_dns_resolutions(ts + 300 + retention + 1)
+    assert not db.has_dns_resolution(ip)
+    assert not db.is_ip_resolved(ip, 24)
+    assert db.get_dns_resolution(ip) == {}
+
+
+def test_sqlite_flush_buffer_writes_under_the_flush_lock(monkeypatch):
+    db.sqlite.flush_buffer()
+    locked_while_writing = []
+    monkeypatch.setattr(
+        db.sqlite,
+        "executemany",
+        lambda writes: locked_while_writing.append(
+            db.sqlite.flush_lock.locked()
+        ),
+    )
+    monkeypatch.setattr(db.sqlite, "flush_interval", 1000)
+    db.sqlite.buffer_write("SELECT ?", (1,))
+    db.sqlite.flush_buffer()
+    # another flush can't commit a newer batch before this one
+    assert locked_while_writing == [True]
+
+
+def test_sqlite_flush_buffer_keeps_the_order_of_the_writes(monkeypatch):
+    monkeypatch.setattr(db.sqlite, "flush_interval", 1000)
+    db.sqlite.execute("CREATE TABLE IF NOT EXISTS ordered_writes (n INTEGER)")
+    db.sqlite.execute("DELETE FROM ordered_writes")
+    insert = "INSERT INTO ordered_writes VALUES (?)"
+    db.sqlite.buffer_write(insert, (1,))
+    db.sqlite.buffer_write("DELETE FROM ordered_writes WHERE n = ?", (1,))
+    db.sqlite.buffer_write(insert, (1,))
+    db.sqlite.flush_buffer()
+
+    assert db.sqlite.select("ordered_writes") == [(1,)]
+
+
+def test_sqlite_flush_buffer_retries_while_the_db_is_locked(monkeypatch):
+    cursor = Mock()
+    cursor.executemany.side_effect = [
+        sqlite3.OperationalError("database is locked"),
+        sqlite3.OperationalError("database is locked"),
+        None,
+    ]
+    monkeypatch.setattr(db.sqlite, "cursor", cursor)
+    monkeypatch.setattr(db.sqlite, "conn", Mock())
+    monkeypatch.setattr(
+        "slips_files.core.database.sqlite_db.database.sleep", Mock()
+    )
+    db.sqlite.executemany([("INSERT INTO flows VALUES (?)", (1,))])
+
+    assert cursor.executemany.call_count == 3
+    db.sqlite.conn.commit.assert_called_once()
+
+
+def test_pipeline_is_per_thread():
+    profileid_ = "profile_192.168.1.13"
+    twid_ = "timewindow1"
+    db.start_pipeline()
+    # e.g. a timer writing while a flow's pipeline is open
+    other_thread = threading.Thread(
+        target=db.update_times_contacted,
+        args=("1.1.1.1", "Dst", profileid_, twid_),
+    )
+    other_thread.start()
+    other_thread.join()
+    # the write of the other thread was sent right away
+    assert db.get_dstips_from_profile_tw(profileid_, twid_) == (
+        '{"1.1.1.1": 1}'
+    )
+    db.update_times_contacted("8.8.8.8", "Dst", profileid_, twid_)
+    assert "8.8.8.8" not in db.get_dstips_from_profile_tw(profileid_, twid_)
+    db.flush_pipeline()
+    assert "8.8.8.8" in db.get_dstips_from_profile_tw(profileid_, twid_)
+
+
+def test_get_timewindow_cache_is_bounded(monkeypatch):
+    db.rdb.invalidate_tw_cache()
+    db.r.hset("analysis", "file_start", 1000)
+    monkeypatch.setattr(db.rdb, "add_new_tw", Mock())
+    monkeypatch.setattr(db.rdb, "width", 100)
+    monkeypatch.setattr(db.rdb, "max_registered_tws", 2)
+
+    for ip in ("1.1.1.1", "2.2.2.2", "3.3.3.3"):
+        db.get_timewindow(1050, f"profile_{ip}")
+    assert list(db.rdb.registered_tws) == [
+        ("profile_2.2.2.2", "timewindow1"),
+        ("profile_3.3.3.3", "timewindow1"),
+    ]
+
+
+def test_get_timewindow_cache_drops_closed_and_archived_tws(monkeypatch):
+    db.rdb.invalidate_tw_cache()
+    db.r.hset("analysis", "file_start", 1000)
+    monkeypatch.setattr(db.rdb, "add_new_tw", Mock())
+    monkeypatch.setattr(db.rdb, "width", 100)
+    db.get_timewindow(1050, "profile_4.4.4.4")
+    db.get_timewindow(1050, "profile_5.5.5.5")
+
+    db.mark_profile_tw_as_closed("profile_4.4.4.4_timewindow1")
+    assert ("profile_4.4.4.4", "timewindow1") not in db.rdb.registered_tws
+
+    db.rdb.check_archived_tws()
+    # another process archived some tws
+    db.r.incr("ArchivedTWsVersion")
+    db.rdb.check_archived_tws()
+    assert not db.rdb.registered_tws
+
+
+def test_archive_tw_exports_the_registered_aggregates():
+    profileid_ = "profile_10.0.0.10"
+    twid_ = "timewindow1"
+    db.update_times_contacted("8.8.8.8", "Dst", profileid_, twid_)
+
+    exported = db.rdb.archive_tw(profileid_, twid_)
+
+    assert exported[f"{profileid_}_{twid_}_DstIPs"] == (
+        "hash",
+        {"8.8.8.8": "1"},
+    )
+    assert exported[f"{profileid_}_{twid_}_aggregates"] == (
+        "set",
+        ["DstIPs"],
+    )
+    assert not db.r.exists(f"{profileid_}_{twid_}_DstIPs")
+
+
+def test_archive_tw_modified_while_exporting(monkeypatch):
+    profileid_ = "profile_10.0.0.11"
+    twid_ = "timewindow1"
+    db.r.zadd(f"tws{profileid_}", {twid_: 3600})
+    db.r.zadd(f"{profileid_}_{twid_}_timeline", {"flow": 1.0})
+    db.mark_profile_tw_as_closed(f"{profileid_}_{twid_}")
+    export_keys = db.rdb.export_keys
+
+    def export_then_write(keys):
+        exported = export_keys(keys)
+        # e.g. a late flow of this tw
+        db.r.zadd(f"{profileid_}_{twid_}_timeline", {"late_flow": 2.0})
+        return exported
+
+    monkeypatch.setattr(db.rdb, "export_keys", export_then_write)
+    assert db.rdb.archive_tw(profileid_, twid_) is None
+    # nothing was deleted, the tw is archived in a later call
+    assert db.r.zscore(f"{profileid_}_{twid_}_timeline", "late_flow")
+    assert db.r.sismember("ClosedTW", f"{profileid_}_{twid_}")
@@ -67,8 +67,11 @@ def test_is_cname_contacted(
 ):
     dns = ModuleFactory().create_dns_analyzer_obj(mock_db)
     mock_db.get_domain_resolution.return_value = cname_resolution
+    mock_db.was_any_ip_contacted.side_effect = (
+        lambda profileid_, twid_, ips: any(ip in contacted_ips for ip in ips)
+    )
 
-    assert dns.is_cname_contacted(answers, contacted_ips) is expected_result
+    assert dns.is_cname_contacted(answers, profileid, twid) is expected_result
 
 
 @pytest.mark.parametrize(
@@ -141,7 +144,7 @@ def test_extract_ips_from_dns_answers(mock_db):
     [  # Testcase1: Connection exists from other IP version
         (["8.8.8.8"], ["192.168.1.2"], True),
         # Testcase2: No connection from other IP version
-        (["1.1.1.1"], ["192.168.1.2"], None),
+        (["1.1.1.1"], ["192.168.1.2"], False),
         # Testcase3: No contacted IPs from other IP version
         ([], ["192.168.1.2"], False),
         # Testcase4: No other IP version found
@@ -154,8 +157,8 @@ def test_is_connection_made_by_different_version(
     dns = ModuleFactory().create_dns_analyzer_obj(mock_db)
     mocker.patch.object(
         dns.db,
-        "get_all_contacted_ips_in_profileid_twid",
-        return_value=contacted_ips,
+        "was_ip_contacted",
+        side_effect=lambda profileid_, twid_, ip: ip in contacted_ips,
     )
     mocker.patch.object(
         dns.db, "get_the_other_ip_version", return_value=other_ip
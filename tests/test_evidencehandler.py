@@ -0,0 +1,83 @@
+import json
+from uuid import uuid4
+
+from tests.module_factory import ModuleFactory
+from slips_files.core.evidence_structure.evidence import (
+    Attacker,
+    Direction,
+    Evidence,
+    EvidenceType,
+    IDEACategory,
+    IoCType,
+    ProfileID,
+    ThreatLevel,
+    TimeWindow,
+    evidence_to_dict,
+)
+
+
+def create_evidence(attacker_direction=Direction.SRC) -> Evidence:
+    return Evidence(
+        evidence_type=EvidenceType.ARP_SCAN,
+        description="ARP scan detected",
+        attacker=Attacker(
+            direction=attacker_direction,
+            attacker_type=IoCType.IP,
+            value="192.168.1.1",
+        ),
+        threat_level=ThreatLevel.LOW,
+        category=IDEACategory.ANOMALY_TRAFFIC,
+        profile=ProfileID(ip="192.168.1.1"),
+        timewindow=TimeWindow(number=1),
+        uid=[str(uuid4())],
+        timestamp="2023/10/26 10:10:10.000000+0000",
+        id=str(uuid4()),
+        confidence=1.0,
+    )
+
+
+def test_get_tw_evidence_from_db(mock_db):
+    evidence_handler = ModuleFactory().create_evidence_handler_obj(mock_db)
+    alerted = create_evidence()
+    pending = create_evidence()
+    done_by_others = create_evidence(attacker_direction=Direction.DST)
+    mock_db.get_accumulated_threat_level.return_value = 0.5
+    mock_db.get_profileid_twid_alerts.return_value = {
+        "alert_id": json.dumps([alerted.id])
+    }
+    mock_db.get_twid_evidence.return_value = {
+        evidence.id: json.dumps(evidence_to_dict(evidence))
+        for evidence in (alerted, pending, done_by_others)
+    }
+    mock_db.is_whitelisted_evidence.return_value = False
+    mock_db.is_evidence_processed.return_value = True
+
+    tw_evidence = evidence_handler.get_tw_evidence(
+        "profile_192.168.1.1", "timewindow1"
+    )
+    assert list(tw_evidence.evidence) == [pending.id]
+    assert tw_evidence.alerted_ids == {alerted.id}
+    assert tw_evidence.accumulated_threat_level == 0.5
+
+    # the second time it's read from memory
+    mock_db.get_twid_evidence.reset_mock()
+    assert (
+        evidence_handler.get_tw_evidence("profile_192.168.1.1", "timewindow1")
+        is tw_evidence
+    )
+    mock_db.get_twid_evidence.assert_not_called()
+
+
+def test_handle_tw_closed(mock_db):
+    evidence_handler = ModuleFactory().create_evidence_handler_obj(mock_db)
+    mock_db.get_accumulated_threat_level.return_value = 0
+    mock_db.get_profileid_twid_alerts.return_value = {}
+    mock_db.get_twid_evidence.return_value = {}
+    evidence_handler.separator = "_"
+
+    evidence_handler.get_tw_evidence("profile_192.168.1.1", "timewindow1")
+    evidence_handler.get_tw_evidence("profile_192.168.1.1", "timewindow2")
+    evidence_handler.handle_tw_closed("profile_192.168.1.1_timewindow1")
+    assert list(evidence_handler.tw_evidence) == [
+        ("profile_192.168.1.1", "timewindow2")
+    ]
@@ -0,0 +1,51 @@
+"""Unit test for slips_files/common/flow_encoding.py"""
+
+from slips_files.common.flow_encoding import (
+    encode_new_flow,
+    decode_new_flow,
+    NEW_FLOW_FIELDS,
+)
+
+
+def test_encode_decode_new_flow():
+    flow = {
+        "ts": 1635765895.037696,
+        "dur": 1.5,
+        "saddr": "192.168.1.1",
+        "sport": 5353,
+        "daddr": "2001:db8::1",
+        "dport": 443,
+        "proto": "tcp",
+        "origstate": "SF",
+        "state": "Established",
+        "pkts": 10,
+        "allbytes": 1024,
+        "spkts": 5,
+        "sbytes": 512,
+        "appproto": "ssl",
+        "smac": "",
+        "dmac": "",
+        "label": "benign",
+        "flow_type": "conn",
+        "module_labels": {},
+    }
+    assert set(flow) == set(NEW_FLOW_FIELDS)
+    encoded: str = encode_new_flow(
+        "profile_192.168.1.1", "timewindow1", "CAeDWs37BipkfP21u8", flow
+    )
+    assert decode_new_flow(encoded) == {
+        "profileid": "profile_192.168.1.1",
+        "twid": "timewindow1",
+        "uid": "CAeDWs37BipkfP21u8",
+        "stime": 1635765895.037696,
+        "flow": flow,
+    }
+
+
+def test_decode_new_flow_missing_fields():
+    encoded: str = encode_new_flow(
+        "profile_192.168.1.1", "timewindow1", "uid", {"ts": 1, "dport": 80}
+    )
+    flow: dict = decode_new_flow(encoded)["flow"]
+    assert flow["dport"] == 80
+    assert flow["appproto"] is None
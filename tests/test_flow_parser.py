@@ -0,0 +1,115 @@
+"""Unit test for slips_files/core/flow_parser.py"""
+
+from unittest.mock import Mock
+
+from tests.module_factory import ModuleFactory
+
+CONN_FIELDS = (
+    "#fields\tts\tuid\tid.orig_h\tid.orig_p\tid.resp_h\tid.resp_p\t"
+    "proto\tservice\tduration\torig_bytes\tresp_bytes\tconn_state\n"
+)
+CONN_TYPES = (
+    "#types\ttime\tstring\taddr\tport\taddr\tport\t"
+    "enum\tstring\tinterval\tcount\tcount\tstring\n"
+)
+
+
+def get_conn_line(saddr: str) -> str:
+    return (
+        f"1601998366.785\tCNgrt\t{saddr}\t5353\t224.0.0.251\t5353\t"
+        f"udp\tdns\t0.1\t10\t0\tS0\n"
+    )
+
+
+def get_msg(data: str, **kwargs) -> dict:
+    return {
+        "line": {"type": "zeek_files/conn.log", "data": data},
+        "input_type": "zeek_folder",
+        **kwargs,
+    }
+
+
+def test_parse_msg(mock_db):
+    flow_parser = ModuleFactory().create_flow_parser_obj(mock_db)
+    # the headers are broadcast to all workers, they aren't sent on
+    assert flow_parser.parse_msg(get_msg(CONN_FIELDS, broadcast=True)) is None
+    assert flow_parser.parse_msg(get_msg(CONN_TYPES, broadcast=True)) is None
+
+    parsed = flow_parser.parse_msg(
+        get_msg(get_conn_line("192.168.1.1"), total_flows=10)
+    )
+    assert parsed["input_type"] == "zeek-tabs"
+    assert parsed["total_flows"] == 10
+    assert parsed["flow"].saddr == "192.168.1.1"
+    assert parsed["flow"].dport == 5353
+
+    # the total flows are only sent once
+    parsed = flow_parser.parse_msg(get_msg(get_conn_line("192.168.1.2")))
+    assert "total_flows" not in parsed
+
+
+def test_parse_msg_decodes_zeek_json_lines(mock_db):
+    flow_parser = ModuleFactory().create_flow_parser_obj(mock_db)
+    # the input process sends the zeek json lines undecoded
+    line = (
+        '{"ts":1601998366.785,"uid":"CNgrt","id.orig_h":"192.168.1.1",'
+        '"id.orig_p":5353,"id.resp_h":"224.0.0.251","id.resp_p":5353,'
+        '"proto":"udp","service":"dns","conn_state":"S0"}\n'
+    )
+    parsed = flow_parser.parse_msg(get_msg(line))
+    assert parsed["input_type"] == "zeek"
+    assert parsed["flow"].saddr == "192.168.1.1"
+    assert parsed["flow"].starttime == 1601998366.785
+
+    # corrupted lines aren't flows
+    parsed = flow_parser.parse_msg(get_msg('{"ts":1601998366.785,"uid'))
+    assert not parsed["flow"]
+
+
+def test_parse_frame_sends_flows_to_their_profiler(mock_db):
+    flow_parser = ModuleFactory().create_flow_parser_obj(mock_db)
+    flow_parser.profiler_queues = [Mock(), Mock()]
+    saddrs = [f"192.168.1.{i}" for i in range(10)]
+    frame = [
+        get_msg(CONN_FIELDS, broadcast=True),
+        get_msg(CONN_TYPES, broadcast=True),
+    ] + [get_msg(get_conn_line(saddr)) for saddr in saddrs]
+    flow_parser.parse_frame(frame)
+
+    sent = 0
+    for worker_id, profiler_queue in enumerate(flow_parser.profiler_queues):
+        for call in profiler_queue.put.call_args_list:
+            parsed_frame = call.args[0]
+            for msg in parsed_frame:
+                assert (
+                    flow_parser.get_profiler_worker(msg["flow"]) == worker_id
+                )
+            sent += len(parsed_frame)
+    assert sent == len(saddrs)
+
+
+def test_stop_profilers(mock_db):
+    flow_parser = ModuleFactory().create_flow_parser_obj(mock_db)
+    flow_parser.profiler_queues = [Mock(), Mock()]
+    for event in flow_parser.is_profiler_done_events:
+        event.set()
+
+    flow_parser.stop_profilers()
+
+    for profiler_queue in flow_parser.profiler_queues:
+        profiler_queue.put.assert_called_once_with("stop")
+    assert flow_parser.is_parser_done_event.is_set()
+
+
+def test_main_stops_on_stop_msg(mock_db):
+    flow_parser = ModuleFactory().create_flow_parser_obj(mock_db)
+    flow_parser.parser_queue = Mock()
+    flow_parser.parser_queue.get.side_effect = [
+        [get_msg(CONN_FIELDS, broadcast=True)],
+        "stop",
+    ]
+    flow_parser.stop_profilers = Mock()
+
+    assert flow_parser.main() == 1
+    flow_parser.stop_profilers.assert_called_once()
+    assert flow_parser.parsed_lines == 1
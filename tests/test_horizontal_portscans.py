@@ -488,11 +488,7 @@ def test_get_resolved_ips(mock_db):
     horizontal_ps = ModuleFactory().create_horizontal_portscan_obj(mock_db)
     dstips = ["1.1.1.1", "2.2.2.2", "3.3.3.3"]
 
-    mock_db.get_dns_resolution.side_effect = [
-        {"domains": ["example.com"]},
-        {"domains": []},
-        {"domains": ["test.com", "another.com"]},
-    ]
+    mock_db.has_dns_resolution.side_effect = [True, False, True]
 
     resolved_ips = horizontal_ps.get_resolved_ips(dstips)
     assert sorted(resolved_ips) == ["1.1.1.1", "3.3.3.3"]
@@ -509,11 +505,7 @@ def test_get_resolved_ips_empty_list(mock_db):
 def test_get_resolved_ips_invalid_ip(mock_db):
     horizontal_ps = ModuleFactory().create_horizontal_portscan_obj(mock_db)
     dstips = ["1.1.1.1", "256.256.256.256", "3.3.3.3"]
-    mock_db.get_dns_resolution.side_effect = [
-        {"domains": ["example.com"]},
-        {},
-        {"domains": ["test.com"]},
-    ]
+    mock_db.has_dns_resolution.side_effect = [True, False, True]
 
     resolved_ips = horizontal_ps.get_resolved_ips(dstips)
     assert sorted(resolved_ips) == ["1.1.1.1", "3.3.3.3"]
@@ -522,11 +514,7 @@ def test_get_resolved_ips_invalid_ip(mock_db):
 def test_get_resolved_ips_mixed_list(mock_db):
     horizontal_ps = ModuleFactory().create_horizontal_portscan_obj(mock_db)
     dstips = ["1.1.1.1", "2.2.2.2", "3.3.3.3"]
-    mock_db.get_dns_resolution.side_effect = [
-        {"domains": ["example.com"]},
-        {"domains": []},
-        {"domains": ["test.com"]},
-    ]
+    mock_db.has_dns_resolution.side_effect = [True, False, True]
     resolved_ips = horizontal_ps.get_resolved_ips(dstips)
     assert sorted(resolved_ips) == ["1.1.1.1", "3.3.3.3"]
 
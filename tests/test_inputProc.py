@@ -1,7 +1,9 @@
 import pytest
 from tests.module_factory import ModuleFactory
-from unittest.mock import patch
+from slips_files.common.slips_utils import utils
+from unittest.mock import patch, Mock
 
+import heapq
 import shutil
 import os
 import json
@@ -73,8 +75,8 @@ def test_handle_zeek_log_file(input_information, mock_db, expected_output):
 @pytest.mark.parametrize(
     "path, is_tabs, line_cached",
     [
-        # sllips shouldn't be able to cache teh first line as it's a comment
-        ("dataset/test10-mixed-zeek-dir/conn.log", True, False),
+        # the header is skipped and the first flow is cached
+        ("dataset/test10-mixed-zeek-dir/conn.log", True, True),
         ("dataset/test9-mixed-zeek-dir/conn.log", False, True),
     ],
 )
@@ -86,14 +88,25 @@ def test_cache_nxt_line_in_file(
     """
     input = ModuleFactory().create_input_obj(path, "zeek_log_file", mock_db)
     input.cache_lines = {}
-    input.file_time = {}
+    input.file_time = []
+    input.zeek_ts_idx = {}
     input.is_zeek_tabs = is_tabs
+    input.give_profiler = Mock()
 
     assert input.cache_nxt_line_in_file(path) == line_cached
+    if is_tabs:
+        # the #fields and #types are sent to all profilers
+        headers = [
+            call.args[0]["data"].split("\t")[0]
+            for call in input.give_profiler.call_args_list
+        ]
+        assert headers == ["#fields", "#types"]
+        assert input.zeek_ts_idx[path] == 0
     if line_cached:
         assert input.cache_lines[path]["type"] == path
         # make sure it did read 1 line from the file
         assert input.cache_lines[path]["data"]
+        assert input.file_time[0][1] == path
 
 
 @pytest.mark.parametrize(
@@ -127,7 +140,13 @@ def test_get_ts_from_line(
 ):
     input = ModuleFactory().create_input_obj(path, "zeek_log_file", mock_db)
     input.is_zeek_tabs = is_tabs
-    input.get_ts_from_line(zeek_line)
+    timestamp, line = input.get_ts_from_line(zeek_line)
+    if expected_val == (False, False):
+        assert (timestamp, line) == expected_val
+    else:
+        assert timestamp == expected_val
+        # the lines are sent to the profilers undecoded
+        assert line == zeek_line
 
 
 @pytest.mark.parametrize(
@@ -163,7 +182,7 @@ def test_handle_nfdump(path, mock_db):
 
 def test_get_earliest_line(mock_db):
     input = ModuleFactory().create_input_obj("", "zeek_log_file", mock_db)
-    input.file_time = {
+    file_time = {
         "software.log": 3,
         "ssh.log": 2,
         "notice.log": 1,
@@ -172,6 +191,9 @@ def test_get_earliest_line(mock_db):
         "conn.log": 5,
         "dns.log": 6,
     }
+    input.file_time = []
+    for filename, ts in file_time.items():
+        heapq.heappush(input.file_time, (ts, filename))
     input.cache_lines = {
         "software.log": "line3",
         "ssh.log": "line2",
@@ -182,6 +204,72 @@ def test_get_earliest_line(mock_db):
         "dns.log": "line6",
     }
     assert input.get_earliest_line() == ("line1", "notice.log")
+    assert "notice.log" not in input.cache_lines
+    assert input.get_earliest_line() == ("line2", "ssh.log")
+
+
+def test_read_zeek_files_in_ts_order(tmp_path, mock_db):
+    files = {
+        "conn.log": [1, 4, 5],
+        "dns.log": [2, 3, 6],
+        "ssl.log": [],
+    }
+    for filename, timestamps in files.items():
+        with open(tmp_path / filename, "w") as f:
+            for ts in timestamps:
+                f.write(json.dumps({"ts": ts, "file": filename}) + "\n")
+    mock_db.get_all_zeek_files.return_value = {
+        str(tmp_path / filename) for filename in files
+    }
+    input = ModuleFactory().create_input_obj(
+        str(tmp_path), "zeek_folder", mock_db
+    )
+    input.is_zeek_tabs = False
+    input.testing = False
+    input.bro_timeout = 0
+    sent_lines = []
+    input.give_profiler = sent_lines.append
+
+    assert input.read_zeek_files() == 6
+    sent_ts = [json.loads(line["data"])["ts"] for line in sent_lines]
+    assert sent_ts == [1, 2, 3, 4, 5, 6]
+    # the files are only read from the db once
+    mock_db.get_all_zeek_files.assert_called_once()
+
+
+def test_read_zeek_files_polls_the_files_at_eof(tmp_path, mock_db):
+    files = {
+        "conn.log": [1],
+        "dns.log": [2, 6],
+        "ssl.log": [5, 7],
+    }
+    for filename, timestamps in files.items():
+        with open(tmp_path / filename, "w") as f:
+            for ts in timestamps:
+                f.write(json.dumps({"ts": ts}) + "\n")
+    mock_db.get_all_zeek_files.return_value = {
+        str(tmp_path / filename) for filename in files
+    }
+    input = ModuleFactory().create_input_obj(
+        str(tmp_path), "zeek_folder", mock_db
+    )
+    input.is_zeek_tabs = False
+    input.testing = False
+    input.bro_timeout = 0
+    sent_ts = []
+
+    def give_profiler(line):
+        sent_ts.append(json.loads(line["data"])["ts"])
+        if sent_ts == [1, 2]:
+            # zeek appends to conn.log after slips reached its end
+            with open(tmp_path / "conn.log", "a") as f:
+                f.write(json.dumps({"ts": 3}) + "\n")
+
+    input.give_profiler = give_profiler
+    with patch("slips_files.core.input.ZEEK_EOF_POLL_INTERVAL", 0):
+        assert input.read_zeek_files() == 6
+    # conn.log is polled while the other files still have lines
+    assert sent_ts == [1, 2, 3, 5, 6, 7]
 
 
 @pytest.mark.parametrize(
@@ -262,7 +350,8 @@ def test_read_from_stdin(line_type: str, line: str, mock_db):
     with patch.object(input, "stdin", return_value=[line, "done\n"]):
         # this function will give the line to profiler
         assert input.read_from_stdin()
-        line_sent: dict = input.profiler_queue.get()
+        input.flush_frames()
+        line_sent: dict = input.profiler_queues[0].get()[0]
         # in case it's a zeek line, it gets sent as a dict
         expected_received_line = (
             json.loads(line) if line_type == "zeek" else line
@@ -270,3 +359,217 @@ def test_read_from_stdin(line_type: str, line: str, mock_db):
         assert line_sent["line"]["data"] == expected_received_line
         assert line_sent["line"]["line_type"] == line_type
         assert line_sent["input_type"] == "stdin"
+
+
+@pytest.mark.parametrize(
+    "line, input_type, expected_saddr",
+    [
+        (
+            {"type": "conn.log", "data": {"id.orig_h": "192.168.1.1"}},
+            "zeek_folder",
+            "192.168.1.1",
+        ),
+        (
+            {
+                "type": "conn.log",
+                "data": '{"ts":1601998398.945854,"uid":"CWXyrG3ZJNsNr8Qzub",'
+                '"id.orig_h":"10.0.2.15","id.orig_p":59393}',
+            },
+            "zeek_folder",
+            "10.0.2.15",
+        ),
+        (
+            {
+                "type": "conn.log",
+                "data": "1601998398.945854\tCWXyrG3ZJNsNr8Qzub"
+                "\t10.0.2.15\t59393\t8.8.8.8\t53\tudp",
+            },
+            "zeek_folder",
+            "10.0.2.15",
+        ),
+        (
+            {
+                "type": "suricata",
+                "data": '{"timestamp":"2021-06-06T15:57:37.272281+0200",'
+                '"src_ip":"193.46.255.92","src_port":49569}',
+            },
+            "suricata",
+            "193.46.255.92",
+        ),
+        (
+            {
+                "type": "argus",
+                "data": "2019/04/05 16:15:09.194268,0.031142,udp,"
+                "10.8.0.69,8278,  <->,8.8.8.8,53,CON,0,0,2,186,64,1,",
+            },
+            "binetflow",
+            "10.8.0.69",
+        ),
+    ],
+)
+def test_get_saddr_from_line(line, input_type, expected_saddr, mock_db):
+    input = ModuleFactory().create_input_obj("", input_type, mock_db)
+    assert input.get_saddr_from_line(line) == expected_saddr
+
+
+@pytest.mark.parametrize(
+    "line, input_type, expected_starttime",
+    [
+        (
+            {
+                "type": "stdin",
+                "line_type": "zeek",
+                "data": {"ts": 1601998398.945854, "id.orig_h": "10.0.2.15"},
+            },
+            "stdin",
+            1601998398.945854,
+        ),
+        (
+            {
+                "type": "conn.log",
+                "data": '{"ts":1601998398.945854,"uid":"CWXyrG3ZJNsNr8Qzub",'
+                '"id.orig_h":"10.0.2.15","id.orig_p":59393}',
+            },
+            "zeek_folder",
+            1601998398.945854,
+        ),
+        (
+            {
+                "type": "conn.log",
+                "data": "1601998398.945854\tCWXyrG3ZJNsNr8Qzub"
+                "\t10.0.2.15\t59393\t8.8.8.8\t53\tudp",
+            },
+            "zeek_folder",
+            1601998398.945854,
+        ),
+        (
+            {
+                "type": "suricata",
+                "data": '{"timestamp":"2021-06-06T15:57:37.272281+0200",'
+                '"event_type":"flow","src_ip":"193.46.255.92",'
+                '"flow":{"start":"2021-06-06T15:57:30.272281+0200"}}',
+            },
+            "suricata",
+            1622987850.272281,
+        ),
+        (
+            {
+                "type": "suricata",
+                "data": '{"timestamp":"2021-06-06T15:57:37.272281+0200",'
+                '"event_type":"dns","src_ip":"193.46.255.92"}',
+            },
+            "suricata",
+            1622987857.272281,
+        ),
+        (
+            {
+                "type": "conn.log",
+                "data": "CWXyrG3ZJNsNr8Qzub\t10.0.2.15",
+            },
+            "zeek_folder",
+            None,
+        ),
+    ],
+)
+def test_get_starttime_from_line(
+    line, input_type, expected_starttime, mock_db
+):
+    input = ModuleFactory().create_input_obj("", input_type, mock_db)
+    assert input.get_starttime_from_line(line) == expected_starttime
+
+
+def test_get_starttime_from_argus_line(mock_db):
+    input = ModuleFactory().create_input_obj("", "binetflow", mock_db)
+    input.set_argus_columns_idx("Dur,StartTime,Proto,SrcAddr")
+    line = {
+        "type": "argus",
+        "data": "0.031142,2019/04/05 16:15:09.194268,udp,10.8.0.69",
+    }
+    assert input.argus_saddr_idx == 3
+    assert input.get_starttime_from_line(line) == (
+        utils.convert_format("2019/04/05 16:15:09.194268", "unixtimestamp")
+    )
+
+
+def test_give_profiler_sets_the_file_start_once(mock_db):
+    input = ModuleFactory().create_input_obj("", "zeek_folder", mock_db)
+    set_profiler_queues(input, [Mock(), Mock()])
+    header = {"type": "conn.log", "data": "#fields\tts\tuid"}
+    input.give_profiler(header, broadcast=True)
+    # headers aren't flows
+    mock_db.set_input_metadata.assert_not_called()
+
+    for ts in (1000, 900):
+        line = {"type": "conn.log", "data": {"ts": ts, "id.orig_h": "1.1.1.1"}}
+        input.give_profiler(line)
+    # it's set before the first line is sent to any profiler worker
+    mock_db.set_input_metadata.assert_called_once_with({"file_start": 1000})
+
+
+def set_profiler_queues(input, profiler_queues: list):
+    input.profiler_queues = profiler_queues
+    input.frames = [[] for _ in profiler_queues]
+    input.frames_start_time = [0] * len(profiler_queues)
+
+
+def test_give_profiler_to_many_workers(mock_db):
+    input = ModuleFactory().create_input_obj("", "zeek_folder", mock_db)
+    set_profiler_queues(input, [Mock(), Mock(), Mock()])
+    line = {"type": "conn.log", "data": {"id.orig_h": "192.168.1.1"}}
+    for _ in range(5):
+        input.give_profiler(line)
+    input.flush_frames()
+
+    # all flows of the same saddr should go to the same worker
+    frames = [
+        queue.put.call_args[0][0] if queue.put.called else []
+        for queue in input.profiler_queues
+    ]
+    assert sorted(len(frame) for frame in frames) == [0, 0, 5]
+
+
+def test_give_profiler_broadcast(mock_db):
+    input = ModuleFactory().create_input_obj("", "binetflow", mock_db)
+    set_profiler_queues(input, [Mock(), Mock()])
+    input.total_flows = 10
+    header = {"type": "argus", "data": "StartTime,Dur,Proto,SrcAddr"}
+    input.give_profiler(header, broadcast=True)
+    input.flush_frames()
+
+    first = input.profiler_queues[0].put.call_args[0][0][0]
+    second = input.profiler_queues[1].put.call_args[0][0][0]
+    assert first["line"] == second["line"] == header
+    assert first["broadcast"] and second["broadcast"]
+    # only 1 worker should receive the total flows
+    assert first["total_flows"] == 10
+    assert "total_flows" not in second
+
+
+def test_give_profiler_sends_full_frames(mock_db):
+    input = ModuleFactory().create_input_obj("", "zeek_folder", mock_db)
+    set_profiler_queues(input, [Mock()])
+    input.batch_size = 3
+    input.batch_max_delay = 1000
+    line = {"type": "conn.log", "data": {"id.orig_h": "192.168.1.1"}}
+    for _ in range(7):
+        input.give_profiler(line)
+
+    profiler_queue = input.profiler_queues[0]
+    assert profiler_queue.put.call_count == 2
+    assert len(profiler_queue.put.call_args[0][0]) == 3
+    # the remaining flow is sent on flush
+    input.flush_frames()
+    assert profiler_queue.put.call_count == 3
+    assert len(profiler_queue.put.call_args[0][0]) == 1
+    assert input.frames == [[]]
+
+
+def test_give_profiler_sends_old_frames(mock_db):
+    input = ModuleFactory().create_input_obj("", "zeek_folder", mock_db)
+    set_profiler_queues(input, [Mock()])
+    input.batch_size = 500
+    input.batch_max_delay = 0
+    line = {"type": "conn.log", "data": {"id.orig_h": "192.168.1.1"}}
+    input.give_profiler(line)
+    # frames older than batch_max_delay are sent right away
+    assert input.profiler_queues[0].put.call_count == 1
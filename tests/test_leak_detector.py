@@ -1,10 +1,19 @@
 """Unit test for modules/leak_detector/leak_detector.py"""
 
 from tests.module_factory import ModuleFactory
+from modules.leak_detector.yara_scanner import (
+    YaraMatch,
+    YaraScanError,
+    YaraScanner,
+    match_chunk,
+)
 from unittest import mock
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
 import pytest
-from unittest.mock import patch, mock_open
-import json
+from unittest.mock import patch
+import ipaddress
+import struct
 from unittest.mock import MagicMock
 
 
@@ -76,167 +85,259 @@ def test_main(mock_db):
 
 
 @pytest.mark.parametrize(
-    "input_json, mock_json_loads_return, " "expected_output",
-    [
-        (
-            # Testcase1: Valid JSON with extra characters
-            '{"some": "data"}Killed',
-            {"some": "data"},
-            {"some": "data"},
-        ),
-        (
-            # Testcase2: Valid JSON without extra characters
-            '{"some": "data"}',
-            {"some": "data"},
-            {"some": "data"},
-        ),
-        (
-            # Testcase3: Invalid JSON, JSONDecodeError raised
-            "Invalid JSON",
-            json.JSONDecodeError("Expecting ',' delimiter", "", 0),
-            False,
-        ),
-    ],
-)
-@patch("json.loads")
-def test_fix_json_packet(
-    mock_json_loads,
-    mock_db,
-    input_json,
-    mock_json_loads_return,
-    expected_output,
-):
-    """Tests the fix_json_packet method of LeakDetector."""
-
-    mock_json_loads.side_effect = (
-        mock_json_loads_return
-        if isinstance(mock_json_loads_return, Exception)
-        else lambda x: mock_json_loads_return
-    )
-
-    leak_detector = ModuleFactory().create_leak_detector_obj(mock_db)
-    result = leak_detector.fix_json_packet(input_json)
-
-    assert result == expected_output
-
-
-@pytest.mark.parametrize(
-    "listdir_return, popen_communicate_return, " "evidence_set_call_count",
+    "scan_result, evidence_set_call_count",
     [
         (
             # Test case 1: Matches found, evidence set
-            ["test_rule_compiled"],
-            (b"test_rule\n0x4e15c:$rgx_gps_loc: 37.7749,-122.4194", None),
-            True,
+            [
+                YaraMatch(
+                    rule="test_rule",
+                    var="rgx_gps_loc",
+                    offset=0x4E15C,
+                    strings_matched="37.7749,-122.4194",
+                )
+            ],
+            1,
         ),
         (
             # Test case 2: No matches found, no evidence set
-            ["test_rule_compiled"],
-            (b"", None),
-            False,
+            [],
+            0,
         ),
         (
             # Test case 3: Error during YARA execution, no action taken
-            ["test_rule_compiled"],
-            (b"", b"Error during YARA execution"),
-            False,
+            YaraScanError("Error during YARA execution"),
+            0,
         ),
     ],
 )
-@mock.patch("subprocess.Popen")
-@mock.patch("os.listdir")
+@mock.patch("time.sleep")
 def test_find_matches(
-    mock_listdir,
-    mock_popen,
-    listdir_return,
-    popen_communicate_return,
+    mock_sleep,
+    scan_result,
     evidence_set_call_count,
     mock_db,
 ):
     """Tests the find_matches method of LeakDetector."""
 
     leak_detector = ModuleFactory().create_leak_detector_obj(mock_db)
-
-    mock_listdir.return_value = listdir_return
-    mock_popen.return_value.communicate.return_value = popen_communicate_return
+    leak_detector.scanner.scan = MagicMock(side_effect=[scan_result])
     leak_detector.set_evidence_yara_match = MagicMock()
     leak_detector.delete_compiled_rules = MagicMock()
 
     leak_detector.find_matches()
 
-    mock_popen.assert_called_once()
+    leak_detector.scanner.scan.assert_called_once()
     assert (
         leak_detector.set_evidence_yara_match.call_count
         == evidence_set_call_count
     )
 
 
+def test_parse_cli_output():
+    output = (
+        "NETWORK_gps_location_leaked test.pcap\n"
+        "0x4e15c:$rgx_gps_loc: ll=37.7749,-122.4194\n"
+        "0x4e200:$rgx_gps_lat: lat=37.7749\n"
+    )
+    assert YaraScanner.parse_cli_output(output) == [
+        YaraMatch(
+            rule="NETWORK_gps_location_leaked",
+            var="rgx_gps_loc",
+            offset=0x4E15C,
+            strings_matched="ll=37.7749,-122.4194",
+        ),
+        YaraMatch(
+            rule="NETWORK_gps_location_leaked",
+            var="rgx_gps_lat",
+            offset=0x4E200,
+            strings_matched="lat=37.7749",
+        ),
+    ]
+
+
+@mock.patch("subprocess.run")
+@mock.patch("os.listdir")
+def test_scan_using_cli_error(mock_listdir, mock_run):
+    mock_listdir.return_value = ["test_rule_compiled"]
+    mock_run.return_value = MagicMock(
+        returncode=1, stdout=b"", stderr=b"error scanning test.pcap"
+    )
+    scanner = YaraScanner("rules/", "compiled/")
+    with pytest.raises(YaraScanError):
+        scanner.scan_using_cli("test.pcap")
+
+
+class FakeRules:
+    """finds 'lat=' in the given data, like a compiled yara rule"""
+
+    def match(self, data, fast):
+        string = MagicMock(identifier="$rgx_gps_lat")
+        string.instances = [
+            MagicMock(offset=offset, matched_data=b"lat=")
+            for offset in range(len(data))
+            if data[offset : offset + 4] == b"lat="
+        ]
+        return [MagicMock(rule="test_rule", strings=[string])]
+
+
+@pytest.mark.parametrize(
+    "offset",
+    [
+        # the match starts in the first chunk and ends in the second
+        8,
+        # the match is in the overlap of the first chunk
+        10,
+    ],
+)
+def test_match_chunk_overlap(offset):
+    data = b"x" * offset + b"lat=" + b"x" * (22 - offset)
+    scanner = YaraScanner("rules/", "compiled/")
+    scanner.chunk_size = 10
+    chunks = scanner.get_chunks(len(data))
+    assert chunks == [(0, 10), (10, 20), (20, 26)]
+
+    matches = []
+    for start, end in chunks:
+        matches += match_chunk(FakeRules(), data, start, end, overlap=5)
+    # the match is found once
+    assert matches == [
+        YaraMatch(
+            rule="test_rule",
+            var="rgx_gps_lat",
+            offset=offset,
+            strings_matched="lat=",
+        )
+    ]
+
+
+class FakeYaraError(Exception):
+    pass
+
+
+def test_match_chunk_yara_error():
+    rules = MagicMock()
+    rules.match.side_effect = FakeYaraError("timeout")
+    with patch(
+        "modules.leak_detector.yara_scanner.yara",
+        MagicMock(Error=FakeYaraError),
+    ):
+        with pytest.raises(YaraScanError):
+            match_chunk(rules, b"data", 0, 4, overlap=0)
+
+
+@patch("modules.leak_detector.yara_scanner.ProcessPoolExecutor")
+def test_scan_in_process_broken_pool(mock_pool, tmp_path):
+    pcap = tmp_path / "test.pcap"
+    pcap.write_bytes(b"x" * 20)
+    future = Future()
+    # e.g. init_worker() couldn't compile the rules
+    future.set_exception(BrokenProcessPool("init_worker failed"))
+    mock_pool.return_value.__enter__.return_value.submit.return_value = future
+    scanner = YaraScanner("rules/", "compiled/")
+    scanner.chunk_size = 10
+    scanner.max_workers = 2
+    with patch.object(
+        scanner, "get_rules_paths", return_value=["rules/test.yara"]
+    ):
+        with pytest.raises(YaraScanError):
+            scanner.scan_in_process(str(pcap))
+
+
+def create_pcap(packets) -> bytes:
+    """creates a little endian pcap with ethernet packets"""
+    pcap = struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1)
+    for ts, packet in packets:
+        pcap += struct.pack("<IIII", ts, 500000, len(packet), len(packet))
+        pcap += packet
+    return pcap
+
+
+ETHERNET_IPV4 = b"\x00" * 12 + b"\x08\x00"
+IPV4_TCP = (
+    b"\x45\x00\x00\x28\x00\x00\x00\x00\x40\x06\x00\x00"
+    + bytes([10, 0, 0, 1])
+    + bytes([10, 0, 0, 2])
+)
+TCP = struct.pack("!HH", 80, 443) + b"\x00" * 16
+ETHERNET_IPV6 = b"\x00" * 12 + b"\x86\xdd"
+IPV6_UDP = (
+    b"\x60\x00\x00\x00\x00\x08\x11\x40"
+    + ipaddress.IPv6Address("2001:db8::1").packed
+    + ipaddress.IPv6Address("2001:db8::2").packed
+)
+UDP = struct.pack("!HHHH", 5353, 53, 8, 0)
+ICMP = b"\x45\x00\x00\x1c\x00\x00\x00\x00\x40\x01" + b"\x00" * 18
+
+
 @pytest.mark.parametrize(
-    "pcap_data, offset, tshark_output, expected_result",
+    "offset, expected_result",
     [
+        # Testcase1: offset in the first packet
         (
-            # Testcase1: Packet found successfully
-            b"\x00" * 24 + b"\x00" * 16 + b"\x00\x00\x00\x14" + b"\x00" * 20,
-            25,
-            json.dumps(
-                [
-                    {
-                        "_source": {
-                            "layers": {
-                                "frame": {
-                                    "frame.protocols": "ip:ipv4:ip:tcp",
-                                    "frame.time_epoch": 1669852800,
-                                },
-                                "ip": {
-                                    "ip.src": "10.0.0.1",
-                                    "ip.dst": "10.0.0.2",
-                                },
-                                "tcp": {
-                                    "tcp.srcport": "80",
-                                    "tcp.dstport": "443",
-                                },
-                            }
-                        }
-                    }
-                ]
-            ).encode(),
-            ("10.0.0.1", "10.0.0.2", "tcp", "80", "443", 1669852800),
+            24 + 16 + 30,
+            ("10.0.0.1", "10.0.0.2", "tcp", 80, 443, 1669852800.5),
         ),
+        # Testcase2: offset in the header of the second packet
         (
-            # Testcase3: Error during tshark execution
-            b"\x00" * 24 + b"\x00" * 16 + b"\x00\x00\x00\x14" + b"\x00" * 20,
-            25,
-            b"",
-            None,
+            24 + 16 + 54,
+            ("2001:db8::1", "2001:db8::2", "udp", 5353, 53, 1669852801.5),
         ),
+        # Testcase3: icmp packet
+        (24 + 16 + 54 + 16 + 62 + 20, False),
+        # Testcase4: offset in the pcap header
+        (10, False),
     ],
 )
-def test_get_packet_info(
-    mock_db,
-    pcap_data,
-    offset,
-    tshark_output,
-    expected_result,
-):
+def test_get_packet_info(mock_db, tmp_path, offset, expected_result):
     """Tests the get_packet_info method of LeakDetector."""
-
+    pcap = tmp_path / "test.pcap"
+    pcap.write_bytes(
+        create_pcap(
+            [
+                (1669852800, ETHERNET_IPV4 + IPV4_TCP + TCP),
+                (1669852801, ETHERNET_IPV6 + IPV6_UDP + UDP),
+                (1669852802, ETHERNET_IPV4 + ICMP),
+            ]
+        )
+    )
     leak_detector = ModuleFactory().create_leak_detector_obj(mock_db)
-    leak_detector.fix_json_packet = MagicMock()
-    with patch(
-        "builtins.open", mock_open(read_data=pcap_data)
-    ) as mock_file, patch("subprocess.Popen") as mock_popen:
-        mock_file.return_value.tell.side_effect = [
-            24,
-            100,
-        ]
+    leak_detector.pcap = str(pcap)
 
-        mock_popen.return_value.communicate.return_value = (
-            tshark_output,
-            None,
-        )
+    assert leak_detector.get_packet_info(offset) == expected_result
+    assert len(leak_detector.pcap_index) == 3
+    leak_detector.pcap_index.close()
 
-        result = leak_detector.get_packet_info(offset)
-        assert result == expected_result
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        # pcapng
+        b"\x0a\x0d\x0d\x0a" + b"\x00" * 28,
+        # shorter than the pcap header
+        b"\xd4\xc3\xb2\xa1",
+        # empty
+        b"",
+    ],
+)
+def test_pcap_index_closes_non_pcap_files(mock_db, tmp_path, data):
+    pcap = tmp_path / "test.pcapng"
+    pcap.write_bytes(data)
+    opened = []
+    real_open = open
+
+    def open_and_track(*args, **kwargs):
+        file = real_open(*args, **kwargs)
+        opened.append(file)
+        return file
+
+    with patch("builtins.open", open_and_track):
+        leak_detector = ModuleFactory().create_leak_detector_obj(mock_db)
+        leak_detector.pcap = str(pcap)
+        assert leak_detector.get_packet_info(30) is False
+
+    assert leak_detector.pcap_index is None
+    assert opened and all(file.closed for file in opened)
 
 
 @pytest.mark.parametrize(
@@ -311,11 +412,12 @@ def test_set_evidence_yara_match(
     mock_set_evidence = MagicMock()
     leak_detector.db.set_evidence = mock_set_evidence
     leak_detector.set_evidence_yara_match(
-        {
-            "rule": "GPS Leak",
-            "offset": 25,
-            "strings_matched": "37.7749,-122.4194",
-        }
+        YaraMatch(
+            rule="GPS_Leak",
+            var="rgx_gps_loc",
+            offset=25,
+            strings_matched="37.7749,-122.4194",
+        )
     )
 
     assert mock_set_evidence.call_count == expected_call_count
@@ -0,0 +1,58 @@
+from slips_files.core.helpers.log_writer import BufferedLogWriter
+
+
+def test_buffered_log_writer(tmp_path):
+    logfile = tmp_path / "slips.log"
+    writer = BufferedLogWriter(str(logfile))
+    writer.write("line 1\n")
+    writer.write("line 2\n")
+    # nothing is written until the buffer is flushed
+    assert not logfile.exists()
+
+    writer.flush()
+    assert logfile.read_text() == "line 1\nline 2\n"
+
+    writer.write("line 3\n")
+    writer.close()
+    assert logfile.read_text() == "line 1\nline 2\nline 3\n"
+    # lines written after closing are ignored, the file isn't reopened
+    writer.write("line 4\n")
+    writer.flush()
+    assert logfile.read_text() == "line 1\nline 2\nline 3\n"
+    assert writer.ignored_lines == 1
+    assert writer.file is None
+
+
+def test_buffered_log_writer_max_buffered_lines(tmp_path):
+    logfile = tmp_path / "alerts.log"
+    writer = BufferedLogWriter(str(logfile))
+    writer.max_buffered_lines = 2
+    writer.write("line 1\n")
+    writer.write("line 2\n")
+    assert logfile.read_text() == "line 1\nline 2\n"
+    writer.close()
+
+
+def test_unbuffered_log_writer(tmp_path):
+    logfile = tmp_path / "errors.log"
+    writer = BufferedLogWriter(str(logfile), unbuffered=True)
+    writer.write("error 1\n")
+    assert logfile.read_text() == "error 1\n"
+    writer.close()
+
+
+def test_flush_all(tmp_path):
+    slips_log = tmp_path / "slips.log"
+    alerts_log = tmp_path / "alerts.log"
+    writers = [
+        BufferedLogWriter(str(slips_log)),
+        BufferedLogWriter(str(alerts_log)),
+    ]
+    for writer in writers:
+        writer.write("line 1\n")
+
+    BufferedLogWriter.flush_all()
+    assert slips_log.read_text() == "line 1\n"
+    assert alerts_log.read_text() == "line 1\n"
+    for writer in writers:
+        writer.close()
@@ -0,0 +1,174 @@
+"""Unit test for slips_files/common/abstracts/module.py"""
+
+import signal
+from unittest.mock import Mock
+
+import pytest
+
+from slips_files.core.helpers.log_writer import BufferedLogWriter
+from tests.module_factory import ModuleFactory
+
+
+def create_msg(channel: str, data: str) -> dict:
+    return {"type": "message", "channel": channel, "data": data}
+
+
+def test_receive_msgs(mock_db):
+    flowalerts = ModuleFactory().create_flowalerts_obj(mock_db)
+    new_flow = flowalerts.channels["new_flow"]
+    msgs = {
+        new_flow: [
+            create_msg("new_flow", "flow1"),
+            create_msg("new_flow", "flow2"),
+        ],
+    }
+    mock_db.get_message.side_effect = lambda channel, **kwargs: (
+        msgs[channel].pop(0) if msgs.get(channel) else None
+    )
+
+    assert flowalerts.receive_msgs() == 2
+    assert len(flowalerts.msg_buffer["new_flow"]) == 2
+    assert not flowalerts.msg_buffer["new_dns"]
+    # there's a msg waiting to be handled, the module shouldn't stop
+    flowalerts.termination_event.set()
+    assert not flowalerts.should_stop()
+    flowalerts.termination_event.clear()
+
+
+def test_get_msg_from_buffer(mock_db):
+    flowalerts = ModuleFactory().create_flowalerts_obj(mock_db)
+    msg = create_msg("new_flow", "flow1")
+    mock_db.get_message.side_effect = [msg] + [None] * 20
+
+    # the buffer is empty, get_msg() should receive the pending msgs
+    assert flowalerts.get_msg("new_flow") == msg
+    assert flowalerts.channel_tracker["new_flow"]
+
+    # run() already received the msgs of this iteration
+    flowalerts.received_msgs = True
+    mock_db.get_message.reset_mock()
+    assert not flowalerts.get_msg("new_flow")
+    assert not flowalerts.channel_tracker["new_flow"]
+    mock_db.get_message.assert_not_called()
+
+
+def test_dispatch_msgs(mock_db):
+    flowalerts = ModuleFactory().create_flowalerts_obj(mock_db)
+    handler = Mock()
+    flowalerts.channel_handlers = {"new_flow": handler}
+    flowalerts.msg_buffer["new_flow"].extend(
+        [create_msg("new_flow", "flow1"), create_msg("new_flow", "flow2")]
+    )
+
+    flowalerts.dispatch_msgs()
+
+    assert handler.call_count == 2
+    assert not flowalerts.msg_buffer["new_flow"]
+    assert flowalerts.channel_tracker["new_flow"]
+
+
+def test_receive_msgs_routing(mock_db):
+    flowalerts = ModuleFactory().create_flowalerts_obj(mock_db)
+    msgs = [
+        create_msg("new_dns", "dns1"),
+        create_msg("not_subscribed", "data"),
+        create_msg("new_flow", "flow1"),
+    ]
+    # the high volume channels have their own pubsubs, all of them are read
+    mock_db.get_message.side_effect = lambda pubsub, **kwargs: (
+        msgs.pop(0) if msgs else None
+    )
+
+    assert flowalerts.receive_msgs() == 2
+    assert flowalerts.msg_buffer["new_dns"][0]["data"] == "dns1"
+    assert flowalerts.msg_buffer["new_flow"][0]["data"] == "flow1"
+    assert "not_subscribed" not in flowalerts.msg_buffer
+
+
+def test_print_discarded_msgs(mock_db):
+    flowalerts = ModuleFactory().create_flowalerts_obj(mock_db)
+    # the printing was overridden by the factory
+    del flowalerts.print
+    observer = Mock()
+    observer.discards.side_effect = lambda verbose, debug: verbose > 1
+    flowalerts.observers = [observer]
+    text = Mock(return_value="text")
+
+    # the text function shouldn't be called if the msg is discarded
+    flowalerts.print(text, 3, 0)
+    text.assert_not_called()
+    observer.update.assert_not_called()
+
+    flowalerts.print(text, 1, 0)
+    text.assert_called_once()
+    assert observer.update.call_args[0][0]["txt"] == "text"
+
+
+def test_receive_msgs_stops_at_the_high_water_mark(mock_db):
+    flowalerts = ModuleFactory().create_flowalerts_obj(mock_db)
+    flowalerts.max_msgs_per_receive = 2
+    # every channel of the pubsub has its buffer full
+    for channel_name in flowalerts.channels:
+        flowalerts.msg_buffer[channel_name].extend(
+            [create_msg(channel_name, "1"), create_msg(channel_name, "2")]
+        )
+
+    # the msgs wait in redis until the module handles the buffered ones
+    assert flowalerts.receive_msgs(timeout=0.01) == 0
+    mock_db.get_message.assert_not_called()
+
+
+def test_receive_msgs_skips_a_pubsub_with_one_channel_behind(mock_db):
+    flowalerts = ModuleFactory().create_flowalerts_obj(mock_db)
+    flowalerts.max_msgs_per_receive = 2
+    shared_pubsub, flows_pubsub = Mock(), Mock()
+    flowalerts.channels = {
+        "new_dns": shared_pubsub,
+        "new_ssl": shared_pubsub,
+        "new_flow": flows_pubsub,
+    }
+    flowalerts.init_msg_buffer()
+    # only new_dns is behind, new_ssl shares its pubsub
+    flowalerts.msg_buffer["new_dns"].extend(
+        [create_msg("new_dns", "1"), create_msg("new_dns", "2")]
+    )
+
+    assert flowalerts.get_pubsubs_to_receive_from() == {
+        id(flows_pubsub): flows_pubsub
+    }
+
+
+def test_buffer_msg_never_drops_msgs(mock_db):
+    flowalerts = ModuleFactory().create_flowalerts_obj(mock_db)
+    flowalerts.max_msgs_per_receive = 2
+    for data in ("flow1", "flow2", "flow3"):
+        assert flowalerts.buffer_msg(create_msg("new_flow", data))
+
+    buffer = flowalerts.msg_buffer["new_flow"]
+    assert [msg["data"] for msg in buffer] == ["flow1", "flow2", "flow3"]
+
+
+def test_receive_msgs_waits_for_many_pubsubs(mock_db, monkeypatch):
+    flowalerts = ModuleFactory().create_flowalerts_obj(mock_db)
+    flowalerts.channels = {"new_flow": Mock(), "new_dns": Mock()}
+    flowalerts.init_msg_buffer()
+    msgs = [None, None, create_msg("new_dns", "dns1"), None]
+    mock_db.get_message.side_effect = lambda pubsub, **kwargs: msgs.pop(0)
+    wait_for_msgs = Mock()
+    monkeypatch.setattr(flowalerts, "wait_for_msgs", wait_for_msgs)
+
+    assert flowalerts.receive_msgs(timeout=0.5) == 1
+    wait_for_msgs.assert_called_once_with(
+        list(flowalerts.channels.values()), 0.5
+    )
+    assert flowalerts.msg_buffer["new_dns"][0]["data"] == "dns1"
+
+
+def test_handle_sigterm_flushes_the_logs(mock_db, monkeypatch):
+    flowalerts = ModuleFactory().create_flowalerts_obj(mock_db)
+    flush_all = Mock()
+    monkeypatch.setattr(BufferedLogWriter, "flush_all", flush_all)
+
+    with pytest.raises(SystemExit):
+        flowalerts.handle_sigterm(signal.SIGTERM, None)
+    flush_all.assert_called_once()
@@ -80,6 +80,14 @@ def test_define_separator_zeek_dict(file, input_type, expected_value, mock_db):
     assert profiler_detected_type == expected_value
 
 
+def test_define_separator_zeek_json_line(mock_db):
+    profiler = ModuleFactory().create_profiler_obj(mock_db)
+    with open("dataset/test9-mixed-zeek-dir/conn.log") as f:
+        # the input process sends the zeek json lines undecoded
+        sample_flow = {"data": f.readline()}
+    assert profiler.define_separator(sample_flow, "zeek_folder") == "zeek"
+
+
 @pytest.mark.parametrize("nfdump_file", [("dataset/test1-normal.nfdump")])
 def test_define_separator_nfdump(nfdump_file, mock_db):
     # nfdump files aren't text files so we need to process them first
@@ -191,6 +199,94 @@ def test_process_line(file, flow_type, mock_db):
     assert added_flow is not None
 
 
+@pytest.mark.parametrize(
+    "file",
+    [
+        "dataset/test10-mixed-zeek-dir/conn.log",
+        "dataset/test10-mixed-zeek-dir/dns.log",
+        "dataset/test10-mixed-zeek-dir/ssl.log",
+        "dataset/test10-mixed-zeek-dir/notice.log",
+    ],
+)
+def test_process_zeek_tabs_line(file, mock_db):
+    zeek_tabs = SUPPORTED_INPUT_TYPES["zeek-tabs"]()
+    with open(file) as f:
+        lines = f.readlines()
+
+    flows = [
+        zeek_tabs.process_line({"type": file, "data": line}) for line in lines
+    ]
+    # the header lines aren't flows
+    assert not any(
+        flow for flow, line in zip(flows, lines) if line.startswith("#")
+    )
+    first_flow_line = next(line for line in lines if not line.startswith("#"))
+    flow = flows[lines.index(first_flow_line)]
+    assert isinstance(flow.starttime, float)
+    assert flow.saddr
+    if flow.type_ == "notice":
+        # portscan notices use the src field
+        assert flow.saddr == "147.32.83.156"
+    else:
+        assert flow.uid
+
+
+def test_process_zeek_tabs_line_with_different_columns(mock_db):
+    zeek_tabs = SUPPORTED_INPUT_TYPES["zeek-tabs"]()
+    file = "zeek_files/dns.log"
+    header = [
+        "#fields\tuid\tts\tid.orig_h\tid.resp_h\tquery\tanswers\tTTLs\n",
+        "#types\tstring\ttime\taddr\taddr\tstring\tvector[string]"
+        "\tvector[interval]\n",
+    ]
+    for line in header:
+        assert zeek_tabs.process_line({"type": file, "data": line}) is False
+
+    flow = zeek_tabs.process_line(
+        {
+            "type": file,
+            "data": "CYwXsR3yfDq6hooIU2\t1601998366.786397\t192.168.1.1"
+            "\t8.8.8.8\tgoogle.com\ta.google.com,1.1.1.1\t15.0,105.0\n",
+        }
+    )
+    assert flow.starttime == 1601998366.786397
+    assert flow.uid == "CYwXsR3yfDq6hooIU2"
+    assert flow.saddr == "192.168.1.1"
+    assert flow.daddr == "8.8.8.8"
+    assert flow.query == "google.com"
+    assert flow.answers == ["a.google.com", "1.1.1.1"]
+    assert flow.TTLs == [15.0, 105.0]
+    # fields that aren't in the header get their default value
+    assert flow.qtype_name == ""
+
+
+def test_input_handlers_keep_their_own_time_format():
+    zeek_json = SUPPORTED_INPUT_TYPES["zeek"]()
+    other_zeek_json = SUPPORTED_INPUT_TYPES["zeek"]()
+
+    assert zeek_json.to_epoch("1601998366.786397") == 1601998366.786397
+    # unix timestamps have no format to keep
+    assert zeek_json.time_format is None
+
+    zeek_json.to_epoch("2023/04/06 12:34:56")
+    other_zeek_json.to_epoch("2023-04-06T12:34:56")
+    assert zeek_json.time_format == "%Y/%m/%d %H:%M:%S"
+    assert other_zeek_json.time_format == "%Y-%m-%dT%H:%M:%S"
+
+    with pytest.raises(ValueError):
+        zeek_json.to_epoch("not a real time")
+
+
+def test_process_zeek_tabs_line_without_header(mock_db):
+    zeek_tabs = SUPPORTED_INPUT_TYPES["zeek-tabs"]()
+    assert (
+        zeek_tabs.process_line(
+            {"type": "zeek_files/conn.log", "data": "1601998366.78\tCNgrt"}
+        )
+        is False
+    )
+
+
 def test_get_rev_profile(mock_db):
     profiler = ModuleFactory().create_profiler_obj(mock_db)
     profiler.flow = Conn(
@@ -389,7 +485,7 @@ def test_main_flow_processing(mock_handle_setting_local_net, mock_add_flow_to_pr
     profiler = ModuleFactory().create_profiler_obj(mock_db)
     profiler.profiler_queue = Mock(spec=queue.Queue)
     profiler.profiler_queue.get.side_effect = [
-        {"line": "sample_line", "input_type": "zeek", "total_flows": 100},
+        [{"line": "sample_line", "input_type": "zeek", "total_flows": 100}],
         "stop" 
     ]
     profiler.check_for_stop_msg = Mock(side_effect=[False, True])  
@@ -508,6 +604,25 @@ def test_init_pbar(mock_db):
     })
     assert profiler.supported_pbar is True
 
+
+def test_update_pbar(mock_db):
+    profiler = ModuleFactory().create_profiler_obj(mock_db)
+    profiler.notify_observers = Mock()
+    profiler.pbar_updates = 3
+    profiler.update_pbar()
+    profiler.notify_observers.assert_called_once_with(
+        {"bar": "update", "flows": 3}
+    )
+
+    # updates are rate limited unless forced
+    profiler.pbar_updates = 2
+    profiler.update_pbar()
+    assert profiler.notify_observers.call_count == 1
+    profiler.update_pbar(force=True)
+    profiler.notify_observers.assert_called_with({"bar": "update", "flows": 2})
+    assert profiler.pbar_updates == 0
+
+
 def test_get_local_net_from_flow(mock_db, monkeypatch):
     profiler = ModuleFactory().create_profiler_obj(mock_db)
     profiler.flow = Mock()
@@ -584,3 +699,30 @@ def test_should_stop_false(mock_db):
     assert profiler.should_stop() is False
     
 
+
+
+def test_process_msg_with_parsed_flow(mock_db):
+    profiler = ModuleFactory().create_profiler_obj(mock_db)
+    profiler.add_flow_to_profile = Mock()
+    profiler.handle_setting_local_net = Mock()
+    flow = Conn(
+        "1601998398.945854", "1234", "192.168.1.1", "8.8.8.8", 5, "TCP",
+        "dhcp", 80, 88, 20, 20, 20, 20, "", "", "Established", "",
+    )
+    assert profiler.process_msg({"flow": flow, "input_type": "zeek"})
+    assert profiler.flow is flow
+    assert profiler.input_type == "zeek"
+    assert not hasattr(profiler, "input")
+    profiler.add_flow_to_profile.assert_called_once()
+
+
+def test_check_for_stop_msg_from_many_producers(mock_db, monkeypatch):
+    profiler = ModuleFactory().create_profiler_obj(mock_db)
+    profiler.stop_msgs_left = 2
+    monkeypatch.setattr(profiler, "shutdown_gracefully", Mock())
+    monkeypatch.setattr(profiler, "is_done_processing", Mock())
+    # the first parser is done, the other one may still send flows
+    assert profiler.check_for_stop_msg("stop") is False
+    profiler.is_done_processing.assert_not_called()
+    assert profiler.check_for_stop_msg("stop") is True
+    profiler.is_done_processing.assert_called_once()
@@ -625,6 +625,23 @@ def test_define_time_format(time, expected_format):
     assert utils.get_time_format(time) == expected_format
 
 
+def test_parse_time_with_a_format_hint():
+    utils = ModuleFactory().create_utils_obj()
+    assert utils.parse_time("2023/04/06 12:34:56", "%Y/%m/%d %H:%M:%S") == (
+        "%Y/%m/%d %H:%M:%S",
+        datetime.datetime(2023, 4, 6, 12, 34, 56),
+    )
+    # a ts with a different format is still detected
+    assert utils.parse_time(
+        "2023-04-06 12:34:56.789", "%Y/%m/%d %H:%M:%S"
+    ) == (
+        "%Y-%m-%d %H:%M:%S.%f",
+        datetime.datetime(2023, 4, 6, 12, 34, 56, 789000),
+    )
+    # unix timestamps aren't parsed
+    assert utils.parse_time(1680788096.789) == ("unixtimestamp", None)
+
+
 @pytest.mark.parametrize(
     "ip_address, expected_result",
     [  # testcase1: Localhost IPv4 should be ignored
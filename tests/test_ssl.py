@@ -2,6 +2,7 @@
 
 from tests.module_factory import ModuleFactory
 from unittest.mock import Mock
+from slips_files.common.flow_encoding import encode_new_flow
 
 import json
 from queue import Queue
@@ -296,20 +297,15 @@ def test_detect_incompatible_cn(mocker, mock_db, issuer, expected_call_count):
                 "profileid": "profile_192.168.1.1",
                 "twid": "timewindow1",
                 "stime": 1635765895.037696,
-                "flow": json.dumps(
-                    {
-                        "CAeDWs37BipkfP21u8": json.dumps(
-                            {
-                                "daddr": "192.168.1.2",
-                                "state": "Established",
-                                "dport": 443,
-                                "proto": "tcp",
-                                "allbytes": 1024,
-                                "appproto": "http",
-                            }
-                        )
-                    }
-                ),
+                "uid": "CAeDWs37BipkfP21u8",
+                "flow": {
+                    "daddr": "192.168.1.2",
+                    "state": "Established",
+                    "dport": 443,
+                    "proto": "tcp",
+                    "allbytes": 1024,
+                    "appproto": "http",
+                },
             },
             1,
         ),
@@ -319,20 +315,15 @@ def test_detect_incompatible_cn(mocker, mock_db, issuer, expected_call_count):
                 "profileid": "profile_192.168.1.1",
                 "twid": "timewindow1",
                 "stime": 1635765895.037696,
-                "flow": json.dumps(
-                    {
-                        "CAeDWs37BipkfP21u8": json.dumps(
-                            {
-                                "daddr": "192.168.1.2",
-                                "state": "Established",
-                                "dport": 443,
-                                "proto": "tcp",
-                                "allbytes": 1024,
-                                "appproto": "ssl",
-                            }
-                        )
-                    }
-                ),
+                "uid": "CAeDWs37BipkfP21u8",
+                "flow": {
+                    "daddr": "192.168.1.2",
+                    "state": "Established",
+                    "dport": 443,
+                    "proto": "tcp",
+                    "allbytes": 1024,
+                    "appproto": "ssl",
+                },
             },
             0,
         ),
@@ -342,20 +333,15 @@ def test_detect_incompatible_cn(mocker, mock_db, issuer, expected_call_count):
                 "profileid": "profile_192.168.1.1",
                 "twid": "timewindow1",
                 "stime": 1635765895.037696,
-                "flow": json.dumps(
-                    {
-                        "CAeDWs37BipkfP21u8": json.dumps(
-                            {
-                                "daddr": "192.168.1.2",
-                                "state": "SF",
-                                "dport": 443,
-                                "proto": "tcp",
-                                "allbytes": 1024,
-                                "appproto": "http",
-                            }
-                        )
-                    }
-                ),
+                "uid": "CAeDWs37BipkfP21u8",
+                "flow": {
+                    "daddr": "192.168.1.2",
+                    "state": "SF",
+                    "dport": 443,
+                    "proto": "tcp",
+                    "allbytes": 1024,
+                    "appproto": "http",
+                },
             },
             0,
         ),
@@ -365,20 +351,15 @@ def test_detect_incompatible_cn(mocker, mock_db, issuer, expected_call_count):
                 "profileid": "profile_192.168.1.1",
                 "twid": "timewindow1",
                 "stime": 1635765895.037696,
-                "flow": json.dumps(
-                    {
-                        "CAeDWs37BipkfP21u8": json.dumps(
-                            {
-                                "daddr": "192.168.1.2",
-                                "state": "Established",
-                                "dport": 80,
-                                "proto": "tcp",
-                                "allbytes": 1024,
-                                "appproto": "http",
-                            }
-                        )
-                    }
-                ),
+                "uid": "CAeDWs37BipkfP21u8",
+                "flow": {
+                    "daddr": "192.168.1.2",
+                    "state": "Established",
+                    "dport": 80,
+                    "proto": "tcp",
+                    "allbytes": 1024,
+                    "appproto": "http",
+                },
             },
             0,
         ),
@@ -388,20 +369,15 @@ def test_detect_incompatible_cn(mocker, mock_db, issuer, expected_call_count):
                 "profileid": "profile_192.168.1.1",
                 "twid": "timewindow1",
                 "stime": 1635765895.037696,
-                "flow": json.dumps(
-                    {
-                        "CAeDWs37BipkfP21u8": json.dumps(
-                            {
-                                "daddr": "192.168.1.2",
-                                "state": "Established",
-                                "dport": 443,
-                                "proto": "tcp",
-                                "allbytes": 0,
-                                "appproto": "http",
-                            }
-                        )
-                    }
-                ),
+                "uid": "CAeDWs37BipkfP21u8",
+                "flow": {
+                    "daddr": "192.168.1.2",
+                    "state": "Established",
+                    "dport": 443,
+                    "proto": "tcp",
+                    "allbytes": 0,
+                    "appproto": "http",
+                },
             },
             0,
         ),
@@ -460,26 +436,19 @@ def test_analyze(mocker, mock_db):
         )
     }
     new_flow_msg = {
-        "data": json.dumps(
+        "data": encode_new_flow(
+            "profile_192.168.1.1",
+            "timewindow1",
+            "test_uid",
             {
-                "profileid": "profile_192.168.1.1",
-                "twid": "timewindow1",
-                "stime": 1635765895.037696,
-                "flow": json.dumps(
-                    {
-                        "test_uid": json.dumps(
-                            {
-                                "daddr": "192.168.1.2",
-                                "state": "Established",
-                                "dport": 443,
-                                "proto": "tcp",
-                                "allbytes": 1024,
-                                "appproto": "http",
-                            }
-                        )
-                    }
-                ),
-            }
+                "ts": 1635765895.037696,
+                "daddr": "192.168.1.2",
+                "state": "Established",
+                "dport": 443,
+                "proto": "tcp",
+                "allbytes": 1024,
+                "appproto": "http",
+            },
         )
     }
 
@@ -544,11 +513,9 @@ def test_analyze(mocker, mock_db):
     assert call_arg["profileid"] == "profile_192.168.1.1"
     assert call_arg["twid"] == "timewindow1"
     assert call_arg["stime"] == 1635765895.037696
-    assert "flow" in call_arg
-    flow_data = json.loads(call_arg["flow"])
-    assert "test_uid" in flow_data
-    assert json.loads(flow_data["test_uid"])["dport"] == 443
-    assert json.loads(flow_data["test_uid"])["appproto"] == "http"
+    assert call_arg["uid"] == "test_uid"
+    assert call_arg["flow"]["dport"] == 443
+    assert call_arg["flow"]["appproto"] == "http"
 
 
 def test_analyze_no_messages(mocker, mock_db):
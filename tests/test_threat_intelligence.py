@@ -5,7 +5,6 @@ import os
 import pytest
 import json
 from unittest.mock import MagicMock, patch
-import ipaddress
 from slips_files.core.evidence_structure.evidence import ThreatLevel
 
 
@@ -125,54 +124,57 @@ def test_create_circl_lu_session(mock_db):
 
 
 @pytest.mark.parametrize(
-    "mock_ip_ranges, expected_ipv4_ranges, expected_ipv6_ranges",
+    "mock_ip_ranges, ip, expected_range",
     [
-        # Test case 1:  Both IPv4 and IPv6 ranges
+        # Test case 1: IPv4 range
         (
             {
                 "192.168.1.0/24": '{"description": "Example range", "source": "local_file", "threat_level": "high"}',
                 "10.0.0.0/16": '{"description": "Another range", "source": "remote_feed", "threat_level": "medium"}',
                 "2001:db8::/64": '{"description": "IPv6 range", "source": "custom", "threat_level": "low"}',
             },
-            {"192": ["192.168.1.0/24"], "10": ["10.0.0.0/16"]},
-            {"2001": ["2001:db8::/64"]},
+            "10.0.5.1",
+            "10.0.0.0/16",
         ),
-        # Test case 2: Only IPv4 ranges
+        # Test case 2: the most specific range is returned
         (
             {
                 "172.17.0.0/16": '{"description": "Example range", "source": "local_file", "threat_level": "high"}',
-                "10.0.0.0/8": '{"description": "Another range", "source": "remote_feed", "threat_level": "medium"}',
+                "172.0.0.0/8": '{"description": "Another range", "source": "remote_feed", "threat_level": "medium"}',
             },
-            {"172": ["172.17.0.0/16"], "10": ["10.0.0.0/8"]},
-            {},
+            "172.17.3.4",
+            "172.17.0.0/16",
         ),
-        # Test case 3: Only IPv6 ranges
+        # Test case 3: IPv6 range written in a non compressed format
         (
             {
                 "2001:0db8:0:0:0:0:0:0/32": '{"description": "Example range", "source": "local_file", "threat_level": "high"}',
                 "2002:c0a8:0:1::/64": '{"description": "Another range", "source": "remote_feed", "threat_level": "medium"}',
             },
-            {},
+            "2001:db8:1::1",
+            "2001:0db8:0:0:0:0:0:0/32",
+        ),
+        # Test case 4: ip not in any range
+        (
             {
-                "2001": ["2001:0db8:0:0:0:0:0:0/32"],
-                "2002": ["2002:c0a8:0:1::/64"],
+                "172.17.0.0/16": '{"description": "Example range", "source": "local_file", "threat_level": "high"}',
             },
+            "172.18.0.1",
+            None,
         ),
     ],
 )
-def test_get_malicious_ip_ranges(
-    mock_db, mock_ip_ranges, expected_ipv4_ranges, expected_ipv6_ranges
-):
+def test_get_malicious_ip_ranges(mock_db, mock_ip_ranges, ip, expected_range):
     """
-    Test the retrieval and caching of malicious IP ranges from the database.
+    Test the retrieval and indexing of malicious IP ranges from the database.
     This test covers both IPv4 and IPv6 range scenarios.
     """
     threatintel = ModuleFactory().create_threatintel_obj(mock_db)
     mock_db.get_malicious_ip_ranges.return_value = mock_ip_ranges
     threatintel.get_malicious_ip_ranges()
 
-    assert threatintel.cached_ipv4_ranges == expected_ipv4_ranges
-    assert threatintel.cached_ipv6_ranges == expected_ipv6_ranges
+    assert len(threatintel.ip_ranges_index) == len(mock_ip_ranges)
+    assert threatintel.ip_ranges_index.lookup(ip) == expected_range
 
 
 @pytest.mark.parametrize(
@@ -873,29 +875,15 @@ def test_ip_belongs_to_blacklisted_range(
     for checking malicious IP ranges."""
     threatintel = ModuleFactory().create_threatintel_obj(mock_db)
     mock_db = mocker.patch.object(threatintel, "db")
-    first_octet = str(
-        ipaddress.ip_address(ip).exploded.split("/")[0].split(".")[0]
-        if ip_type == "ipv4"
-        else ipaddress.ip_address(ip).exploded.split("/")[0].split(":")[0]
-    )
-
-    range_value = (
-        f"{first_octet}.0.0.0/8"
-        if ip_type == "ipv4"
-        else f"{first_octet}::/32"
-    )
-    threatintel.cached_ipv4_ranges = (
-        {first_octet: [range_value]} if ip_type == "ipv4" else {}
-    )
-    threatintel.cached_ipv6_ranges = (
-        {first_octet: [range_value]} if ip_type == "ipv6" else {}
-    )
-    mock_db.get_malicious_ip_ranges.return_value = (
-        {
-            range_value: '{"description": "Bad range", "source": "Example Source", "threat_level": "high"}'
-        }
+    range_value = "192.168.0.0/16" if ip_type == "ipv4" else "2001:db8::/32"
+    mock_db.get_malicious_ip_ranges.return_value = {
+        range_value: '{"description": "Bad range", "source": "Example Source", "threat_level": "high"}'
+    }
+    threatintel.get_malicious_ip_ranges()
+    mock_db.get_malicious_ip_range.return_value = (
+        mock_db.get_malicious_ip_ranges.return_value[range_value]
         if in_blacklist
-        else {}
+        else None
     )
 
     result = threatintel.ip_belongs_to_blacklisted_range(
@@ -8,6 +8,7 @@ from slips_files.core.evidence_structure.evidence import (
     Attacker,
     Victim,
 )
+from slips_files.core.helpers.whitelist.org_index import OrgIndex
 
 
 def test_read_whitelist(mock_db):
@@ -108,6 +109,7 @@ def test_get_dst_domains_of_flow(mock_db, flow_type, expected_result):
         ("216.58.192.1", "google", {"216": ["216.58.192.0/19"]}, True),
         ("8.8.8.8", "cloudflare", {"216": ["216.58.192.0/19"]}, False),
         ("8.8.8.8", "google", {}, False),  # no org ip info
+        ("2001:4860::1", "google", {"2001": ["2001:4860::/32"]}, True),
     ],
 )
 def test_is_ip_in_org(ip, org, org_ips, expected_result, mock_db):
@@ -121,12 +123,15 @@ def test_is_ip_in_org(ip, org, org_ips, expected_result, mock_db):
     "domain, org, org_domains, expected_result",
     [
         ("www.google.com", "google", json.dumps(["google.com"]), True),
-        ("www.example.com", "google", json.dumps(["google.com"]), None),
+        ("www.example.com", "google", json.dumps(["google.com"]), False),
+        ("google.com", "google", json.dumps(["mail.google.com"]), True),
+        ("notgoogle.com", "google", json.dumps(["google.com"]), False),
+        ("WWW.Google.com", "google", json.dumps(["GOOGLE.com"]), True),
         (
             "www.google.com",
             "google",
             json.dumps([]),
-            None,
+            False,
         ),  # no org domain info
     ],
 )
@@ -137,6 +142,28 @@ def test_is_domain_in_org(domain, org, org_domains, expected_result, mock_db):
     assert result == expected_result
 
 
+def test_org_index():
+    org_index = OrgIndex()
+    assert not org_index.add_org("apple", [], [], [])
+    assert org_index.add_org(
+        "google", ["216.58.192.0/19"], ["google.com"], ["AS15169"]
+    )
+    assert org_index.add_org(
+        "cloudflare", ["216.58.0.0/16"], ["Mail.Google.com"], []
+    )
+
+    assert org_index.orgs == {"google", "cloudflare"}
+    assert org_index.get_ip_orgs("216.58.192.1") == {"google", "cloudflare"}
+    assert org_index.get_ip_orgs("216.58.1.1") == {"cloudflare"}
+    assert org_index.get_ip_orgs("8.8.8.8") == set()
+    assert org_index.get_domain_orgs("mail.google.com") == {
+        "google",
+        "cloudflare",
+    }
+    assert org_index.get_domain_orgs("www.google.com") == {"google"}
+    assert org_index.get_asn_orgs("AS15169") == {"google"}
+
+
 @pytest.mark.parametrize(
     "is_whitelisted_victim, is_whitelisted_attacker, expected_result",
     [
@@ -201,9 +201,10 @@ def set_intuples(profile, timewindow):
     :return: (tuple, string, ip_info)
     """
     data = []
+    tw_key = f"profile_{profile}_{timewindow}"
     if intuples := __database__.db.hget(
-        f"profile_{profile}_{timewindow}", "InTuples"
-    ):
+        tw_key, "InTuples"
+    ) or __database__.get_archived(tw_key, "InTuples"):
         intuples = json.loads(intuples)
         for key, value in intuples.items():
             ip, port, protocol = key.split("-")
@@ -226,9 +227,10 @@ def set_outtuples(profile, timewindow):
     """
 
     data = []
+    tw_key = f"profile_{profile}_{timewindow}"
     if outtuples := __database__.db.hget(
-        f"profile_{profile}_{timewindow}", "OutTuples"
-    ):
+        tw_key, "OutTuples"
+    ) or __database__.get_archived(tw_key, "OutTuples"):
         outtuples = json.loads(outtuples)
 
         for key, value in outtuples.items():
@@ -279,9 +281,10 @@ def set_timeline(
     """
     data = []
 
+    key = f"profile_{profile}_{timewindow}_timeline"
     if timeline := __database__.db.zrange(
-        f"profile_{profile}_{timewindow}_timeline", 0, -1
-    ):
+        key, 0, -1
+    ) or __database__.get_archived(key):
         for flow in timeline:
             flow = json.loads(flow)
 
@@ -318,9 +321,10 @@ def set_alerts(profile, timewindow):
         alerts_tw = alerts.get(timewindow, {})
         tws = get_all_tw_with_ts(profile)
 
+        key = f"{profile}_{timewindow}_evidence"
         evidence: Dict[str, str] = __database__.db.hgetall(
-            f"{profile}_{timewindow}_evidence"
-        )
+            key
+        ) or __database__.get_archived(key)
 
         for alert_id, evidence_id_list in alerts_tw.items():
             evidence_count = len(evidence_id_list)
@@ -359,9 +363,10 @@ def set_evidence(profile, timewindow, alert_id):
         evidence_ids: List[str] = alerts_tw[alert_id]
 
         profileid = f"profile_{profile}"
+        key = f"{profileid}_{timewindow}_evidence"
         evidence: Dict[str, str] = __database__.db.hgetall(
-            f"{profileid}_{timewindow}_evidence"
-        )
+            key
+        ) or __database__.get_archived(key)
 
         for evidence_id in evidence_ids:
             temp_evidence = json.loads(evidence[evidence_id])
@@ -382,9 +387,10 @@ def set_evidence_general(profile: str, timewindow: str):
     data = []
     profile = f"profile_{profile}"
 
+    key = f"{profile}_{timewindow}_evidence"
     evidence: Dict[str, str] = __database__.db.hgetall(
-        f"{profile}_{timewindow}_evidence"
-    )
+        key
+    ) or __database__.get_archived(key)
     if evidence:
         for evidence_details in evidence.values():
             evidence_details: dict = json.loads(evidence_details)
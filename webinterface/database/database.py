@@ -1,3 +1,6 @@
+import json
+import os
+import sqlite3
 import redis
 from .signals import message_sent
 from webinterface.utils import *
@@ -25,6 +28,41 @@ class Database(object):
 
         return self.connect_to_database(port, db_number)
 
+    def get_archived(self, key: str, field: str = None):
+        """
+        returns the data of a key of an archived timewindow from the
+        sqlite db of the current analysis.
+        zsets are returned as a list of their members sorted by score,
+        like zrange()
+        :param field: returns only this field of the archived hash
+        """
+        output_dir = self.db.hget("analysis", "output_dir")
+        if not output_dir:
+            return None
+        db_path = os.path.join(output_dir, "flows.sqlite")
+        if not os.path.exists(db_path):
+            return None
+
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            row = conn.execute(
+                "SELECT key_type, data FROM archived_tws WHERE key = ?",
+                (key,),
+            ).fetchone()
+        except sqlite3.Error:
+            row = None
+        finally:
+            conn.close()
+
+        if not row:
+            return None
+        key_type, data = row[0], json.loads(row[1])
+        if key_type == "zset":
+            return sorted(data, key=data.get)
+        if field:
+            return data.get(field)
+        return data
+
     def connect_to_database(self, port=6379, db_number=0):
         return redis.StrictRedis(
             host="localhost",